@@ -0,0 +1,71 @@
+"""
+Apply pending migrations to every tenant database. Progress is stored in
+the core database, so running the command again after an interruption
+resumes where it stopped.
+
+    python -m app.commands.migrate_tenants [--workers N] [--timeout SECONDS]
+        [--canary PERCENT] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from tortoise import Tortoise
+
+from app.config import settings
+from app.database import TORTOISE_ORM
+from app.db.pool import tenant_pools
+from app.db.shards import shard_map
+from app.services.tenant_migrations import TenantMigrationRunner
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.commands.migrate_tenants")
+    parser.add_argument(
+        "--workers", type=int, default=settings.tenant_migration_workers
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=settings.tenant_migration_timeout
+    )
+    parser.add_argument(
+        "--canary",
+        type=int,
+        default=100,
+        metavar="PERCENT",
+        help="only migrate this share of tenants, the same ones each time",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="list pending migrations only"
+    )
+    return parser.parse_args(argv)
+
+
+async def main(argv) -> int:
+    args = parse_args(argv)
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        await shard_map.load()
+        runner = TenantMigrationRunner(
+            workers=args.workers,
+            timeout=args.timeout,
+            canary_percent=args.canary,
+            dry_run=args.dry_run,
+        )
+        results = await runner.run()
+    finally:
+        await tenant_pools.close_all()
+        await Tortoise.close_connections()
+
+    print(
+        f"Target {runner.target}: {results['migrated']} migrated, "
+        f"{results['up_to_date']} up to date, {results['skipped']} already done, "
+        f"{results['failed']} failed"
+    )
+    return 1 if results["failed"] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,30 @@
+"""
+Rebuild the tenant template database on every shard, or the named ones.
+Run after adding a migration so new tenants clone the current schema.
+
+    python -m app.commands.refresh_tenant_template [shard ...]
+"""
+
+import asyncio
+import sys
+
+from tortoise import Tortoise
+
+from app.database import TORTOISE_ORM
+from app.db.shards import shard_map
+from app.services.tenant import refresh_tenant_template
+
+
+async def main(*shards: str) -> None:
+    # The migration runner records the tenant models' snapshot in aerich
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        for shard in shards or shard_map.shards:
+            await refresh_tenant_template(shard)
+            print(f"Refreshed tenant template on shard {shard}")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*sys.argv[1:]))
@@ -1,10 +1,24 @@
 from tortoise import Tortoise
 
 from app.config import settings
+from app.db.admin import admin_pools
+from app.db.pool import tenant_pools
+from app.db.replicas import core_replicas, replica_alias, tenant_replicas
+from app.db.shards import shard_map
+from app.services.hibernation import tenant_hibernation
+from app.services.provisioning import provisioning_worker
+from app.services.revocations import revocation_list
+from app.services.user_sync import user_change_dispatcher
+from app.services.verification import verification_sweeper
+from app.services.warm_pool import tenant_warm_pool
 
 TORTOISE_ORM = {
     "connections": {
         "default": settings.database_url,
+        **{
+            replica_alias("default", index): url
+            for index, url in enumerate(settings.core_replica_urls)
+        },
     },
     "apps": {
         "models": {
@@ -20,7 +34,29 @@ TORTOISE_ORM = {
 async def init_db():
     await Tortoise.init(config=TORTOISE_ORM)
     await Tortoise.generate_schemas()
+    await shard_map.load()
+    await revocation_list.rebuild()
+    revocation_list.start_sync()
+    verification_sweeper.start()
+    provisioning_worker.start()
+    user_change_dispatcher.start()
+    if settings.tenant_isolation == "database":
+        tenant_warm_pool.start()
+    tenant_hibernation.start()
+    tenant_pools.start_reaper()
+    core_replicas.start_monitor()
+    tenant_replicas.start_monitor()
 
 
 async def close_db():
+    await provisioning_worker.close()
+    await user_change_dispatcher.close()
+    await tenant_warm_pool.close()
+    await tenant_hibernation.close()
+    await revocation_list.close()
+    await verification_sweeper.close()
+    await core_replicas.close()
+    await tenant_replicas.close()
+    await tenant_pools.close_all()
+    await admin_pools.close()
     await Tortoise.close_connections()
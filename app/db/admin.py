@@ -0,0 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import asyncpg
+
+from app.config import settings
+
+
+class AdminPools:
+    """
+    Small long-lived connection pools for DDL, one per database server.
+
+    Provisioning borrows connections from here instead of opening one per
+    call. ``max_size`` also caps how many statements such as
+    ``CREATE DATABASE``, which serialise on server-wide locks, a process
+    runs against one server at once; further callers wait for a connection.
+    """
+
+    def __init__(self, max_size: int, acquire_timeout: float):
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._pools: Dict[str, asyncpg.Pool] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def pool(self, url: str) -> asyncpg.Pool:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if url not in self._pools:
+                self._pools[url] = await asyncpg.create_pool(
+                    url, min_size=1, max_size=self.max_size
+                )
+        return self._pools[url]
+
+    @asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[asyncpg.Connection]:
+        pool = await self.pool(url)
+        async with pool.acquire(timeout=self.acquire_timeout) as connection:
+            yield connection
+
+    async def close(self) -> None:
+        pools, self._pools = self._pools, {}
+        await asyncio.gather(*(pool.close() for pool in pools.values()))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "servers": len(self._pools),
+            "open": sum(pool.get_size() for pool in self._pools.values()),
+            "in_use": sum(
+                pool.get_size() - pool.get_idle_size() for pool in self._pools.values()
+            ),
+        }
+
+
+admin_pools = AdminPools(
+    max_size=settings.admin_pool_max_size,
+    acquire_timeout=settings.admin_pool_acquire_timeout,
+)
@@ -0,0 +1,381 @@
+import asyncio
+import functools
+import importlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+import asyncpg
+from tortoise import connections
+from tortoise.backends.asyncpg import AsyncpgDBClient
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.backends.base.config_generator import expand_db_url
+
+from app.config import settings
+from app.db.replicas import replica_alias
+from app.db.shards import shard_map
+
+logger = logging.getLogger(__name__)
+
+
+def tenant_alias(tenant_id: int) -> str:
+    """Return the connection alias used for a tenant database"""
+    return f"tenant_{tenant_id}"
+
+
+class SchemaScopedPool:
+    """
+    View of a shared asyncpg pool that pins every checkout to one schema.
+
+    At most ``max_checkouts`` connections are checked out for the schema at
+    once, so one tenant cannot drain the pool shared with everyone else.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, schema: str, max_checkouts: int):
+        self._pool = pool
+        self.schema = schema
+        self._checkouts = asyncio.Semaphore(max_checkouts)
+
+    async def acquire(self) -> asyncpg.Connection:
+        await self._checkouts.acquire()
+        try:
+            connection = await self._pool.acquire()
+        except BaseException:
+            self._checkouts.release()
+            raise
+        try:
+            await connection.execute(f'SET search_path TO "{self.schema}"')
+        except BaseException:
+            await self.release(connection)
+            raise
+        return connection
+
+    async def release(self, connection: asyncpg.Connection) -> None:
+        try:
+            await self._pool.release(connection)
+        finally:
+            self._checkouts.release()
+
+
+class SchemaTenantClient(AsyncpgDBClient):
+    """Tenant client that borrows connections from the registry's shared pool"""
+
+    def __init__(self, registry: "TenantPoolRegistry", **kwargs):
+        super().__init__(**kwargs)
+        self._registry = registry
+
+    async def create_connection(self, with_db: bool) -> None:
+        self._pool = SchemaScopedPool(
+            await self._registry.shared_pool(), self.schema, self.pool_maxsize
+        )
+
+    async def _expire_connections(self) -> None:
+        pass
+
+    async def _close(self) -> None:
+        # The shared pool outlives any single tenant and is closed by the
+        # registry itself.
+        self._pool = None
+
+
+@dataclass
+class TenantPool:
+    alias: str
+    client: BaseDBAsyncClient
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class TenantPoolRegistry:
+    """
+    Bounded registry of per-tenant connection pools.
+
+    At most ``max_pools`` tenant pools are kept open at once. Opening a new
+    pool past that limit closes the least recently used one, and pools that
+    have not been used for ``idle_timeout`` seconds are closed by the reaper.
+    The worst-case number of connections a process holds is therefore
+    ``max_pools * max_size`` regardless of how many tenants it serves.
+    Read-replica pools for a tenant count against the same limit.
+
+    With ``isolation="schema"`` every tenant is a schema in ``schema_database``
+    and all tenant clients share a single pool of ``shared_max_size``
+    connections, each checkout being scoped to the tenant's ``search_path``.
+    """
+
+    def __init__(
+        self,
+        max_pools: int,
+        min_size: int,
+        max_size: int,
+        idle_timeout: float,
+        base_url: str,
+        isolation: str = "database",
+        schema_database: str = "tenants",
+        shared_max_size: int = 20,
+        replica_bases: Iterable[str] = (),
+        locate: Optional[Callable[[int], Awaitable[str]]] = None,
+        checkout_limit: Optional[Callable[[int], int]] = None,
+    ):
+        self.max_pools = max_pools
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.base_url = base_url
+        self.isolation = isolation
+        self.schema_database = schema_database
+        self.shared_max_size = shared_max_size
+        self.replica_bases = list(replica_bases)
+        self.locate = locate
+        self.checkout_limit = checkout_limit
+        self._shared: Optional[asyncpg.Pool] = None
+        self._shared_lock: Optional[asyncio.Lock] = None
+        self._pools: "OrderedDict[str, TenantPool]" = OrderedDict()
+        self._closing: Set[asyncio.Task] = set()
+        # In-flight opens by client, not alias: an evicted client and its
+        # re-registered replacement must never share an attempt.
+        self._opening: Dict[int, asyncio.Future] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def __contains__(self, alias: str) -> bool:
+        return alias in self._pools
+
+    def __len__(self) -> int:
+        return len(self._pools)
+
+    @property
+    def shared_url(self) -> str:
+        return f"{self.base_url}/{self.schema_database}"
+
+    async def shared_pool(self) -> asyncpg.Pool:
+        """Return the pool shared by all tenants in schema isolation mode"""
+        if self._shared_lock is None:
+            self._shared_lock = asyncio.Lock()
+        async with self._shared_lock:
+            if self._shared is None:
+                self._shared = await asyncpg.create_pool(
+                    self.shared_url,
+                    min_size=self.min_size,
+                    max_size=self.shared_max_size,
+                    max_inactive_connection_lifetime=self.idle_timeout,
+                )
+        return self._shared
+
+    def pool_size_for(self, tenant_id: int) -> int:
+        """Maximum connections a tenant may check out at once"""
+        if self.checkout_limit is None:
+            return self.max_size
+        return max(1, min(self.max_size, self.checkout_limit(tenant_id)))
+
+    def _create_client(
+        self, alias: str, tenant_id: int, replica: Optional[int] = None
+    ) -> BaseDBAsyncClient:
+        if self.isolation == "schema":
+            db_info = expand_db_url(self.shared_url)
+            client_class = functools.partial(SchemaTenantClient, self)
+            db_info["credentials"]["schema"] = tenant_alias(tenant_id)
+        else:
+            base_url = self.base_url if replica is None else self.replica_bases[replica]
+            db_info = expand_db_url(f"{base_url}/{tenant_alias(tenant_id)}")
+            client_class = importlib.import_module(db_info["engine"]).client_class
+        credentials = db_info["credentials"].copy()
+        pool_size = self.pool_size_for(tenant_id)
+        credentials.update(
+            {
+                "connection_name": alias,
+                "minsize": min(self.min_size, pool_size),
+                "maxsize": pool_size,
+                "max_inactive_connection_lifetime": self.idle_timeout,
+            }
+        )
+        client = client_class(**credentials)
+        # Tortoise opens a client's pool lazily on first checkout, so every
+        # path that can open it goes through the single-flight wrapper.
+        client.create_connection = functools.partial(
+            self._open_once, client, tenant_id, replica, client.create_connection
+        )
+        return client
+
+    async def _open(
+        self, client, tenant_id: int, replica: Optional[int], create_connection, with_db
+    ) -> None:
+        if replica is None and self.locate is not None and self.isolation == "database":
+            # Clients are created synchronously by the router, so they only
+            # learn which server holds the tenant when the pool is opened.
+            base_url = await self.locate(tenant_id)
+            server = expand_db_url(f"{base_url}/{tenant_alias(tenant_id)}")
+            credentials = server["credentials"]
+            client.host = credentials["host"]
+            client.port = int(credentials["port"])
+            client.user = credentials["user"]
+            client.password = credentials["password"]
+        await create_connection(with_db=with_db)
+
+    async def _open_once(
+        self, client, tenant_id: int, replica: Optional[int], create_connection, with_db
+    ) -> None:
+        """Open a client's pool, sharing one in-flight attempt between callers"""
+        if client._pool is not None:
+            return
+        key = id(client)
+        opening = self._opening.get(key)
+        if opening is None:
+            opening = asyncio.ensure_future(
+                self._open(client, tenant_id, replica, create_connection, with_db)
+            )
+            self._opening[key] = opening
+            opening.add_done_callback(lambda _: self._opening.pop(key, None))
+        # Shielded so a cancelled waiter does not abort the shared attempt.
+        await asyncio.shield(opening)
+
+    def _register(
+        self, alias: str, tenant_id: int, replica: Optional[int] = None
+    ) -> TenantPool:
+        pool = TenantPool(
+            alias=alias, client=self._create_client(alias, tenant_id, replica)
+        )
+        self._pools[alias] = pool
+        # Tortoise resolves router aliases through its shared connection
+        # storage, so the client has to be visible there as well.
+        connections._get_storage()[alias] = pool.client
+        while len(self._pools) > self.max_pools:
+            _, victim = self._pools.popitem(last=False)
+            self._schedule_close(victim)
+        return pool
+
+    def _schedule_close(self, pool: TenantPool) -> None:
+        connections.discard(pool.alias)
+        task = asyncio.ensure_future(self._close_client(pool.client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close_client(self, client: BaseDBAsyncClient) -> None:
+        opening = self._opening.get(id(client))
+        if opening is not None:
+            # Closing before the open lands would be a no-op, leaving the
+            # pool it then creates on a client nothing references.
+            await asyncio.wait([opening])
+        await client.close()
+
+    def resolve(self, tenant_id: int, replica: Optional[int] = None) -> str:
+        """
+        Return the alias for a tenant, registering its pool if needed.
+
+        Args:
+            tenant_id: Tenant whose database is being resolved
+            replica: Index into ``replica_bases`` to read from, or ``None``
+                for the primary
+        """
+        alias = tenant_alias(tenant_id)
+        if replica is not None:
+            alias = replica_alias(alias, replica)
+        pool = self._pools.get(alias)
+        if pool is None:
+            pool = self._register(alias, tenant_id, replica)
+        else:
+            self._pools.move_to_end(alias)
+        pool.last_used = time.monotonic()
+        return alias
+
+    async def acquire(self, tenant_id: int) -> BaseDBAsyncClient:
+        """Return an open connection pool for the tenant"""
+        client = self._pools[self.resolve(tenant_id)].client
+        if client._pool is None:
+            await client.create_connection(with_db=True)
+        return client
+
+    async def prewarm(self, tenant_ids: Iterable[int], concurrency: int) -> int:
+        """
+        Open pools for the given tenants ahead of their first request.
+
+        Only the first ``max_pools`` tenants are warmed, since warming more
+        would just evict the earlier ones. Failures are logged and skipped.
+
+        Returns:
+            Number of tenant pools that were opened
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm(tenant_id: int) -> bool:
+            async with semaphore:
+                try:
+                    await self.acquire(tenant_id)
+                    return True
+                except Exception as e:
+                    logger.warning("Failed to pre-warm tenant %s: %s", tenant_id, e)
+                    return False
+
+        tenant_ids = list(dict.fromkeys(tenant_ids))[: self.max_pools]
+        results = await asyncio.gather(*(warm(tenant_id) for tenant_id in tenant_ids))
+        return sum(results)
+
+    async def discard(self, tenant_id: int) -> None:
+        """Close a tenant's pools, e.g. before its database is dropped"""
+        alias = tenant_alias(tenant_id)
+        for pool in list(self._pools.values()):
+            if pool.alias == alias or pool.alias.startswith(f"{alias}_replica_"):
+                del self._pools[pool.alias]
+                self._schedule_close(pool)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    async def evict_idle(self) -> int:
+        """Close every pool that has been idle longer than ``idle_timeout``"""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [pool for pool in self._pools.values() if pool.last_used < cutoff]
+        for pool in idle:
+            del self._pools[pool.alias]
+            self._schedule_close(pool)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        return len(idle)
+
+    async def _reap(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    def start_reaper(self, interval: Optional[float] = None) -> None:
+        if self._reaper is None:
+            self._reaper = asyncio.ensure_future(
+                self._reap(interval or self.idle_timeout / 2)
+            )
+
+    async def close_all(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        while self._pools:
+            _, pool = self._pools.popitem(last=False)
+            self._schedule_close(pool)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        if self._shared is not None:
+            await self._shared.close()
+            self._shared = None
+
+    def stats(self) -> Dict[str, int]:
+        if self.isolation == "schema":
+            max_connections = self.shared_max_size
+        else:
+            max_connections = self.max_pools * self.max_size
+        return {
+            "open_pools": len(self._pools),
+            "max_pools": self.max_pools,
+            "max_connections": max_connections,
+        }
+
+
+tenant_pools = TenantPoolRegistry(
+    max_pools=settings.tenant_pool_max_pools,
+    min_size=settings.tenant_pool_min_size,
+    max_size=settings.tenant_pool_max_size,
+    idle_timeout=settings.tenant_pool_idle_timeout,
+    base_url=settings.tenant_database_base,
+    isolation=settings.tenant_isolation,
+    schema_database=settings.tenant_schema_database,
+    shared_max_size=settings.tenant_shared_pool_max_size,
+    replica_bases=settings.tenant_replica_bases,
+    locate=shard_map.locate_url,
+    checkout_limit=lambda tenant_id: settings.tier_for(tenant_id).max_db_connections,
+)
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+import asyncpg
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind its primary. A replica that has replayed
+# everything it received reports 0 even when the primary has been idle.
+LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+# Time of the last write routed in the current request context
+last_write_at: ContextVar[Optional[float]] = ContextVar("last_write_at", default=None)
+
+
+def replica_alias(alias: str, index: int) -> str:
+    """Return the connection alias for a read replica of ``alias``"""
+    return f"{alias}_replica_{index}"
+
+
+def mark_write() -> None:
+    """Record that the current request context has written to a primary"""
+    last_write_at.set(time.monotonic())
+
+
+def wrote_recently() -> bool:
+    """Whether reads in this context must stay on the primary"""
+    written_at = last_write_at.get()
+    return (
+        written_at is not None
+        and time.monotonic() - written_at < settings.read_your_writes_window
+    )
+
+
+class ReplicaSet:
+    """
+    Lag-aware set of read replicas for one primary.
+
+    Lag is polled in the background over one long-lived connection per
+    replica. Replicas are only eligible for reads once they have reported a
+    lag of at most ``max_lag`` seconds, and drop out again as soon as a check
+    fails or exceeds it.
+    """
+
+    def __init__(self, dsns: Iterable[str], max_lag: float, check_interval: float):
+        self.dsns = list(dsns)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Dict[int, float] = {
+            index: math.inf for index in range(len(self.dsns))
+        }
+        self._connections: Dict[int, asyncpg.Connection] = {}
+        self._cycle = itertools.count()
+        self._monitor: Optional[asyncio.Task] = None
+
+    def healthy(self) -> List[int]:
+        return [index for index, lag in self.lag.items() if lag <= self.max_lag]
+
+    def choose(self) -> Optional[int]:
+        """Pick a healthy replica round-robin, or ``None`` to use the primary"""
+        healthy = self.healthy()
+        if not healthy:
+            return None
+        return healthy[next(self._cycle) % len(healthy)]
+
+    async def check(self, index: int) -> float:
+        try:
+            connection = self._connections.get(index)
+            if connection is None or connection.is_closed():
+                connection = await asyncpg.connect(
+                    self.dsns[index], timeout=self.check_interval
+                )
+                self._connections[index] = connection
+            lag = float(
+                await connection.fetchval(LAG_QUERY, timeout=self.check_interval)
+            )
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+            logger.warning("Replica %s lag check failed: %s", index, e)
+            connection = self._connections.pop(index, None)
+            if connection is not None:
+                connection.terminate()
+            lag = math.inf
+        self.lag[index] = lag
+        return lag
+
+    async def refresh(self) -> None:
+        await asyncio.gather(*(self.check(index) for index in range(len(self.dsns))))
+
+    async def _watch(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.check_interval)
+
+    def start_monitor(self) -> None:
+        if self.dsns and self._monitor is None:
+            self._monitor = asyncio.ensure_future(self._watch())
+
+    async def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for connection in self._connections.values():
+            await connection.close()
+        self._connections.clear()
+        self.lag = {index: math.inf for index in self.lag}
+
+
+core_replicas = ReplicaSet(
+    settings.core_replica_urls,
+    max_lag=settings.replica_max_lag,
+    check_interval=settings.replica_check_interval,
+)
+
+# Replica lag is a property of the server, so tenant replicas are checked
+# through the maintenance database rather than per tenant. Tenant replicas
+# only apply to database-per-tenant mode.
+tenant_replicas = ReplicaSet(
+    (
+        [f"{base}/postgres" for base in settings.tenant_replica_bases]
+        if settings.tenant_isolation == "database"
+        else []
+    ),
+    max_lag=settings.replica_max_lag,
+    check_interval=settings.replica_check_interval,
+)
@@ -1,37 +1,22 @@
-from tortoise import Tortoise, connections
 from tortoise.exceptions import ConfigurationError
 
-from app.config import settings
+from app.db.pool import tenant_alias, tenant_pools
+from app.db.replicas import (
+    core_replicas,
+    mark_write,
+    replica_alias,
+    tenant_replicas,
+    wrote_recently,
+)
+from app.db.shards import DEFAULT_SHARD, shard_map
 from app.middleware.tenant_context import current_tenant
 
 
 async def get_tenant_connection(tenant_id: int):
-    db_name = f"tenant_{tenant_id}"
-    db_url = f"{settings.tenant_database_base}/{db_name}"
+    db_name = tenant_alias(tenant_id)
 
-    # Check if connection already exists
-    if db_name in connections:
-        return connections.get(db_name)
-
-    # Initialize new connection
     try:
-        await Tortoise.init(
-            config={
-                "connections": {db_name: db_url},
-                "apps": {
-                    "tenant": {
-                        "models": ["app.models.tenant", "aerich.models"],
-                        "default_connection": db_name,
-                    }
-                },
-            }
-        )
-        connection = connections.get(db_name)
-        if connection is None:
-            raise ConfigurationError(
-                f"Failed to get connection for tenant database {db_name}"
-            )
-        return connection
+        return await tenant_pools.acquire(tenant_id)
     except Exception as e:
         raise ConfigurationError(
             f"Failed to initialize tenant database {db_name}: {str(e)}"
@@ -39,10 +24,23 @@ async def get_tenant_connection(tenant_id: int):
 
 
 class TenantRouter:
-    async def db_for_read(self, model):
+    # Tortoise calls router methods synchronously, so these must return the
+    # alias directly rather than a coroutine.
+    def db_for_read(self, model):
         tenant_id = current_tenant.get()
-        return f"tenant_{tenant_id}" if tenant_id else "default"
-
-    async def db_for_write(self, model):
+        replicas = tenant_replicas if tenant_id else core_replicas
+        # Reads right after a write in the same request stay on the primary
+        # so the caller sees its own changes.
+        replica = None if wrote_recently() else replicas.choose()
+
+        if tenant_id:
+            # Tenant replicas mirror the default shard only.
+            if shard_map.cached(tenant_id) != DEFAULT_SHARD:
+                replica = None
+            return tenant_pools.resolve(tenant_id, replica)
+        return "default" if replica is None else replica_alias("default", replica)
+
+    def db_for_write(self, model):
+        mark_write()
         tenant_id = current_tenant.get()
-        return f"tenant_{tenant_id}" if tenant_id else "default"
+        return tenant_pools.resolve(tenant_id) if tenant_id else "default"
@@ -0,0 +1,111 @@
+from typing import Dict, Optional, Tuple
+
+from tortoise import connections
+from tortoise.exceptions import ConfigurationError
+from tortoise.functions import Count
+
+from app.config import settings
+from app.models.core import TenantShard
+
+DEFAULT_SHARD = "default"
+
+
+class ShardMap:
+    """
+    In-process cache of the tenant -> database server map in ``TenantShard``.
+
+    A tenant never moves once placed, so cached entries never go stale.
+    Tenants without a row predate sharding and live on the default shard.
+    """
+
+    def __init__(self, shards: Dict[str, str]):
+        self.shards = shards
+        self._assignments: Dict[int, str] = {}
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def cached(self, tenant_id: int) -> Optional[str]:
+        """Return the tenant's shard if it is already known to this process"""
+        return self._assignments.get(tenant_id)
+
+    def url(self, shard: str) -> str:
+        try:
+            return self.shards[shard]
+        except KeyError as e:
+            raise ConfigurationError(f"Unknown tenant shard {shard}") from e
+
+    async def load(self) -> None:
+        if not self.sharded:
+            return
+        rows = (
+            await TenantShard.all()
+            .using_db(connections.get("default"))
+            .values_list("organization_id", "shard")
+        )
+        self._assignments.update(rows)
+
+    async def locate(self, tenant_id: int) -> str:
+        shard = self._assignments.get(tenant_id)
+        if shard is not None:
+            return shard
+
+        shard = DEFAULT_SHARD
+        if self.sharded:
+            # Always read the map from the core database, even while a
+            # tenant context is active.
+            row = await TenantShard.get_or_none(organization_id=tenant_id).using_db(
+                connections.get("default")
+            )
+            if row is not None:
+                shard = row.shard
+        self._assignments[tenant_id] = shard
+        return shard
+
+    async def locate_url(self, tenant_id: int) -> str:
+        return self.url(await self.locate(tenant_id))
+
+    async def place(self, tenant_id: int) -> str:
+        """Assign a new tenant to the shard currently holding the fewest tenants"""
+        if not self.sharded:
+            self._assignments[tenant_id] = DEFAULT_SHARD
+            return DEFAULT_SHARD
+
+        core_db = connections.get("default")
+        existing = await TenantShard.get_or_none(organization_id=tenant_id).using_db(
+            core_db
+        )
+        if existing is not None:
+            shard = existing.shard
+        else:
+            load = dict(
+                await TenantShard.annotate(tenants=Count("id"))
+                .group_by("shard")
+                .using_db(core_db)
+                .values_list("shard", "tenants")
+            )
+            shard = min(self.shards, key=lambda name: load.get(name, 0))
+            await TenantShard.create(
+                organization_id=tenant_id, shard=shard, using_db=core_db
+            )
+        self._assignments[tenant_id] = shard
+        return shard
+
+
+shard_map = ShardMap(
+    {DEFAULT_SHARD: settings.tenant_database_base, **settings.tenant_shards}
+)
+
+
+def shard_admin_urls(shard: str) -> Tuple[str, Optional[str]]:
+    """Return the admin URL and tenant base URL for a shard's server"""
+    if shard == DEFAULT_SHARD:
+        return settings.database_url, None
+    base_url = shard_map.url(shard)
+    return f"{base_url}/postgres", base_url
+
+
+def tenant_database_url(database_name: str, base_url: Optional[str] = None) -> str:
+    base_url = base_url or settings.database_url.rsplit("/", 1)[0]
+    return f"{base_url}/{database_name}"
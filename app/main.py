@@ -1,21 +1,55 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse
 
 from app.database import close_db, init_db
+from app.db.admin import admin_pools
+from app.db.pool import tenant_pools
+from app.middleware.quota import tenant_scheduler
 from app.middleware.tenant_context import TenantMiddleware
 from app.routes.core import router as core_router
 from app.routes.tenant import router as tenant_router
+from app.services.hibernation import tenant_hibernation
+from app.services.principals import principal_cache
+from app.services.provisioning import provisioning_worker
+from app.services.revocations import revocation_list
+from app.services.tenant import prewarm_tenant_pools
+from app.services.tenant_directory import tenant_directory
+from app.services.user_sync import user_change_dispatcher
+from app.services.warm_pool import tenant_warm_pool
+from app.utils.passwords import password_hasher
+from app.utils.serializers import FastJSONResponse
+from app.utils.tokens import token_verifier
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(app: FastAPI):
+    try:
+        await prewarm_tenant_pools()
+    except Exception:
+        # Pools left cold open on first use; readiness must not wait on them
+        logger.exception("Pre-warming tenant pools failed")
+    app.state.ready = True
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    app.state.ready = False
     await init_db()
+    warm_up_task = asyncio.ensure_future(warm_up(app))
     yield
+    warm_up_task.cancel()
     await close_db()
+    password_hasher.shutdown()
 
 
-app = FastAPI(lifespan=lifespan)
+# Routes returning a response_model are still validated by pydantic, but
+# every response is rendered with orjson
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 app.add_middleware(TenantMiddleware)
 app.include_router(core_router)
 app.include_router(tenant_router)
@@ -29,3 +63,30 @@ def read_root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "starting"},
+        )
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "admin_pools": admin_pools.stats(),
+        "principal_cache": principal_cache.stats(),
+        "provisioning": provisioning_worker.stats(),
+        "revocation_list": revocation_list.stats(),
+        "tenant_directory": tenant_directory.stats(),
+        "tenant_hibernation": tenant_hibernation.stats(),
+        "tenant_pools": tenant_pools.stats(),
+        "tenant_scheduler": tenant_scheduler.stats(),
+        "tenant_warm_pool": tenant_warm_pool.stats(),
+        "token_cache": token_verifier.stats(),
+        "user_sync": user_change_dispatcher.stats(),
+    }
@@ -0,0 +1,138 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict
+
+from app.config import TenantTier, settings
+
+
+class QuotaExceeded(Exception):
+    """Raised when a tenant request cannot be admitted in time"""
+
+
+class TenantScheduler:
+    """
+    Admission control for tenant requests within one worker.
+
+    At most ``capacity`` tenant requests run at once, and each tenant is
+    capped at its tier's ``max_requests``. Requests over either limit wait in
+    a per-tenant queue of at most ``queue_size`` entries for up to
+    ``queue_timeout`` seconds before being shed. Freed slots are handed out
+    weighted round-robin across tenants with queued requests, so a tenant
+    with weight 3 gets three admissions per round, and one tenant's backlog
+    cannot starve the others.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        queue_size: int,
+        queue_timeout: float,
+        tier_for: Callable[[int], TenantTier],
+    ):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.tier_for = tier_for
+        self._running = 0
+        self._in_flight: Dict[int, int] = {}
+        self._queues: Dict[int, Deque[asyncio.Future]] = {}
+        # Tenants with queued requests, in round-robin order, mapped to the
+        # admissions they have left in the current round.
+        self._ready: "OrderedDict[int, int]" = OrderedDict()
+
+    def in_flight(self, tenant_id: int) -> int:
+        return self._in_flight.get(tenant_id, 0)
+
+    def _can_run(self, tenant_id: int) -> bool:
+        return (
+            self._running < self.capacity
+            and self.in_flight(tenant_id) < self.tier_for(tenant_id).max_requests
+        )
+
+    def _start(self, tenant_id: int) -> None:
+        self._running += 1
+        self._in_flight[tenant_id] = self.in_flight(tenant_id) + 1
+
+    def _dispatch(self) -> None:
+        while self._running < self.capacity and self._ready:
+            for tenant_id in self._ready:
+                if self.in_flight(tenant_id) < self.tier_for(tenant_id).max_requests:
+                    break
+            else:
+                # Every queued tenant is already at its own limit.
+                return
+
+            queue = self._queues[tenant_id]
+            self._start(tenant_id)
+            queue.popleft().set_result(None)
+
+            self._ready[tenant_id] -= 1
+            if not queue:
+                del self._queues[tenant_id]
+                del self._ready[tenant_id]
+            elif self._ready[tenant_id] == 0:
+                del self._ready[tenant_id]
+                self._ready[tenant_id] = self.tier_for(tenant_id).weight
+
+    def _abandon(self, tenant_id: int, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        queue = self._queues.get(tenant_id)
+        if queue is None:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[tenant_id]
+            self._ready.pop(tenant_id, None)
+
+    async def acquire(self, tenant_id: int) -> None:
+        if not self._ready and self._can_run(tenant_id):
+            self._start(tenant_id)
+            return
+
+        queue = self._queues.setdefault(tenant_id, deque())
+        if len(queue) >= self.queue_size:
+            raise QuotaExceeded(f"Too many queued requests for tenant {tenant_id}")
+
+        waiter = asyncio.get_event_loop().create_future()
+        queue.append(waiter)
+        if tenant_id not in self._ready:
+            self._ready[tenant_id] = self.tier_for(tenant_id).weight
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError as e:
+            if waiter.done():
+                return
+            self._abandon(tenant_id, waiter)
+            raise QuotaExceeded(f"Tenant {tenant_id} is over its quota") from e
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release(tenant_id)
+            else:
+                self._abandon(tenant_id, waiter)
+            raise
+
+    def release(self, tenant_id: int) -> None:
+        self._running -= 1
+        remaining = self.in_flight(tenant_id) - 1
+        if remaining:
+            self._in_flight[tenant_id] = remaining
+        else:
+            self._in_flight.pop(tenant_id, None)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": self._running,
+            "capacity": self.capacity,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+        }
+
+
+tenant_scheduler = TenantScheduler(
+    capacity=settings.worker_max_requests,
+    queue_size=settings.tenant_queue_size,
+    queue_timeout=settings.tenant_queue_timeout,
+    tier_for=settings.tier_for,
+)
@@ -1,9 +1,16 @@
+import asyncio
 import uuid
 from contextvars import ContextVar
 from typing import Optional
 
-from fastapi import HTTPException, Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.middleware.quota import QuotaExceeded, tenant_scheduler
+from app.models.core import OrganizationStatus
+from app.services.hibernation import HibernationError, tenant_hibernation
+from app.services.tenant_directory import tenant_directory
 
 # Context variable to store the current tenant ID
 current_tenant: ContextVar[Optional[int]] = ContextVar("current_tenant", default=None)
@@ -47,22 +54,105 @@ class TenantContext:
             reset_current_tenant(self.token)
 
 
-class TenantMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        x_tenant = request.headers.get("X-TENANT")
-        request.state.tenant = x_tenant
-        request.state.is_core = not x_tenant
+# Responses for tenants that cannot currently be served
+TENANT_STATUS_ERRORS = {
+    None: (status.HTTP_404_NOT_FOUND, "Tenant not found"),
+    OrganizationStatus.PROVISIONING: (
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+        "Tenant is still being provisioned",
+    ),
+    OrganizationStatus.SUSPENDED: (status.HTTP_403_FORBIDDEN, "Tenant is suspended"),
+    OrganizationStatus.ARCHIVED: (status.HTTP_410_GONE, "Tenant has been archived"),
+    OrganizationStatus.FAILED: (
+        status.HTTP_500_INTERNAL_SERVER_ERROR,
+        "Tenant provisioning failed",
+    ),
+}
+
+
+def get_tenant_header(scope: Scope) -> Optional[str]:
+    """Return the raw X-TENANT header value from an ASGI scope"""
+    for name, value in scope["headers"]:
+        if name == b"x-tenant":
+            return value.decode("latin-1")
+    return None
+
+
+class TenantMiddleware:
+    """
+    Pure ASGI middleware that scopes each request to its X-TENANT tenant.
+
+    The response is streamed through untouched, so the tenant context and
+    admission slot cover the whole response, including streamed bodies.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        x_tenant = get_tenant_header(scope)
+        state = scope.setdefault("state", {})
+        state["tenant"] = x_tenant
+        state["is_core"] = not x_tenant
 
         if not x_tenant:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
         try:
             tenant_id = int(x_tenant)
+        except ValueError:
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Invalid tenant ID format. Must be an integer."},
+            )
+            await response(scope, receive, send)
+            return
+
+        tenant_status = await tenant_directory.status(tenant_id)
+        if tenant_status == OrganizationStatus.HIBERNATED:
+            try:
+                await tenant_hibernation.wake(tenant_id)
+            except asyncio.TimeoutError:
+                response = JSONResponse(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    content={"detail": "Tenant is being restored"},
+                    headers={"Retry-After": "5"},
+                )
+                await response(scope, receive, send)
+                return
+            except HibernationError:
+                # Retrying will not help, e.g. when the archive is missing
+                response = JSONResponse(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    content={"detail": "Restoring the tenant failed"},
+                )
+                await response(scope, receive, send)
+                return
+        if tenant_status in TENANT_STATUS_ERRORS:
+            status_code, detail = TENANT_STATUS_ERRORS[tenant_status]
+            response = JSONResponse(status_code=status_code, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+
+        try:
+            await tenant_scheduler.acquire(tenant_id)
+        except QuotaExceeded:
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Too many requests for this tenant"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        tenant_hibernation.touch(tenant_id)
+        try:
             async with TenantContext(tenant_id):
-                response = await call_next(request)
-                return response
-        except ValueError as e:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid tenant ID format. Must be an integer.",
-            ) from e
+                await self.app(scope, receive, send)
+        finally:
+            tenant_scheduler.release(tenant_id)
@@ -1,4 +1,6 @@
 from datetime import datetime
+from enum import Enum
+from typing import List, Optional
 
 from pydantic import BaseModel, EmailStr, constr
 from tortoise import fields
@@ -9,6 +11,11 @@ from tortoise.models import Model
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
@@ -26,6 +33,11 @@ class UserRegisterIn(BaseModel):
     is_owner: bool = False
 
 
+class CoreUserUpdate(BaseModel):
+    email: Optional[EmailStr] = None
+    password: Optional[constr(min_length=8)] = None
+
+
 class CoreUser(Model):
     id = fields.IntField(pk=True)
     email = fields.CharField(255, unique=True)
@@ -35,9 +47,11 @@ class CoreUser(Model):
     is_owner = fields.BooleanField(default=False)
     verification_token = fields.CharField(max_length=255, null=True)
     verification_token_created_at = fields.DatetimeField(null=True)
+    # Bumped when a field carried in access tokens changes, revoking them
+    token_version = fields.IntField(default=0)
 
     def verify_password(self, plain_password: str) -> bool:
-        from app.utils.auth import pwd_context
+        from app.utils.passwords import pwd_context
 
         return pwd_context.verify(plain_password, self.password_hash)
 
@@ -52,22 +66,186 @@ class CoreUser(Model):
         return await cls.create(**kwargs)
 
 
+class OrganizationStatus(str, Enum):
+    PROVISIONING = "provisioning"
+    ACTIVE = "active"
+    SUSPENDED = "suspended"
+    ARCHIVED = "archived"
+    HIBERNATED = "hibernated"
+    FAILED = "failed"
+
+
 class Organization(Model):
     id = fields.IntField(pk=True)
     name = fields.CharField(255)
-    owner = fields.ForeignKeyField("models.CoreUser", related_name="organizations")
+    owner: fields.ForeignKeyRelation[CoreUser] = fields.ForeignKeyField(
+        "models.CoreUser", related_name="organizations"
+    )
+    owner_id: int
     created_at = fields.DatetimeField(auto_now_add=True)
+    status = fields.CharEnumField(
+        OrganizationStatus, max_length=16, default=OrganizationStatus.ACTIVE
+    )
+    # Refreshed from request traffic every few minutes, for hibernation
+    last_active_at = fields.DatetimeField(auto_now_add=True, index=True)
 
     def __str__(self):
         return self.name
 
 
+class TenantShard(Model):
+    id = fields.IntField(pk=True)
+    organization: fields.OneToOneRelation[Organization] = fields.OneToOneField(
+        "models.Organization", related_name="shard"
+    )
+    organization_id: int
+    shard = fields.CharField(64, index=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.shard
+
+
+class ProvisioningStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class ProvisioningJob(Model):
+    id = fields.IntField(pk=True)
+    organization: fields.OneToOneRelation[Organization] = fields.OneToOneField(
+        "models.Organization", related_name="provisioning_job"
+    )
+    organization_id: int
+    status = fields.CharEnumField(
+        ProvisioningStatus, max_length=16, default=ProvisioningStatus.PENDING
+    )
+    # Next step to run; completed steps are never repeated
+    step = fields.CharField(32, default="database")
+    attempts = fields.IntField(default=0)
+    last_error = fields.TextField(null=True)
+    run_after = fields.DatetimeField(index=True)
+    # Running jobs whose lease expired are reclaimed from crashed workers
+    locked_until = fields.DatetimeField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organization_id}:{self.status}"
+
+
+class TenantMigrationRun(Model):
+    id = fields.IntField(pk=True)
+    # Latest migration file the run brings tenants up to
+    target = fields.CharField(255, index=True)
+    completed = fields.BooleanField(default=False)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    finished_at = fields.DatetimeField(null=True)
+
+    def __str__(self):
+        return self.target
+
+
+class TenantMigrationStatus(str, Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class TenantMigration(Model):
+    id = fields.IntField(pk=True)
+    run: fields.ForeignKeyRelation[TenantMigrationRun] = fields.ForeignKeyField(
+        "models.TenantMigrationRun", related_name="tenants"
+    )
+    run_id: int
+    organization: fields.ForeignKeyRelation[Organization] = fields.ForeignKeyField(
+        "models.Organization", related_name="migrations"
+    )
+    organization_id: int
+    status = fields.CharEnumField(TenantMigrationStatus, max_length=16)
+    applied: List[str] = fields.JSONField(default=list)
+    error = fields.TextField(null=True)
+    started_at = fields.DatetimeField(auto_now_add=True)
+    finished_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        unique_together = (("run", "organization"),)
+
+    def __str__(self):
+        return f"{self.organization_id}:{self.status}"
+
+
+class UserChange(Model):
+    """Outbox of core user changes, copied into the user's tenant databases"""
+
+    id = fields.IntField(pk=True)
+    user: fields.ForeignKeyRelation[CoreUser] = fields.ForeignKeyField(
+        "models.CoreUser", related_name="changes"
+    )
+    user_id: int
+    # Tenant copies are found by the email they had before the change
+    previous_email = fields.CharField(255)
+    email = fields.CharField(255)
+    password_hash = fields.CharField(128)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = (("user", "id"),)
+
+    def __str__(self):
+        return f"{self.user_id}:{self.id}"
+
+
+class TenantSyncCheckpoint(Model):
+    id = fields.IntField(pk=True)
+    organization: fields.OneToOneRelation[Organization] = fields.OneToOneField(
+        "models.Organization", related_name="sync_checkpoint"
+    )
+    organization_id: int
+    # Last user change applied to the tenant database
+    position = fields.IntField(default=0)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.organization_id}:{self.position}"
+
+
+class VerificationToken(Model):
+    id = fields.IntField(pk=True)
+    user: fields.ForeignKeyRelation[CoreUser] = fields.ForeignKeyField(
+        "models.CoreUser", related_name="verification_tokens"
+    )
+    user_id: int
+    # SHA-256 of the emailed token; the token itself is never stored
+    token_digest = fields.CharField(64, unique=True)
+    expires_at = fields.DatetimeField(index=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.token_digest
+
+
+class RevokedToken(Model):
+    id = fields.IntField(pk=True)
+    jti = fields.CharField(64, unique=True)
+    expires_at = fields.DatetimeField(index=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
+
+
 CoreUser_Pydantic = pydantic_model_creator(
-    CoreUser, name="CoreUser", exclude=("password_hash",)
+    CoreUser, name="CoreUser", exclude=("password_hash", "token_version")
 )
 
 CoreUserIn_Pydantic = pydantic_model_creator(
-    CoreUser, name="CoreUserIn", exclude_readonly=True, exclude=("is_verified",)
+    CoreUser,
+    name="CoreUserIn",
+    exclude_readonly=True,
+    exclude=("is_verified", "token_version"),
 )
 
 
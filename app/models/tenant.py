@@ -1,23 +1,43 @@
-from pydantic import BaseModel, EmailStr, constr
+from typing import Optional
+
+from pydantic import BaseModel, EmailStr, constr, model_validator
 from tortoise import fields
 from tortoise.contrib.pydantic import pydantic_model_creator
 from tortoise.models import Model
 
+BCRYPT_HASH_PATTERN = r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$"
+
 
 class TenantUserIn(BaseModel):
     email: EmailStr
     password: constr(min_length=8)
 
 
+class TenantUserImportRow(BaseModel):
+    """A bulk import row with either a password or an existing bcrypt hash"""
+
+    email: EmailStr
+    password: Optional[constr(min_length=8)] = None
+    password_hash: Optional[constr(pattern=BCRYPT_HASH_PATTERN)] = None
+
+    @model_validator(mode="after")
+    def check_one_password(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("Exactly one of password or password_hash is required")
+        return self
+
+
 class TenantUser(Model):
     id = fields.IntField(pk=True)
     email = fields.CharField(255, unique=True)
     password_hash = fields.CharField(128)
     created_at = fields.DatetimeField(auto_now_add=True)
     is_active = fields.BooleanField(default=True)
+    # Bumped when a field carried in access tokens changes, revoking them
+    token_version = fields.IntField(default=0)
 
     def verify_password(self, plain_password: str) -> bool:
-        from app.utils.auth import pwd_context
+        from app.utils.passwords import pwd_context
 
         return pwd_context.verify(plain_password, self.password_hash)
 
@@ -26,8 +46,11 @@ class TenantUser(Model):
 
 
 TenantUser_Pydantic = pydantic_model_creator(
-    TenantUser, name="TenantUser", exclude=("password_hash",)
+    TenantUser, name="TenantUser", exclude=("password_hash", "token_version")
 )
 TenantUserIn_Pydantic = pydantic_model_creator(
-    TenantUser, name="TenantUserIn", exclude_readonly=True, exclude=("is_active",)
+    TenantUser,
+    name="TenantUserIn",
+    exclude_readonly=True,
+    exclude=("is_active", "token_version"),
 )
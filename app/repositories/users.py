@@ -0,0 +1,67 @@
+"""
+Hot-path user writes as single SQL statements.
+
+Each insert is one ``INSERT ... ON CONFLICT DO NOTHING RETURNING *`` round
+trip. It returns ``None`` when the email is already taken, which is atomic
+under concurrency, unlike checking ``exists`` before ``create``. The
+returned row is turned into a model directly, skipping ORM-side
+validation and the follow-up fetch.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from tortoise import connections
+
+from app.db.routing import get_tenant_connection
+from app.models.core import CoreUser
+from app.models.tenant import TenantUser
+
+# The verification token is written in the same statement, so registering
+# a core user stays a single round trip
+INSERT_CORE_USER = """
+    WITH new_user AS (
+        INSERT INTO "coreuser"
+            ("email", "password_hash", "is_owner", "is_verified", "token_version",
+             "created_at")
+        VALUES ($1, $2, $3, FALSE, 0, CURRENT_TIMESTAMP)
+        ON CONFLICT ("email") DO NOTHING
+        RETURNING *
+    ), new_token AS (
+        INSERT INTO "verificationtoken"
+            ("token_digest", "expires_at", "created_at", "user_id")
+        SELECT $4, $5, CURRENT_TIMESTAMP, "id" FROM new_user
+    )
+    SELECT * FROM new_user
+"""
+
+INSERT_TENANT_USER = """
+    INSERT INTO "tenantuser"
+        ("email", "password_hash", "is_active", "token_version", "created_at")
+    VALUES ($1, $2, TRUE, 0, CURRENT_TIMESTAMP)
+    ON CONFLICT ("email") DO NOTHING
+    RETURNING *
+"""
+
+
+async def insert_core_user(
+    email: str,
+    password_hash: str,
+    is_owner: bool,
+    token_digest: str,
+    token_expires_at: datetime,
+) -> Optional[CoreUser]:
+    """Insert a core user together with its email verification token"""
+    rows = await connections.get("default").execute_query_dict(
+        INSERT_CORE_USER,
+        [email, password_hash, is_owner, token_digest, token_expires_at],
+    )
+    return CoreUser._init_from_db(**rows[0]) if rows else None
+
+
+async def insert_tenant_user(
+    tenant_id: int, email: str, password_hash: str
+) -> Optional[TenantUser]:
+    client = await get_tenant_connection(tenant_id)
+    rows = await client.execute_query_dict(INSERT_TENANT_USER, [email, password_hash])
+    return TenantUser._init_from_db(**rows[0]) if rows else None
@@ -1,20 +1,32 @@
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from passlib.context import CryptContext
-from tortoise.exceptions import IntegrityError
 
 from app.config import settings
-from app.models.core import (AuthResponse, CoreUser, CoreUser_Pydantic,
-                             Organization, Token, UserLogin, UserRegisterIn)
-from app.services.auth import get_current_user
-from app.services.tenant import create_tenant_database, sync_owner_to_tenant
-from app.utils.auth import authenticate_user, create_access_token
+from app.models.core import (
+    AuthResponse,
+    CoreUser,
+    CoreUser_Pydantic,
+    CoreUserUpdate,
+    ProvisioningJob,
+    RefreshRequest,
+    Token,
+    UserLogin,
+    UserRegisterIn,
+    VerificationToken,
+)
+from app.repositories.users import insert_core_user
+from app.services.auth import end_session, get_current_user, refresh_session
+from app.services.principals import principal_cache
+from app.services.provisioning import enqueue_organization
+from app.services.user_sync import update_core_user
+from app.services.verification import find_verification_token, new_verification_token
+from app.utils.auth import authenticate_user, create_user_token, issue_tokens
+from app.utils.passwords import password_hasher
+from app.utils.serializers import FastJSONResponse, core_user_serializer
 
 router = APIRouter(prefix="/api", tags=["Core Operations (no X-TENANT header)"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
@@ -27,43 +39,25 @@ VERIFICATION_TOKEN_EXPIRY_HOURS = settings.verification_token_expire_hours
     status_code=status.HTTP_201_CREATED,
 )
 async def register_user(user_data: UserRegisterIn):
-    if await CoreUser.exists(email=user_data.email):
+    password_hash = await password_hasher.hash(user_data.password)
+    verification_token, digest, expires_at = new_verification_token()
+    new_user = await insert_core_user(
+        user_data.email, password_hash, user_data.is_owner, digest, expires_at
+    )
+    if new_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
-    try:
-        import secrets
-
-        verification_token = secrets.token_urlsafe(32)
-
-        # Use naive datetime explicitly
-        new_user = await CoreUser.create(
-            email=user_data.email,
-            password_hash=pwd_context.hash(user_data.password),
-            is_owner=user_data.is_owner,
-            verification_token=verification_token,
-            verification_token_created_at=datetime.utcnow(),  # Naive datetime
-        )
-
-        access_token = create_access_token(
-            data={"sub": str(new_user.id), "is_owner": new_user.is_owner},
-            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-        )
-
-        user_response = await CoreUser_Pydantic.from_tortoise_orm(new_user)
-        return {
-            "user": user_response,
-            "access_token": access_token,
+    return FastJSONResponse(
+        {
+            "user": core_user_serializer.serialize(new_user),
+            "access_token": create_user_token(new_user),
             "token_type": "bearer",
             "verification_token": verification_token,
-        }
-
-    except IntegrityError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User creation failed",
-        ) from e
+        },
+        status_code=status.HTTP_201_CREATED,
+    )
 
 
 @router.get("/auth/verify")
@@ -74,27 +68,24 @@ async def verify_email(token: str):
             detail="Verification token is required",
         )
 
-    user = await CoreUser.get_or_none(verification_token=token)
-    if not user:
+    verification = await find_verification_token(token)
+    if not verification:
         raise HTTPException(
             status_code=404, detail="Invalid or expired verification token"
         )
 
+    user = verification.user
     if user.is_verified:
         return {"message": "Email already verified"}
 
-    # Use naive datetime for comparison
-    expiry_threshold = datetime.now(timezone.utc) - timedelta(
-        hours=VERIFICATION_TOKEN_EXPIRY_HOURS
-    )
-
-    if user.verification_token_created_at < expiry_threshold:
+    if verification.expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Verification token has expired")
 
     user.is_verified = True
-    user.verification_token = None
-    user.verification_token_created_at = None
     await user.save()
+    # Tokens are single use, and any others sent to the user are now moot
+    await VerificationToken.filter(user_id=user.id).delete()
+    principal_cache.invalidate(None, user.id)
 
     return {"message": "Email verified successfully"}
 
@@ -122,14 +113,50 @@ async def login_for_access_token(form_data: UserLogin):
             detail="Email not verified. Please verify your email before logging in.",
         )
 
-    access_token = create_access_token(
-        data={"sub": str(user.id), "is_owner": user.is_owner},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(user)
 
 
-@router.post("/organizations")
+@router.post("/auth/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshRequest):
+    return await refresh_session(body.refresh_token)
+
+
+@router.post("/auth/logout")
+async def logout(body: RefreshRequest):
+    await end_session(body.refresh_token)
+    return {"message": "Logged out"}
+
+
+@router.put("/account", response_model=CoreUser_Pydantic)
+async def update_account(
+    user_data: CoreUserUpdate, user: CoreUser = Depends(get_current_user)
+):
+    password_hash = None
+    if user_data.password is not None:
+        password_hash = await password_hasher.hash(user_data.password)
+    # The change reaches the user's tenant databases in the background
+    try:
+        user = await update_core_user(
+            user, email=user_data.email, password_hash=password_hash
+        )
+    finally:
+        principal_cache.invalidate(None, user.id)
+    return FastJSONResponse(core_user_serializer.serialize(user))
+
+
+def provisioning_job_response(job: ProvisioningJob) -> dict:
+    return {
+        "job_id": job.id,
+        "organization_id": job.organization_id,
+        "status": job.status,
+        "step": job.step,
+        "attempts": job.attempts,
+        "error": job.last_error,
+        "status_url": f"/api/organizations/jobs/{job.id}",
+    }
+
+
+@router.post("/organizations", status_code=status.HTTP_202_ACCEPTED)
 async def create_organization(name: str, user: CoreUser = Depends(get_current_user)):
     if not user.is_owner:
         raise HTTPException(
@@ -137,12 +164,16 @@ async def create_organization(name: str, user: CoreUser = Depends(get_current_us
             detail="Only owners can create organizations",
         )
 
-    organization = await Organization.create(name=name, owner=user)
-    tenant_db_name = await create_tenant_database(organization.id)
-    await sync_owner_to_tenant(organization.id, user.id)
+    # The tenant database is provisioned in the background; poll the job
+    job = await enqueue_organization(name, user)
+    return provisioning_job_response(job)
 
-    return {
-        "organization_id": organization.id,
-        "tenant_db_name": tenant_db_name,
-        "message": "Organization created successfully",
-    }
+
+@router.get("/organizations/jobs/{job_id}")
+async def get_provisioning_job(job_id: int, user: CoreUser = Depends(get_current_user)):
+    job = await ProvisioningJob.get_or_none(id=job_id, organization__owner_id=user.id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Provisioning job not found"
+        )
+    return provisioning_job_response(job)
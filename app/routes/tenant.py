@@ -1,20 +1,56 @@
-from datetime import timedelta
+from datetime import datetime
+from typing import List
 
-from fastapi import APIRouter, Depends, Form, Header, HTTPException, status
-from tortoise.exceptions import IntegrityError
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    status,
+)
 
 from app.config import settings
-from app.models.tenant import (TenantUser, TenantUser_Pydantic, TenantUserIn,
-                               TenantUserIn_Pydantic)
-from app.services.auth import get_current_tenant_user
-from app.utils.auth import (authenticate_user, create_access_token,
-                            get_password_hash, pwd_context)
+from app.middleware.tenant_context import get_current_tenant
+from app.models.core import RefreshRequest, Token
+from app.models.tenant import (
+    TenantUser,
+    TenantUser_Pydantic,
+    TenantUserIn,
+    TenantUserIn_Pydantic,
+)
+from app.repositories.users import insert_tenant_user
+from app.services.auth import (
+    end_session,
+    get_current_tenant_claims,
+    get_current_tenant_owner,
+    get_current_tenant_user,
+    refresh_session,
+)
+from app.services.principals import principal_cache
+from app.services.user_import import import_tenant_users, iter_lines
+from app.utils.auth import authenticate_user, issue_tokens
+from app.utils.passwords import password_hasher
+from app.utils.serializers import FastJSONResponse, tenant_user_serializer
 
 router = APIRouter(prefix="/api", tags=["Tenant Operations (with X-TENANT header)"])
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+IMPORT_FORMATS = {"text/csv": "csv", "application/x-ndjson": "ndjson"}
+
+
+def require_tenant() -> int:
+    tenant_id = get_current_tenant()
+    if tenant_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="X-TENANT header is required",
+        )
+    return tenant_id
 
 
 @router.post(
@@ -23,20 +59,18 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
     status_code=status.HTTP_201_CREATED,
 )
 async def register_tenant_user(user_data: TenantUserIn, x_tenant: str = Header(...)):
-    if await TenantUser.exists(email=user_data.email):
+    tenant_id = require_tenant()
+    password_hash = await password_hasher.hash(user_data.password)
+    new_user = await insert_tenant_user(tenant_id, user_data.email, password_hash)
+    if new_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered in this tenant",
         )
-
-    try:
-        user_data.password_hash = get_password_hash(user_data.password)
-        return await TenantUser.create(user_data.model_dump())
-    except IntegrityError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User creation failed",
-        ) from e
+    return FastJSONResponse(
+        tenant_user_serializer.serialize(new_user),
+        status_code=status.HTTP_201_CREATED,
+    )
 
 
 @router.post("/auth/login", response_model=dict)
@@ -51,18 +85,35 @@ async def login_tenant_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(
-        data={"sub": str(user.id)},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(user, tenant_id=get_current_tenant())
+
+
+@router.post("/auth/refresh", response_model=Token)
+async def refresh_tenant_token(body: RefreshRequest, x_tenant: str = Header(...)):
+    return await refresh_session(body.refresh_token)
+
+
+@router.post("/auth/logout")
+async def logout_tenant_user(body: RefreshRequest, x_tenant: str = Header(...)):
+    await end_session(body.refresh_token)
+    return {"message": "Logged out"}
 
 
 @router.get("/users/me", response_model=TenantUser_Pydantic)
 async def get_current_user_profile(
-    user: TenantUser = Depends(get_current_tenant_user), x_tenant: str = Header(...)
+    claims: dict = Depends(get_current_tenant_claims), x_tenant: str = Header(...)
 ):
-    return user
+    # Served from the token alone; any change to these fields bumps the
+    # user's token_version, invalidating tokens that carry the old values
+    return FastJSONResponse(
+        {
+            "id": int(claims["sub"]),
+            "email": claims["email"],
+            # Rendered like every other timestamp, with a ``Z`` suffix
+            "created_at": datetime.fromisoformat(claims["created_at"]),
+            "is_active": claims["is_active"],
+        }
+    )
 
 
 @router.put("/users/me", response_model=TenantUser_Pydantic)
@@ -71,6 +122,50 @@ async def update_current_user_profile(
     user: TenantUser = Depends(get_current_tenant_user),
     x_tenant: str = Header(...),
 ):
+    # Edit the stored row, not the principal the token was checked against
+    user = await TenantUser.get(id=user.id)
     user.email = user_data.email
-    await user.save()
-    return user
+    user.token_version += 1
+    try:
+        await user.save()
+    finally:
+        principal_cache.invalidate(get_current_tenant(), user.id)
+    return FastJSONResponse(tenant_user_serializer.serialize(user))
+
+
+@router.get("/users", response_model=List[TenantUser_Pydantic])
+async def list_users(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    user: TenantUser = Depends(get_current_tenant_user),
+    x_tenant: str = Header(...),
+):
+    # Plain tuples: no model instance is needed to serialize a row
+    rows = (
+        await TenantUser.all()
+        .order_by("id")
+        .offset(offset)
+        .limit(limit)
+        .values_list(*tenant_user_serializer.fields)
+    )
+    return FastJSONResponse(tenant_user_serializer.serialize_rows(rows))
+
+
+@router.post("/users/import")
+async def import_users(
+    request: Request,
+    user: TenantUser = Depends(get_current_tenant_owner),
+    x_tenant: str = Header(...),
+):
+    tenant_id = require_tenant()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload users as text/csv or application/x-ndjson",
+        )
+    return await import_tenant_users(
+        tenant_id,
+        iter_lines(request.stream()),
+        IMPORT_FORMATS[content_type],
+    )
@@ -1,39 +1,87 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError
 from tortoise.exceptions import DoesNotExist
 
 from app.config import settings
+from app.middleware.tenant_context import get_current_tenant
 from app.models.core import CoreUser
 from app.models.tenant import TenantUser
+from app.services.principals import principal_cache
+from app.services.revocations import revocation_list
+from app.utils.auth import issue_tokens
+from app.utils.cache import MISSING
+from app.utils.tokens import token_verifier
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def credentials_error() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+async def get_current_claims(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    """
+    Verify the token and return its claims without loading the user.
+
+    The token must have been issued for the tenant of the current request
+    (``tid`` is ``None`` for core tokens), so it cannot be replayed against
+    another tenant. Handlers that only read the profile fields carried in
+    the token can depend on this instead of a user lookup.
+    """
     try:
-        payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
-        )
-        user_id: str = payload.get("sub")
-        if not user_id:
-            raise credentials_exception
+        claims = token_verifier.decode(token)
     except JWTError as e:
-        raise credentials_exception from e
+        raise credentials_error() from e
 
-    try:
-        return (
-            await CoreUser.get(id=user_id)
-            if request.state.is_core
-            else await TenantUser.get(id=user_id)
-        )
-    except DoesNotExist as exc:
-        raise credentials_exception from exc
+    if (
+        not claims.get("sub")
+        or claims.get("tid") != get_current_tenant()
+        or claims.get("typ") == "refresh"
+    ):
+        raise credentials_error()
+    if "sid" in claims and await revocation_list.is_revoked(claims["sid"]):
+        raise credentials_error()
+    return claims
+
+
+async def load_principal(model, claims: Dict[str, Any]):
+    """
+    Load the token's user through the principal cache.
+
+    The token is rejected unless its ``ver`` claim matches the user's
+    ``token_version``, which is bumped whenever a field carried in the token
+    changes. A token newer than the cached user forces a reload.
+    """
+    tenant_id = get_current_tenant()
+    user_id = claims["sub"]
+    version = claims.get("ver", 0)
+
+    user = principal_cache.get(tenant_id, user_id)
+    if user is MISSING or user.token_version < version:
+        try:
+            user = await model.get(id=user_id)
+        except DoesNotExist as exc:
+            raise credentials_error() from exc
+        principal_cache.set(tenant_id, user_id, user)
+
+    if user.token_version != version:
+        raise credentials_error()
+    return user
+
+
+async def get_current_user(
+    request: Request, claims: Dict[str, Any] = Depends(get_current_claims)
+):
+    model = CoreUser if request.state.is_core else TenantUser
+    return await load_principal(model, claims)
 
 
 async def get_current_owner_user(current_user: CoreUser = Depends(get_current_user)):
@@ -45,27 +93,73 @@ async def get_current_owner_user(current_user: CoreUser = Depends(get_current_us
     return current_user
 
 
-async def get_current_tenant_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_current_tenant_claims(
+    claims: Dict[str, Any] = Depends(get_current_claims)
+) -> Dict[str, Any]:
+    if claims["tid"] is None:
+        raise credentials_error()
+    return claims
 
-    try:
-        payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
+
+async def get_current_tenant_user(
+    claims: Dict[str, Any] = Depends(get_current_tenant_claims)
+):
+    return await load_principal(TenantUser, claims)
+
+
+async def get_current_tenant_owner(
+    user: TenantUser = Depends(get_current_tenant_user),
+) -> TenantUser:
+    """The tenant's copy of its organization owner, synced at provisioning"""
+    owner = await CoreUser.get_or_none(organizations__id=get_current_tenant())
+    if owner is None or owner.email != user.email:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the organization owner can perform this action",
         )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError as e:
-        raise credentials_exception from e
+    return user
+
 
+def _refresh_claims(refresh_token: str) -> Dict[str, Any]:
     try:
-        user = await TenantUser.get(email=email)
-        if user is None:
-            raise credentials_exception
-        return user
-    except DoesNotExist as exc:
-        raise credentials_exception from exc
+        claims = token_verifier.decode(refresh_token)
+    except JWTError as e:
+        raise credentials_error() from e
+
+    if claims.get("typ") != "refresh" or claims.get("tid") != get_current_tenant():
+        raise credentials_error()
+    return claims
+
+
+def _session_expiry() -> datetime:
+    # Rotation keeps extending a session, so a revoked session id must
+    # outlive any refresh token issued for it
+    return datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
+
+
+async def refresh_session(refresh_token: str) -> Dict[str, str]:
+    """
+    Exchange a refresh token for a new access and refresh token pair.
+
+    Each refresh token is single use. Presenting one that was already
+    exchanged means it leaked, so its whole session is revoked.
+    """
+    claims = _refresh_claims(refresh_token)
+    if await revocation_list.is_revoked(claims["sid"]):
+        raise credentials_error()
+
+    expires_at = datetime.utcfromtimestamp(claims["exp"])
+    if not await revocation_list.revoke(claims["jti"], expires_at):
+        await revocation_list.revoke(claims["sid"], _session_expiry())
+        raise credentials_error()
+
+    tenant_id = get_current_tenant()
+    model = CoreUser if tenant_id is None else TenantUser
+    user = await load_principal(model, claims)
+    return issue_tokens(user, tenant_id, session_id=claims["sid"])
+
+
+async def end_session(refresh_token: str) -> None:
+    """Revoke the session a refresh token belongs to"""
+    claims = _refresh_claims(refresh_token)
+    await revocation_list.revoke(claims["sid"], _session_expiry())
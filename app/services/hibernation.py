@@ -0,0 +1,439 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+import asyncpg
+from tortoise import connections
+from tortoise.exceptions import BaseORMException
+
+from app.config import settings
+from app.db.admin import admin_pools
+from app.db.pool import tenant_alias, tenant_pools
+from app.db.shards import shard_admin_urls, shard_map, tenant_database_url
+from app.models.core import Organization, OrganizationStatus
+from app.services.tenant_directory import tenant_directory
+from app.services.tenant_migrations import TenantMigrationRunner
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock(HIBERNATION_LOCK, tenant_id) on the core database
+# serialises hibernating and restoring a tenant across processes
+HIBERNATION_LOCK = 0x68626E74
+
+DISCONNECT = """
+    SELECT pg_terminate_backend(pid) FROM pg_stat_activity
+    WHERE datname = $1 AND pid <> pg_backend_pid()
+"""
+
+# Tenants connect with the role owning their database, which neither
+# REVOKE CONNECT nor a connection limit would keep out; making its new
+# sessions read-only does, and pg_dump only reads. Without --create the
+# setting is not dumped, so a restored database accepts writes again.
+BLOCK_WRITES = 'ALTER DATABASE "{}" SET default_transaction_read_only = on'
+ALLOW_WRITES = 'ALTER DATABASE "{}" RESET default_transaction_read_only'
+
+
+class HibernationError(Exception):
+    """A tenant database could not be archived or restored"""
+
+
+def pg_tool_connection(url: str) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Split a database URL into libpq options and environment.
+
+    The password goes in ``PGPASSWORD``: any local user can read a process's
+    arguments, but not its environment.
+    """
+    parts = urlsplit(url)
+    args = [f"--host={parts.hostname}", f"--port={parts.port or 5432}"]
+    if parts.username:
+        args.append(f"--username={unquote(parts.username)}")
+    args.append(f"--dbname={unquote(parts.path.lstrip('/'))}")
+    env = dict(os.environ)
+    if parts.password:
+        env["PGPASSWORD"] = unquote(parts.password)
+    return args, env
+
+
+async def run_pg_tool(tool: str, url: str, *args: str) -> None:
+    """Run pg_dump or pg_restore on a database, raising with its stderr if it fails"""
+    connection_args, env = pg_tool_connection(url)
+    process = await asyncio.create_subprocess_exec(
+        tool,
+        *connection_args,
+        *args,
+        env=env,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise HibernationError(
+            f"{Path(tool).name} exited with {process.returncode}: "
+            f"{stderr.decode(errors='replace').strip()}"
+        )
+
+
+class TenantHibernation:
+    """
+    Archives idle tenant databases to local dump files and restores them.
+
+    Requests mark their tenant active in memory, and the marks are written
+    to ``Organization.last_active_at`` every ``flush_interval`` seconds.
+    Every ``interval`` seconds, up to ``batch_size`` tenants idle for longer
+    than ``idle_after`` are hibernated one at a time:
+
+    1. The organization is marked hibernated, and other processes are given
+       ``drain`` seconds for their cached status to expire.
+    2. The database is dumped with ``pg_dump --format=custom`` into ``dump_dir``.
+    3. The database is dropped.
+
+    The next request for the tenant restores it via ``wake``. The dump is
+    restored into a scratch database that is renamed into place once
+    complete, so a tenant database that exists is always whole. Pending
+    migrations are then applied. A per-tenant advisory lock keeps
+    hibernation and restore from overlapping, and within a process
+    concurrent requests share one restore.
+
+    Args:
+        idle_after: Seconds without requests before a tenant is hibernated;
+            0 only tracks activity
+        restore_timeout: Seconds a request waits for its tenant to be
+            restored; the restore carries on in the background afterwards
+    """
+
+    def __init__(
+        self,
+        idle_after: float,
+        interval: float,
+        batch_size: int,
+        dump_dir: str,
+        compression: int,
+        restore_timeout: float,
+        flush_interval: float,
+        drain: float,
+    ):
+        self.idle_after = idle_after
+        self.interval = interval
+        self.batch_size = batch_size
+        self.dump_dir = Path(dump_dir)
+        self.compression = compression
+        self.restore_timeout = restore_timeout
+        self.flush_interval = flush_interval
+        self.drain = drain
+        self.hibernated = 0
+        self.restored = 0
+        self.failed = 0
+        self.hibernate_seconds = 0.0
+        self.restore_seconds = 0.0
+        self.restore_seconds_max = 0.0
+        self._active: Set[int] = set()
+        self._restoring: Dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def dump_path(self, tenant_id: int) -> Path:
+        return self.dump_dir / f"{tenant_alias(tenant_id)}.dump"
+
+    def touch(self, tenant_id: int) -> None:
+        """Record a request for the tenant, written out on the next flush"""
+        self._active.add(tenant_id)
+
+    async def flush_activity(self) -> int:
+        if not self._active:
+            return 0
+        tenant_ids, self._active = list(self._active), set()
+        try:
+            await Organization.filter(id__in=tenant_ids).using_db(
+                connections.get("default")
+            ).update(last_active_at=datetime.utcnow())
+        except BaseException:
+            self._active.update(tenant_ids)
+            raise
+        return len(tenant_ids)
+
+    @asynccontextmanager
+    async def _tenant_lock(self, tenant_id: int, wait: bool) -> AsyncIterator[bool]:
+        # The lock is held through the drain and a whole dump or restore, so
+        # it gets a connection of its own rather than one from the core pool
+        # that requests need; closing it releases the lock
+        conn = await asyncpg.connect(settings.database_url)
+        try:
+            if wait:
+                await conn.execute(
+                    "SELECT pg_advisory_lock($1, $2)", HIBERNATION_LOCK, tenant_id
+                )
+                locked = True
+            else:
+                locked = await conn.fetchval(
+                    "SELECT pg_try_advisory_lock($1, $2)", HIBERNATION_LOCK, tenant_id
+                )
+            yield locked
+        finally:
+            await conn.close()
+
+    async def idle_tenants(self) -> List[int]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.idle_after)
+        return await (
+            Organization.filter(
+                status=OrganizationStatus.ACTIVE, last_active_at__lt=cutoff
+            )
+            .using_db(connections.get("default"))
+            .order_by("last_active_at")
+            .limit(self.batch_size)
+            .values_list("id", flat=True)
+        )
+
+    async def hibernate(self, tenant_id: int) -> bool:
+        """
+        Archive and drop an idle tenant's database.
+
+        Returns:
+            ``False`` if the tenant is locked or no longer idle
+        """
+        async with self._tenant_lock(tenant_id, wait=False) as locked:
+            if not locked:
+                return False
+            db = connections.get("default")
+            cutoff = datetime.utcnow() - timedelta(seconds=self.idle_after)
+            claimed = (
+                await Organization.filter(
+                    id=tenant_id,
+                    status=OrganizationStatus.ACTIVE,
+                    last_active_at__lt=cutoff,
+                )
+                .using_db(db)
+                .update(status=OrganizationStatus.HIBERNATED)
+            )
+            if not claimed:
+                return False
+            tenant_directory.invalidate(tenant_id)
+
+            started = time.monotonic()
+            try:
+                # Requests seeing the new status wait on the lock to restore
+                await asyncio.sleep(self.drain)
+                await self._archive(tenant_id)
+            except BaseException:
+                self.failed += 1
+                try:
+                    await self._allow_writes(tenant_id)
+                except (OSError, asyncpg.PostgresError, BaseORMException) as e:
+                    logger.warning(
+                        "Tenant %s: re-allowing writes failed: %s", tenant_id, e
+                    )
+                await Organization.filter(id=tenant_id).using_db(db).update(
+                    status=OrganizationStatus.ACTIVE
+                )
+                tenant_directory.invalidate(tenant_id)
+                raise
+            self.hibernated += 1
+            self.hibernate_seconds += time.monotonic() - started
+            logger.info("Tenant %s: hibernated", tenant_id)
+            return True
+
+    async def _allow_writes(self, tenant_id: int) -> None:
+        admin_url, _ = shard_admin_urls(await shard_map.locate(tenant_id))
+        async with admin_pools.acquire(admin_url) as admin:
+            await admin.execute(ALLOW_WRITES.format(tenant_alias(tenant_id)))
+
+    async def _archive(self, tenant_id: int) -> None:
+        database_name = tenant_alias(tenant_id)
+        admin_url, _ = shard_admin_urls(await shard_map.locate(tenant_id))
+        path = self.dump_path(tenant_id)
+        partial_path = path.with_suffix(".partial")
+
+        # Nothing may commit after pg_dump takes its snapshot: sessions
+        # opened from now on are read-only and every open one is ended
+        await tenant_pools.discard(tenant_id)
+        async with admin_pools.acquire(admin_url) as admin:
+            await admin.execute(BLOCK_WRITES.format(database_name))
+            await admin.execute(DISCONNECT, database_name)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        await run_pg_tool(
+            settings.pg_dump_path,
+            tenant_database_url(database_name, admin_url.rsplit("/", 1)[0]),
+            "--format=custom",
+            f"--compress={self.compression}",
+            f"--file={partial_path}",
+        )
+        os.replace(partial_path, path)
+
+        async with admin_pools.acquire(admin_url) as admin:
+            await admin.execute(DISCONNECT, database_name)
+            await admin.execute(f'DROP DATABASE IF EXISTS "{database_name}"')
+
+    async def sweep(self) -> int:
+        """Hibernate a batch of idle tenants, returning how many"""
+        hibernated = 0
+        for tenant_id in await self.idle_tenants():
+            try:
+                hibernated += await self.hibernate(tenant_id)
+            except (
+                OSError,
+                asyncpg.PostgresError,
+                BaseORMException,
+                HibernationError,
+            ) as e:
+                logger.warning("Hibernating tenant %s failed: %s", tenant_id, e)
+        return hibernated
+
+    async def restore(self, tenant_id: int) -> None:
+        """Bring a hibernated tenant's database back and mark it active"""
+        started = time.monotonic()
+        try:
+            async with self._tenant_lock(tenant_id, wait=True):
+                db = connections.get("default")
+                rows = (
+                    await Organization.filter(id=tenant_id)
+                    .using_db(db)
+                    .values_list("status", flat=True)
+                )
+                if rows and rows[0] == OrganizationStatus.HIBERNATED:
+                    await self._rehydrate(tenant_id)
+                    # The dump may predate migrations added since
+                    await TenantMigrationRunner(
+                        workers=1, timeout=settings.tenant_migration_timeout
+                    ).migrate_tenant(tenant_id)
+                    await Organization.filter(id=tenant_id).using_db(db).update(
+                        status=OrganizationStatus.ACTIVE,
+                        last_active_at=datetime.utcnow(),
+                    )
+                    self._remove_dump(tenant_id)
+                    elapsed = time.monotonic() - started
+                    self.restored += 1
+                    self.restore_seconds += elapsed
+                    self.restore_seconds_max = max(self.restore_seconds_max, elapsed)
+                    logger.info("Tenant %s: restored in %.1fs", tenant_id, elapsed)
+        except (OSError, asyncpg.PostgresError, BaseORMException) as e:
+            raise HibernationError(str(e)) from e
+        finally:
+            # Also picks up a restore done by another process
+            tenant_directory.invalidate(tenant_id)
+
+    async def _rehydrate(self, tenant_id: int) -> None:
+        database_name = tenant_alias(tenant_id)
+        restoring = f"{database_name}_restoring"
+        admin_url, base_url = shard_admin_urls(await shard_map.locate(tenant_id))
+
+        async with admin_pools.acquire(admin_url) as admin:
+            if await admin.fetchval(
+                "SELECT 1 FROM pg_database WHERE datname = $1", database_name
+            ):
+                # Hibernation was interrupted before the database was dropped
+                await admin.execute(ALLOW_WRITES.format(database_name))
+                return
+            path = self.dump_path(tenant_id)
+            if not path.exists():
+                raise HibernationError(f"No archive for tenant {tenant_id} at {path}")
+            await admin.execute(f'DROP DATABASE IF EXISTS "{restoring}"')
+            await admin.execute(f'CREATE DATABASE "{restoring}"')
+
+        await run_pg_tool(
+            settings.pg_restore_path,
+            tenant_database_url(restoring, base_url),
+            "--no-owner",
+            "--exit-on-error",
+            str(path),
+        )
+
+        async with admin_pools.acquire(admin_url) as admin:
+            await admin.execute(DISCONNECT, restoring)
+            await admin.execute(
+                f'ALTER DATABASE "{restoring}" RENAME TO "{database_name}"'
+            )
+
+    def _remove_dump(self, tenant_id: int) -> None:
+        try:
+            self.dump_path(tenant_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    async def wake(self, tenant_id: int) -> None:
+        """
+        Restore a hibernated tenant, waiting at most ``restore_timeout``.
+
+        Raises:
+            asyncio.TimeoutError: The restore is still running
+            HibernationError: The restore failed
+        """
+        restoring = self._restoring.get(tenant_id)
+        if restoring is None:
+            restoring = asyncio.ensure_future(self.restore(tenant_id))
+            restoring.add_done_callback(partial(self._restore_done, tenant_id))
+            self._restoring[tenant_id] = restoring
+        # Shielded so a request giving up does not abandon the restore
+        await asyncio.wait_for(asyncio.shield(restoring), self.restore_timeout)
+
+    def _restore_done(self, tenant_id: int, restoring: asyncio.Future) -> None:
+        self._restoring.pop(tenant_id, None)
+        if not restoring.cancelled() and restoring.exception() is not None:
+            self.failed += 1
+            logger.warning(
+                "Restoring tenant %s failed: %s", tenant_id, restoring.exception()
+            )
+
+    async def _watch(self) -> None:
+        next_sweep = time.monotonic() + self.interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_activity()
+            except (OSError, BaseORMException) as e:
+                logger.warning("Recording tenant activity failed: %s", e)
+            if self.idle_after > 0 and time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.interval
+                try:
+                    await self.sweep()
+                except (OSError, BaseORMException) as e:
+                    logger.warning("Tenant hibernation sweep failed: %s", e)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for restoring in list(self._restoring.values()):
+            restoring.cancel()
+        try:
+            await self.flush_activity()
+        except (OSError, BaseORMException) as e:
+            logger.warning("Recording tenant activity failed: %s", e)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hibernated": self.hibernated,
+            "restored": self.restored,
+            "failed": self.failed,
+            "restoring": len(self._restoring),
+            "hibernate_seconds_total": round(self.hibernate_seconds, 3),
+            "restore_seconds_total": round(self.restore_seconds, 3),
+            "restore_seconds_max": round(self.restore_seconds_max, 3),
+        }
+
+
+tenant_hibernation = TenantHibernation(
+    # Schema-mode tenants share one database and are never hibernated
+    idle_after=(
+        settings.tenant_hibernate_after
+        if settings.tenant_isolation == "database"
+        else 0.0
+    ),
+    interval=settings.tenant_hibernation_interval,
+    batch_size=settings.tenant_hibernation_batch_size,
+    dump_dir=settings.tenant_hibernation_dir,
+    compression=settings.tenant_hibernation_compression,
+    restore_timeout=settings.tenant_restore_timeout,
+    flush_interval=settings.tenant_activity_flush_interval,
+    drain=settings.tenant_cache_ttl,
+)
@@ -0,0 +1,49 @@
+import copy
+from typing import Any, Optional, Tuple, Union
+
+from app.config import settings
+from app.utils.cache import MISSING, TTLCache
+
+
+class PrincipalCache:
+    """
+    Authenticated users by (tenant, subject), so that most requests carrying
+    a token skip the user lookup.
+
+    Every caller gets its own shallow copy, so a request changing the user
+    it was handed leaves the cached one alone. Routes that change a user
+    must still call ``invalidate`` so the next request reloads it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(
+        tenant_id: Optional[int], subject: Union[int, str]
+    ) -> Tuple[Optional[int], str]:
+        # Tokens carry the user id as a string, routes hold it as an int
+        return tenant_id, str(subject)
+
+    def get(self, tenant_id: Optional[int], subject: Union[int, str]) -> Any:
+        user = self._cache.get(self._key(tenant_id, subject))
+        return user if user is MISSING else copy.copy(user)
+
+    def set(
+        self, tenant_id: Optional[int], subject: Union[int, str], user: Any
+    ) -> None:
+        self._cache.set(self._key(tenant_id, subject), copy.copy(user))
+
+    def invalidate(self, tenant_id: Optional[int], subject: Union[int, str]) -> None:
+        self._cache.pop(self._key(tenant_id, subject))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl
+)
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.models.core import (
+    CoreUser,
+    Organization,
+    OrganizationStatus,
+    ProvisioningJob,
+    ProvisioningStatus,
+    TenantShard,
+    TenantSyncCheckpoint,
+)
+from app.services.tenant import (
+    create_tenant_database,
+    drop_tenant_database,
+    sync_owner_to_tenant,
+)
+from app.services.tenant_directory import tenant_directory
+from app.services.user_sync import sync_checkpoint
+
+logger = logging.getLogger(__name__)
+
+# Claims due jobs, and running jobs whose worker let the lease lapse, in one
+# statement. SKIP LOCKED lets every process poll the same table.
+CLAIM_JOBS = """
+    UPDATE "provisioningjob"
+    SET "status" = 'running',
+        "attempts" = "attempts" + 1,
+        "locked_until" = CURRENT_TIMESTAMP + $1 * INTERVAL '1 second',
+        "updated_at" = CURRENT_TIMESTAMP
+    WHERE "id" IN (
+        SELECT "id" FROM "provisioningjob"
+        WHERE ("status" = 'pending' AND "run_after" <= CURRENT_TIMESTAMP)
+           OR ("status" = 'running' AND "locked_until" < CURRENT_TIMESTAMP)
+        ORDER BY "run_after"
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+"""
+
+
+async def enqueue_organization(name: str, owner: CoreUser) -> ProvisioningJob:
+    """Create an organization in the provisioning state and its job"""
+    async with in_transaction("default") as db:
+        organization = await Organization.create(
+            name=name,
+            owner=owner,
+            status=OrganizationStatus.PROVISIONING,
+            using_db=db,
+        )
+        job = await ProvisioningJob.create(
+            organization=organization, run_after=datetime.utcnow(), using_db=db
+        )
+        # The owner step copies the owner as they are now; later changes to
+        # them reach the tenant through the user change dispatcher
+        await TenantSyncCheckpoint.create(
+            organization=organization,
+            position=await sync_checkpoint(owner.id),
+            using_db=db,
+        )
+    provisioning_worker.notify()
+    return job
+
+
+async def provision(job: ProvisioningJob) -> None:
+    """
+    Run the job's remaining steps, recording each one as it completes.
+
+    Every step can safely be repeated, since a worker may die between
+    finishing a step and recording it.
+    """
+    db = connections.get("default")
+    organization = await Organization.get(id=job.organization_id, using_db=db)
+
+    async def advance(step: str) -> None:
+        job.step = step
+        await ProvisioningJob.filter(id=job.id).using_db(db).update(step=step)
+
+    if job.step == "database":
+        await create_tenant_database(organization.id)
+        await advance("owner")
+    if job.step == "owner":
+        await sync_owner_to_tenant(organization.id, organization.owner_id)
+        await advance("activate")
+    if job.step == "activate":
+        await Organization.filter(id=organization.id).using_db(db).update(
+            status=OrganizationStatus.ACTIVE
+        )
+        tenant_directory.invalidate(organization.id)
+
+
+class ProvisioningWorker:
+    """
+    Runs organization provisioning jobs from the ``provisioningjob`` table.
+
+    At most ``concurrency`` jobs run at once per process. A failed job is
+    retried after ``retry_delay`` seconds, doubling each attempt, and after
+    ``max_attempts`` its tenant database is dropped and it and its
+    organization are marked failed.
+    A claimed job holds a ``lease`` of that many seconds, after which any
+    worker may reclaim it.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_delay: float,
+        lease: float,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self._running: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake the worker for a job enqueued by this process"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def claim(self, limit: int) -> List[ProvisioningJob]:
+        rows = await connections.get("default").execute_query_dict(
+            CLAIM_JOBS, [self.lease, limit]
+        )
+        return [ProvisioningJob._init_from_db(**row) for row in rows]
+
+    async def _update(self, job: ProvisioningJob, **fields) -> None:
+        await ProvisioningJob.filter(id=job.id).using_db(
+            connections.get("default")
+        ).update(locked_until=None, **fields)
+
+    async def run(self, job: ProvisioningJob) -> None:
+        try:
+            await provision(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight back instead of waiting
+            # for the lease to lapse
+            await self._update(job, status=ProvisioningStatus.PENDING)
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            self.succeeded += 1
+            await self._update(
+                job, status=ProvisioningStatus.SUCCEEDED, last_error=None
+            )
+
+    async def _fail(self, job: ProvisioningJob, error: Exception) -> None:
+        logger.warning(
+            "Provisioning organization %s failed (attempt %s): %s",
+            job.organization_id,
+            job.attempts,
+            error,
+        )
+        if job.attempts < self.max_attempts:
+            self.retried += 1
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            await self._update(
+                job,
+                status=ProvisioningStatus.PENDING,
+                last_error=str(error),
+                run_after=datetime.utcnow() + timedelta(seconds=delay),
+            )
+            return
+
+        self.failed += 1
+        try:
+            await drop_tenant_database(job.organization_id)
+        except Exception as e:
+            logger.warning(
+                "Cleaning up organization %s failed: %s", job.organization_id, e
+            )
+        # Nothing retries a failed job, so its organization fails with it and
+        # loses the rows made for its tenant. One transaction, so a reclaimed
+        # job never finds the organization failed but itself still running.
+        async with in_transaction("default") as db:
+            await TenantShard.filter(organization_id=job.organization_id).using_db(
+                db
+            ).delete()
+            await TenantSyncCheckpoint.filter(
+                organization_id=job.organization_id
+            ).using_db(db).delete()
+            await Organization.filter(id=job.organization_id).using_db(db).update(
+                status=OrganizationStatus.FAILED
+            )
+            await ProvisioningJob.filter(id=job.id).using_db(db).update(
+                status=ProvisioningStatus.FAILED,
+                locked_until=None,
+                last_error=str(error),
+            )
+        tenant_directory.invalidate(job.organization_id)
+
+    def _spawn(self, job: ProvisioningJob) -> None:
+        task = asyncio.ensure_future(self.run(job))
+        self._running.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self.notify()
+
+    async def _watch(self, wake: asyncio.Event) -> None:
+        while True:
+            wake.clear()
+            free = self.concurrency - len(self._running)
+            if free > 0:
+                try:
+                    for job in await self.claim(free):
+                        self._spawn(job)
+                except Exception as e:
+                    # Pool timeouts and dropped connections included; the
+                    # loop must outlive them or no job is claimed again
+                    logger.warning("Claiming provisioning jobs failed: %s", e)
+            try:
+                await asyncio.wait_for(wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._watch(self._wake))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._running:
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": len(self._running),
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+provisioning_worker = ProvisioningWorker(
+    concurrency=settings.provisioning_concurrency,
+    poll_interval=settings.provisioning_poll_interval,
+    max_attempts=settings.provisioning_max_attempts,
+    retry_delay=settings.provisioning_retry_delay,
+    lease=settings.provisioning_job_lease,
+)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from tortoise import connections
+from tortoise.exceptions import BaseORMException, IntegrityError
+
+from app.config import settings
+from app.models.core import RevokedToken
+from app.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    Revoked token and session ids, checked without touching the database.
+
+    Ids live in the ``revokedtoken`` table and are mirrored into a Bloom
+    filter, refreshed every ``sync_interval`` seconds. Ids missing from the
+    filter are certainly not revoked; a hit is confirmed against the table,
+    so false positives cost one query and never reject a valid token. Ids
+    revoked by another process are seen after the next sync.
+    """
+
+    # Full rebuilds drop expired ids from the filter and the table
+    REBUILD_EVERY = 60
+
+    def __init__(self, capacity: int, error_rate: float, sync_interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.checks = 0
+        self.fallbacks = 0
+        self._filter = BloomFilter(capacity, error_rate)
+        self._last_id = 0
+        self._syncs = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _db():
+        # Revocations are global, so they always live in the core database
+        return connections.get("default")
+
+    async def is_revoked(self, token_id: str) -> bool:
+        self.checks += 1
+        if token_id not in self._filter:
+            return False
+        self.fallbacks += 1
+        return await RevokedToken.filter(jti=token_id).using_db(self._db()).exists()
+
+    async def revoke(self, token_id: str, expires_at: datetime) -> bool:
+        """Revoke an id, returning ``False`` if it was already revoked"""
+        try:
+            await RevokedToken.create(
+                jti=token_id, expires_at=expires_at, using_db=self._db()
+            )
+        except IntegrityError:
+            return False
+        finally:
+            self._filter.add(token_id)
+        return True
+
+    async def sync(self) -> None:
+        """Add ids revoked since the last sync to the filter"""
+        self._syncs += 1
+        if self._syncs % self.REBUILD_EVERY == 0:
+            await self.rebuild()
+            return
+
+        rows = (
+            await RevokedToken.filter(id__gt=self._last_id)
+            .using_db(self._db())
+            .order_by("id")
+            .values_list("id", "jti")
+        )
+        if len(self._filter) + len(rows) > self._filter.capacity:
+            await self.rebuild()
+            return
+        for row_id, token_id in rows:
+            self._filter.add(token_id)
+            self._last_id = row_id
+
+    async def rebuild(self) -> None:
+        """Reload the filter from unexpired ids, deleting expired ones"""
+        db = self._db()
+        await RevokedToken.filter(expires_at__lte=datetime.utcnow()).using_db(
+            db
+        ).delete()
+        rows = (
+            await RevokedToken.all()
+            .using_db(db)
+            .order_by("id")
+            .values_list("id", "jti")
+        )
+
+        revoked = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for row_id, token_id in rows:
+            revoked.add(token_id)
+            self._last_id = row_id
+        self._filter = revoked
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except (OSError, BaseORMException) as e:
+                logger.warning("Revocation list sync failed: %s", e)
+
+    def start_sync(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "filtered": len(self._filter),
+            "checks": self.checks,
+            "fallbacks": self.fallbacks,
+        }
+
+
+revocation_list = RevocationList(
+    capacity=settings.revocation_filter_capacity,
+    error_rate=settings.revocation_filter_error_rate,
+    sync_interval=settings.revocation_sync_interval,
+)
@@ -1,38 +1,104 @@
+import importlib
+import logging
+from typing import List, Optional
+
 import asyncpg
 from aerich import Command
 from fastapi import HTTPException, status
-from tortoise import Tortoise
-from tortoise.exceptions import ConfigurationError, DoesNotExist
+from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import BaseORMException, ConfigurationError, DoesNotExist
 
 from app.config import settings
-from app.db.routing import get_tenant_connection
-from app.models.core import CoreUser
-from app.models.tenant import TenantUser
+from app.db.admin import admin_pools
+from app.db.pool import tenant_alias, tenant_pools
+from app.db.shards import (
+    DEFAULT_SHARD,
+    shard_admin_urls,
+    shard_map,
+    tenant_database_url,
+)
+from app.models.core import CoreUser, Organization, OrganizationStatus
+from app.repositories.users import insert_tenant_user
+from app.services.tenant_migrations import TenantMigrationRunner
+from app.services.tenant_template import clone_tenant_database, promote_tenant_template
+from app.services.warm_pool import SPARE_PREFIX, list_databases, tenant_warm_pool
+
+logger = logging.getLogger(__name__)
 
 
 async def create_tenant_database(organization_id: int):
-    conn = await asyncpg.connect(settings.database_url)
-    database_name = f"tenant_{organization_id}"
+    if settings.tenant_isolation == "schema":
+        return await create_tenant_schema(organization_id)
+
+    shard = await shard_map.place(organization_id)
+    admin_url, base_url = shard_admin_urls(shard)
+    database_name = tenant_alias(organization_id)
 
     try:
-        exists = await conn.fetchval(
-            "SELECT 1 FROM pg_database WHERE datname = $1", database_name
-        )
-        if not exists:
-            await conn.execute(f'CREATE DATABASE "{database_name}"')
-        await init_tenant_schema(database_name)
+        async with admin_pools.acquire(admin_url) as conn:
+            exists = await conn.fetchval(
+                "SELECT 1 FROM pg_database WHERE datname = $1", database_name
+            )
+            ready = not exists and (
+                await tenant_warm_pool.claim(conn, database_name, shard)
+                or await clone_tenant_database(conn, database_name)
+            )
+            if not exists and not ready:
+                await conn.execute(f'CREATE DATABASE "{database_name}"')
+
+        # The admin connection is released before touching the tenant
+        # database. A new one gets every migration, and a spare or template
+        # clone those added since it was built.
+        applied = await migrate_tenant(organization_id)
+        if ready and applied:
+            logger.warning("Tenant template is stale, migrated %s", database_name)
         return database_name
-    except asyncpg.PostgresError as e:
+    except (asyncpg.PostgresError, BaseORMException) as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to create tenant database: {str(e)}"
         )
-    finally:
-        await conn.close()
 
 
-async def init_tenant_schema(db_name: str):
-    base_url = settings.database_url.rsplit("/", 1)[0]
-    db_url = f"{base_url}/{db_name}"
+async def create_tenant_schema(organization_id: int):
+    schema_name = tenant_alias(organization_id)
+
+    try:
+        async with admin_pools.acquire(tenant_pools.shared_url) as conn:
+            await conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"')
+        # Tenant clients pin search_path to the schema, where the DDL lands
+        await migrate_tenant(organization_id)
+        return schema_name
+    except (asyncpg.PostgresError, BaseORMException) as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to create tenant schema: {str(e)}"
+        )
+
+
+def tenant_migration_runner() -> TenantMigrationRunner:
+    return TenantMigrationRunner(workers=1, timeout=settings.tenant_migration_timeout)
+
+
+async def migrate_tenant(organization_id: int) -> List[str]:
+    """Apply a new tenant's pending migrations on its own pool"""
+    return await tenant_migration_runner().migrate_tenant(organization_id)
+
+
+async def init_tenant_schema(
+    db_name: str, schema: Optional[str] = None, base_url: Optional[str] = None
+):
+    """
+    Migrate a database with aerich's ``Command``.
+
+    aerich re-initialises Tortoise, replacing the app's connections and
+    routers, so this is never called from the app process; provisioning
+    migrates tenants with ``TenantMigrationRunner`` instead.
+    """
+    db_url = tenant_database_url(db_name, base_url)
+    if schema:
+        # Unqualified DDL in the migrations, including aerich's own table,
+        # lands in the first schema on the search_path.
+        db_url = f"{db_url}?schema={schema}"
 
     try:
         command = Command(
@@ -56,6 +122,49 @@ async def init_tenant_schema(db_name: str):
         ) from e
 
 
+async def refresh_tenant_template(shard: str = DEFAULT_SHARD):
+    """Rebuild a shard's tenant template at the latest migration"""
+    admin_url, base_url = shard_admin_urls(shard)
+    building = f"{settings.tenant_template_database}_next"
+
+    conn = await asyncpg.connect(admin_url)
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{building}"')
+        await conn.execute(f'CREATE DATABASE "{building}"')
+        db_info = expand_db_url(tenant_database_url(building, base_url))
+        client_class = importlib.import_module(db_info["engine"]).client_class
+        client = client_class(connection_name=building, **db_info["credentials"])
+        connections._get_storage()[building] = client
+        try:
+            await tenant_migration_runner().migrate(client)
+        finally:
+            # Nothing may stay connected to a database that is cloned
+            connections.discard(building)
+            await client.close()
+        await promote_tenant_template(conn, building)
+        # Spares were cloned from the old template; the warm pool rebuilds them
+        for spare in await list_databases(conn, SPARE_PREFIX):
+            await conn.execute(f'DROP DATABASE IF EXISTS "{spare}"')
+    finally:
+        await conn.close()
+
+
+async def drop_tenant_database(organization_id: int):
+    """Drop a tenant's database or schema; dropping a missing one is a no-op"""
+    await tenant_pools.discard(organization_id)
+    if settings.tenant_isolation == "schema":
+        admin_url, statement = (
+            tenant_pools.shared_url,
+            f'DROP SCHEMA IF EXISTS "{tenant_alias(organization_id)}" CASCADE',
+        )
+    else:
+        admin_url, _ = shard_admin_urls(await shard_map.locate(organization_id))
+        statement = f'DROP DATABASE IF EXISTS "{tenant_alias(organization_id)}"'
+
+    async with admin_pools.acquire(admin_url) as conn:
+        await conn.execute(statement)
+
+
 async def sync_owner_to_tenant(organization_id: int, owner_id: int):
     core_db = Tortoise.get_connection("default")
 
@@ -67,13 +176,22 @@ async def sync_owner_to_tenant(organization_id: int, owner_id: int):
             status_code=status.HTTP_404_NOT_FOUND, detail="Core user not found"
         ) from e
 
-    tenant_db_name = f"tenant_{organization_id}"
-    tenant_db = await get_tenant_connection(tenant_db_name)
+    # Provisioning retries may sync the owner more than once
+    await insert_tenant_user(organization_id, owner.email, owner.password_hash)
 
-    # Correctly await the coroutine returned by TenantUser.create
-    await TenantUser.create(
-        email=owner.email,
-        password_hash=owner.password_hash,
-        is_active=True
-    ).using_db(tenant_db)
 
+async def prewarm_tenant_pools() -> int:
+    """Open pools for the configured hot tenants before reporting readiness"""
+    tenant_ids = list(settings.tenant_prewarm_ids)
+    if settings.tenant_prewarm_all:
+        # Warming a hibernated or failed tenant would fail: it has no database
+        tenant_ids += await (
+            Organization.exclude(
+                status__in=[OrganizationStatus.HIBERNATED, OrganizationStatus.FAILED]
+            )
+            .order_by("-id")
+            .values_list("id", flat=True)
+        )
+    if not tenant_ids:
+        return 0
+    return await tenant_pools.prewarm(tenant_ids, settings.tenant_prewarm_concurrency)
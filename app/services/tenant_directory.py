@@ -0,0 +1,59 @@
+from typing import Optional
+
+from tortoise import connections
+
+from app.config import settings
+from app.models.core import Organization, OrganizationStatus
+from app.utils.cache import MISSING, TTLCache
+
+
+class TenantDirectory:
+    """
+    Cached lookup of which tenant ids exist and what state they are in.
+
+    Unknown ids are cached too, for a shorter time, so repeated requests for
+    a bogus tenant are rejected without touching the core database. So are
+    tenants still being provisioned, which become active at any moment.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def status(self, tenant_id: int) -> Optional[OrganizationStatus]:
+        """Return the organization's status, or ``None`` if it does not exist"""
+        status = self._cache.get(tenant_id)
+        if status is not MISSING:
+            return status
+
+        rows = (
+            await Organization.filter(id=tenant_id)
+            .using_db(connections.get("default"))
+            .values_list("status", flat=True)
+        )
+        if rows:
+            status = OrganizationStatus(rows[0])
+            if status == OrganizationStatus.PROVISIONING:
+                self._cache.set(tenant_id, status, ttl=self.negative_ttl)
+            else:
+                self._cache.set(tenant_id, status)
+        else:
+            status = None
+            self._cache.set(tenant_id, None, ttl=self.negative_ttl)
+        return status
+
+    def prime(self, tenant_id: int, status: OrganizationStatus) -> None:
+        self._cache.set(tenant_id, status)
+
+    def invalidate(self, tenant_id: int) -> None:
+        self._cache.pop(tenant_id)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+tenant_directory = TenantDirectory(
+    maxsize=settings.tenant_cache_size,
+    ttl=settings.tenant_cache_ttl,
+    negative_ttl=settings.tenant_negative_cache_ttl,
+)
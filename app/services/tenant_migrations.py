@@ -0,0 +1,246 @@
+import asyncio
+import importlib.util
+import logging
+import zlib
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional, Set
+
+from aerich.coder import encoder
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.db.pool import tenant_pools
+from app.models.core import (
+    Organization,
+    OrganizationStatus,
+    TenantMigration,
+    TenantMigrationRun,
+    TenantMigrationStatus,
+)
+from app.services.tenant_template import applied_versions, migration_files
+
+logger = logging.getLogger(__name__)
+
+# Models aerich snapshots for a tenant database, as in init_tenant_schema
+TENANT_MODULES = ("app.models.tenant", "aerich.models")
+
+INSERT_AERICH_VERSION = """
+    INSERT INTO "aerich" ("version", "app", "content") VALUES ($1, $2, $3)
+"""
+
+
+def in_canary(organization_id: int, percent: int) -> bool:
+    """Pick roughly ``percent`` of tenants, the same ones on every run"""
+    return zlib.crc32(str(organization_id).encode()) % 100 < percent
+
+
+def load_migration(version: str) -> ModuleType:
+    path = Path(settings.migrations_location, "models", version)
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tenant_models_describe() -> dict:
+    """The model snapshot aerich records with each tenant migration"""
+    describe = {}
+    for model in Tortoise.apps["models"].values():
+        if model.__module__ in TENANT_MODULES:
+            info = model.describe()
+            describe[info["name"]] = dict(
+                info, managed=getattr(model.Meta, "managed", None)
+            )
+    return describe
+
+
+class TenantMigrationRunner:
+    """
+    Applies pending migrations to every tenant database, ``workers`` at once.
+
+    Each migration file runs in its own transaction and is recorded in the
+    tenant's ``aerich`` table exactly as ``aerich upgrade`` would, without
+    going through aerich's process-global state, so tenants migrate
+    concurrently. Progress is kept in ``tenantmigration`` rows under a
+    ``tenantmigrationrun`` per target version. Starting again for the same
+    target resumes that run and skips tenants already migrated.
+
+    Args:
+        workers: Tenants migrated concurrently
+        timeout: Seconds before a tenant's migration is abandoned and rolled
+            back
+        canary_percent: Only migrate this share of tenants, a stable subset
+        dry_run: Only report pending migrations, changing nothing
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float,
+        canary_percent: int = 100,
+        dry_run: bool = False,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.canary_percent = canary_percent
+        self.dry_run = dry_run
+        self.versions = migration_files()
+        self.target = self.versions[-1]
+        self.results: Dict[str, int] = {
+            "migrated": 0,
+            "up_to_date": 0,
+            "failed": 0,
+            "skipped": 0,
+        }
+        self._modules: Dict[str, ModuleType] = {}
+        self._content: Optional[str] = None
+
+    async def tenants(self) -> List[int]:
+        # Tenants still provisioning are migrated by their provisioning job,
+        # hibernated ones when they are restored, and failed ones have no
+        # database
+        return await (
+            Organization.exclude(
+                status__in=[
+                    OrganizationStatus.PROVISIONING,
+                    OrganizationStatus.HIBERNATED,
+                    OrganizationStatus.FAILED,
+                ]
+            )
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    async def start_run(self) -> TenantMigrationRun:
+        """Resume the unfinished run for the current target, or start one"""
+        run = (
+            await TenantMigrationRun.filter(target=self.target, completed=False)
+            .order_by("-id")
+            .first()
+        )
+        return run or await TenantMigrationRun.create(target=self.target)
+
+    async def pending(self, client: BaseDBAsyncClient) -> List[str]:
+        applied = await applied_versions(client)
+        return [version for version in self.versions if version not in applied]
+
+    async def migrate_tenant(self, tenant_id: int) -> List[str]:
+        """Apply the tenant's pending migrations, returning their versions"""
+        return await self.migrate(await tenant_pools.acquire(tenant_id))
+
+    async def migrate(self, client: BaseDBAsyncClient) -> List[str]:
+        """
+        Apply a database's pending migrations, returning their versions.
+
+        ``client`` must be registered in Tortoise's connections under its
+        ``connection_name``, as tenant pools are.
+        """
+        pending = await self.pending(client)
+        if self.dry_run:
+            return pending
+        if pending and self._content is None:
+            self._content = encoder(tenant_models_describe())
+        for version in pending:
+            if version not in self._modules:
+                self._modules[version] = load_migration(version)
+            async with in_transaction(client.connection_name) as conn:
+                await conn.execute_script(await self._modules[version].upgrade(conn))
+                await conn.execute_query(
+                    INSERT_AERICH_VERSION, [version, "models", self._content]
+                )
+        return pending
+
+    async def _record(self, run: TenantMigrationRun, tenant_id: int, **fields):
+        if run is not None:
+            await TenantMigration.update_or_create(
+                run=run, organization_id=tenant_id, defaults=fields
+            )
+
+    async def _migrate(
+        self,
+        run: Optional[TenantMigrationRun],
+        semaphore: asyncio.Semaphore,
+        tenant_id: int,
+    ) -> None:
+        async with semaphore:
+            await self._record(
+                run, tenant_id, status=TenantMigrationStatus.RUNNING, error=None
+            )
+            try:
+                applied = await asyncio.wait_for(
+                    self.migrate_tenant(tenant_id), self.timeout
+                )
+            except Exception as e:
+                error = (
+                    f"Timed out after {self.timeout}s"
+                    if isinstance(e, asyncio.TimeoutError)
+                    else str(e)
+                )
+                self.results["failed"] += 1
+                logger.warning("Tenant %s: migration failed: %s", tenant_id, error)
+                await self._record(
+                    run,
+                    tenant_id,
+                    status=TenantMigrationStatus.FAILED,
+                    error=error,
+                    finished_at=datetime.utcnow(),
+                )
+                return
+            finally:
+                # Release the connections before moving on to other tenants
+                await tenant_pools.discard(tenant_id)
+
+            self.results["migrated" if applied else "up_to_date"] += 1
+            if applied:
+                verb = "would apply" if self.dry_run else "applied"
+                logger.info("Tenant %s: %s %s", tenant_id, verb, ", ".join(applied))
+            await self._record(
+                run,
+                tenant_id,
+                status=TenantMigrationStatus.SUCCEEDED,
+                applied=applied,
+                finished_at=datetime.utcnow(),
+            )
+
+    async def run(self) -> Dict[str, int]:
+        """Migrate every selected tenant, returning counts by outcome"""
+        self._content = encoder(tenant_models_describe())
+        run = None if self.dry_run else await self.start_run()
+
+        done: Set[int] = set()
+        if run is not None:
+            done = set(
+                await TenantMigration.filter(
+                    run=run, status=TenantMigrationStatus.SUCCEEDED
+                ).values_list("organization_id", flat=True)
+            )
+        tenant_ids = [
+            tenant_id
+            for tenant_id in await self.tenants()
+            if in_canary(tenant_id, self.canary_percent)
+        ]
+        self.results["skipped"] = sum(tenant_id in done for tenant_id in tenant_ids)
+
+        # Pools past max_pools would evict tenants still being migrated
+        semaphore = asyncio.Semaphore(min(self.workers, tenant_pools.max_pools))
+        await asyncio.gather(
+            *(
+                self._migrate(run, semaphore, tenant_id)
+                for tenant_id in tenant_ids
+                if tenant_id not in done
+            )
+        )
+
+        if (
+            run is not None
+            and self.canary_percent >= 100
+            and not self.results["failed"]
+        ):
+            run.completed = True
+            run.finished_at = datetime.utcnow()
+            await run.save()
+        return self.results
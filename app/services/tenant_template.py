@@ -0,0 +1,80 @@
+import logging
+from pathlib import Path
+from typing import List, Set
+
+import asyncpg
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import OperationalError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def migration_files() -> List[str]:
+    """Migration file names in the order aerich applies them"""
+    location = Path(settings.migrations_location, "models")
+    names = [path.name for path in location.glob("*_*.py")]
+    return sorted(
+        (name for name in names if name.split("_")[0].isdigit()),
+        key=lambda name: int(name.split("_")[0]),
+    )
+
+
+def migration_versions() -> Set[str]:
+    """Names of the migration files a tenant database should have applied"""
+    return set(migration_files())
+
+
+async def clone_tenant_database(admin: asyncpg.Connection, database_name: str) -> bool:
+    """
+    Create a tenant database as a server-side copy of the template.
+
+    Returns:
+        ``False`` if the template does not exist or is in use, in which case
+        the caller should create the database and migrate it instead
+    """
+    template = settings.tenant_template_database
+    try:
+        await admin.execute(f'CREATE DATABASE "{database_name}" TEMPLATE "{template}"')
+    except (asyncpg.InvalidCatalogNameError, asyncpg.ObjectInUseError) as e:
+        logger.warning("Cannot clone tenant template %s: %s", template, e)
+        return False
+    return True
+
+
+async def applied_versions(client: BaseDBAsyncClient) -> Set[str]:
+    """Migrations recorded in a tenant database's ``aerich`` table"""
+    try:
+        rows = await client.execute_query_dict(
+            'SELECT "version" FROM "aerich" WHERE "app" = $1', ["models"]
+        )
+    except OperationalError:
+        # Never migrated, so there is no aerich table yet
+        return set()
+    return {row["version"] for row in rows}
+
+
+async def promote_tenant_template(admin: asyncpg.Connection, database_name: str):
+    """
+    Replace the template with a freshly migrated database.
+
+    The old template keeps serving clones until the rename, and the new one
+    refuses connections, since Postgres cannot copy a database in use.
+    """
+    template = settings.tenant_template_database
+    retired = f"{template}_old"
+    exists = await admin.fetchval(
+        "SELECT 1 FROM pg_database WHERE datname = $1", template
+    )
+    if exists:
+        # Template databases cannot be dropped or renamed over
+        await admin.execute(f'ALTER DATABASE "{template}" IS_TEMPLATE false')
+        await admin.execute(f'DROP DATABASE IF EXISTS "{retired}"')
+        await admin.execute(f'ALTER DATABASE "{template}" RENAME TO "{retired}"')
+    await admin.execute(f'ALTER DATABASE "{database_name}" RENAME TO "{template}"')
+    await admin.execute(
+        f'ALTER DATABASE "{template}" IS_TEMPLATE true ALLOW_CONNECTIONS false'
+    )
+    if exists:
+        await admin.execute(f'DROP DATABASE "{retired}"')
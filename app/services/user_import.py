@@ -0,0 +1,179 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.db.routing import get_tenant_connection
+from app.models.tenant import TenantUserImportRow
+from app.utils.passwords import password_hasher
+
+IMPORT_COLUMNS = ("row", "email", "password_hash")
+
+CREATE_IMPORT_TABLE = """
+    CREATE TEMPORARY TABLE tenantuser_import (
+        "row" INT NOT NULL,
+        "email" VARCHAR(255) NOT NULL,
+        "password_hash" VARCHAR(128) NOT NULL
+    ) ON COMMIT DROP
+"""
+
+INSERT_IMPORTED_USERS = """
+    INSERT INTO "tenantuser"
+        ("email", "password_hash", "is_active", "token_version", "created_at")
+    SELECT "email", "password_hash", TRUE, 0, CURRENT_TIMESTAMP
+    FROM tenantuser_import
+    ORDER BY "row"
+    ON CONFLICT ("email") DO NOTHING
+    RETURNING "email"
+"""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed UTF-8 body into lines without buffering all of it"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def parse_rows(
+    lines: AsyncIterator[str], data_format: str
+) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield ``(row number, fields)`` for each non-blank line.
+
+    CSV input needs a header naming the ``email`` and ``password`` or
+    ``password_hash`` columns, and each record must fit on one line. Rows
+    that cannot be parsed yield the exception in place of the fields.
+    """
+    header = None
+    row_number = 0
+    async for line in lines:
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+        if data_format == "csv" and header is None:
+            header = next(csv.reader([line]))
+            continue
+
+        row_number += 1
+        try:
+            if data_format == "csv":
+                values = next(csv.reader([line]))
+                yield row_number, {
+                    name: value for name, value in zip(header, values) if value
+                }
+            else:
+                yield row_number, json.loads(line)
+        except (ValueError, csv.Error) as e:
+            yield row_number, e
+
+
+class UserImport:
+    """Loads one stream of users into a tenant in batches"""
+
+    def __init__(self, tenant_id: int, batch_size: int):
+        self.tenant_id = tenant_id
+        self.batch_size = batch_size
+        self.imported = 0
+        self.conflicts: List[Dict[str, Any]] = []
+        self.errors: List[Dict[str, Any]] = []
+        self._seen: Set[str] = set()
+        self._batch: List[Tuple[int, TenantUserImportRow]] = []
+
+    async def add(self, row_number: int, fields: Any) -> None:
+        try:
+            if isinstance(fields, Exception):
+                raise fields
+            row = TenantUserImportRow.model_validate(fields)
+        except (ValueError, TypeError, csv.Error) as e:
+            error = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+            self.errors.append({"row": row_number, "error": error})
+            return
+
+        if row.email in self._seen:
+            self.conflicts.append(
+                {
+                    "row": row_number,
+                    "email": row.email,
+                    "error": "Duplicate email in import",
+                }
+            )
+            return
+        self._seen.add(row.email)
+        self._batch.append((row_number, row))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        plain = [row.password for _, row in batch if row.password_hash is None]
+        hashes = iter(await password_hasher.hash_many(plain))
+        records = [
+            (row_number, row.email, row.password_hash or next(hashes))
+            for row_number, row in batch
+        ]
+
+        client = await get_tenant_connection(self.tenant_id)
+        async with client.acquire_connection() as connection:
+            async with connection.transaction():
+                await connection.execute(CREATE_IMPORT_TABLE)
+                await connection.copy_records_to_table(
+                    "tenantuser_import", records=records, columns=IMPORT_COLUMNS
+                )
+                inserted = {
+                    record["email"]
+                    for record in await connection.fetch(INSERT_IMPORTED_USERS)
+                }
+
+        self.imported += len(inserted)
+        self.conflicts += [
+            {
+                "row": row_number,
+                "email": email,
+                "error": "Email already registered in this tenant",
+            }
+            for row_number, email, _ in records
+            if email not in inserted
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "imported": self.imported,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+        }
+
+
+async def import_tenant_users(
+    tenant_id: int, lines: AsyncIterator[str], data_format: str
+) -> Dict[str, Any]:
+    """
+    Bulk-load tenant users from CSV or NDJSON lines.
+
+    Rows are validated as they stream in, and passwords are hashed in the
+    password worker pool. Each batch is copied into a temporary table and
+    inserted with ``ON CONFLICT DO NOTHING``. Emails that already exist in
+    the tenant, or appear earlier in the same import, are reported as
+    conflicts instead of failing the import.
+
+    Returns:
+        Count of imported users plus per-row conflicts and errors
+    """
+    user_import = UserImport(tenant_id, settings.user_import_batch_size)
+    async for row_number, fields in parse_rows(lines, data_format):
+        await user_import.add(row_number, fields)
+    await user_import.flush()
+    return user_import.report()
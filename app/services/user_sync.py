@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from tortoise import connections
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.db.pool import tenant_alias, tenant_pools
+from app.models.core import CoreUser, TenantSyncCheckpoint, UserChange
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_lock key letting one process at a time dispatch changes
+DISPATCH_LOCK = 0x75737963
+
+# Changes each active tenant has yet to apply, oldest first. Only changes
+# older than the settle delay are read: ids are taken before commit, so a
+# younger change could still be followed by a smaller id committing late.
+PENDING_CHANGES = """
+    SELECT k."organization_id", c."id", c."previous_email", c."email",
+           c."password_hash"
+    FROM "tenantsynccheckpoint" k
+    JOIN "organization" o ON o."id" = k."organization_id"
+    JOIN "userchange" c ON c."user_id" = o."owner_id" AND c."id" > k."position"
+    WHERE o."status" = 'active'
+      AND c."created_at" <= CURRENT_TIMESTAMP - $1 * INTERVAL '1 second'
+      AND k."organization_id" <> ALL($2::int[])
+    ORDER BY c."id"
+    LIMIT $3
+"""
+
+# New emails in a batch that tenant users other than the owner's copy, at
+# $2, already hold, provided that copy still exists
+TAKEN_EMAILS = """
+    SELECT "email" FROM "tenantuser"
+    WHERE "email" = ANY($1::text[]) AND "email" <> $2
+      AND EXISTS (SELECT 1 FROM "tenantuser" WHERE "email" = $2)
+"""
+
+# Replaying a change is a no-op, and so is one whose tenant copy was renamed
+# or removed since
+APPLY_CHANGE = """
+    UPDATE "tenantuser"
+    SET "email" = $2, "password_hash" = $3, "token_version" = "token_version" + 1
+    WHERE "email" = $1 AND ("email", "password_hash") IS DISTINCT FROM ($2, $3)
+"""
+
+# The password alone, for a change whose new email is taken
+APPLY_PASSWORD = """
+    UPDATE "tenantuser"
+    SET "password_hash" = $2, "token_version" = "token_version" + 1
+    WHERE "email" = $1 AND "password_hash" IS DISTINCT FROM $2
+"""
+
+# Deletes changes every tenant of their user has applied, counting them
+PRUNE_CHANGES = """
+    WITH pruned AS (
+        DELETE FROM "userchange" c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM "tenantsynccheckpoint" k
+            JOIN "organization" o ON o."id" = k."organization_id"
+            WHERE o."owner_id" = c."user_id" AND k."position" < c."id"
+        )
+        RETURNING 1
+    )
+    SELECT count(*) FROM pruned
+"""
+
+
+async def update_core_user(
+    user: CoreUser, email: Optional[str] = None, password_hash: Optional[str] = None
+) -> CoreUser:
+    """
+    Change a core user's email or password, queueing it for their tenants.
+
+    The row is reloaded and changed instead of ``user``, which may be the
+    cached principal, and the updated user is returned.
+    """
+    try:
+        async with in_transaction("default") as db:
+            user = await CoreUser.select_for_update().using_db(db).get(id=user.id)
+            previous_email = user.email
+            user.email = email or user.email
+            user.password_hash = password_hash or user.password_hash
+            user.token_version += 1
+            await user.save(using_db=db)
+            await UserChange.create(
+                user=user,
+                previous_email=previous_email,
+                email=user.email,
+                password_hash=user.password_hash,
+                using_db=db,
+            )
+    except IntegrityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
+        ) from e
+    user_change_dispatcher.notify()
+    return user
+
+
+async def sync_checkpoint(owner_id: int) -> int:
+    """Position a new tenant starts from: its owner is copied in afresh"""
+    position = (
+        await UserChange.filter(user_id=owner_id)
+        .using_db(connections.get("default"))
+        .order_by("-id")
+        .limit(1)
+        .values_list("id", flat=True)
+    )
+    return position[0] if position else 0
+
+
+class UserChangeDispatcher:
+    """
+    Copies core user changes into the tenant databases of their organizations.
+
+    Changes are written to the ``userchange`` outbox in the same transaction
+    as the user, and each tenant records the last change it applied in
+    ``tenantsynccheckpoint``. Every ``poll_interval`` seconds, or shortly
+    after a change, up to ``batch_size`` pending changes are read and applied
+    with one batched statement per tenant, ``concurrency`` tenants at a time.
+    A tenant that fails is skipped for ``retry_delay`` seconds while the rest
+    carry on. Applying a change twice changes nothing, so a crash between a
+    tenant write and its checkpoint only repeats work. A change whose new
+    email another tenant user holds has only its password applied; the
+    tenant's checkpoint stops short of it and it is retried like a failure
+    until the email is free, since later changes expect it. Changes every
+    tenant has applied are pruned.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        concurrency: int,
+        poll_interval: float,
+        settle_delay: float,
+        retry_delay: float,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.settle_delay = settle_delay
+        self.retry_delay = retry_delay
+        self.applied = 0
+        self.failed = 0
+        self.pruned = 0
+        self.conflicts = 0
+        self._retry_after: Dict[int, float] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def pending(self) -> Dict[int, List[dict]]:
+        """Pending changes by tenant, leaving out tenants waiting to retry"""
+        now = time.monotonic()
+        self._retry_after = {
+            tenant_id: retry_at
+            for tenant_id, retry_at in self._retry_after.items()
+            if retry_at > now
+        }
+        rows = await connections.get("default").execute_query_dict(
+            PENDING_CHANGES,
+            [self.settle_delay, list(self._retry_after), self.batch_size],
+        )
+        changes: Dict[int, List[dict]] = defaultdict(list)
+        for row in rows:
+            changes[row["organization_id"]].append(row)
+        return changes
+
+    async def apply(self, tenant_id: int, changes: List[dict]) -> int:
+        """
+        Apply a tenant's changes in order, then advance its checkpoint.
+
+        Returns:
+            How many changes were applied, stopping at an email conflict
+        """
+        await tenant_pools.acquire(tenant_id)
+        conflict = None
+        async with in_transaction(tenant_alias(tenant_id)) as conn:
+            taken = {
+                row["email"]
+                for row in await conn.execute_query_dict(
+                    TAKEN_EMAILS,
+                    [
+                        [change["email"] for change in changes],
+                        changes[0]["previous_email"],
+                    ],
+                )
+            }
+            if taken:
+                conflict = next(
+                    index
+                    for index, change in enumerate(changes)
+                    if change["email"] in taken
+                )
+                changes, conflicting = changes[:conflict], changes[conflict]
+            if changes:
+                await conn.execute_many(
+                    APPLY_CHANGE,
+                    [
+                        [
+                            change["previous_email"],
+                            change["email"],
+                            change["password_hash"],
+                        ]
+                        for change in changes
+                    ],
+                )
+            if conflict is not None:
+                await conn.execute_query(
+                    APPLY_PASSWORD,
+                    [conflicting["previous_email"], conflicting["password_hash"]],
+                )
+        if changes:
+            await TenantSyncCheckpoint.filter(organization_id=tenant_id).using_db(
+                connections.get("default")
+            ).update(position=changes[-1]["id"])
+        if conflict is not None:
+            self.conflicts += 1
+            self._retry_after[tenant_id] = time.monotonic() + self.retry_delay
+            logger.warning(
+                "Syncing users to tenant %s stopped at change %s: %s is taken",
+                tenant_id,
+                conflicting["id"],
+                conflicting["email"],
+            )
+        return len(changes)
+
+    async def _apply(
+        self, semaphore: asyncio.Semaphore, tenant_id: int, changes: List[dict]
+    ) -> int:
+        async with semaphore:
+            try:
+                return await self.apply(tenant_id, changes)
+            except Exception as e:
+                self.failed += 1
+                self._retry_after[tenant_id] = time.monotonic() + self.retry_delay
+                logger.warning("Syncing users to tenant %s failed: %s", tenant_id, e)
+                return 0
+
+    async def dispatch(self) -> int:
+        """Apply one batch of pending changes, returning how many were applied"""
+        async with connections.get("default").acquire_connection() as conn:
+            if not await conn.fetchval(
+                "SELECT pg_try_advisory_lock($1)", DISPATCH_LOCK
+            ):
+                # Another process is dispatching
+                return 0
+            try:
+                changes = await self.pending()
+                semaphore = asyncio.Semaphore(self.concurrency)
+                applied = sum(
+                    await asyncio.gather(
+                        *(
+                            self._apply(semaphore, tenant_id, tenant_changes)
+                            for tenant_id, tenant_changes in changes.items()
+                        )
+                    )
+                )
+                self.applied += applied
+                if not changes:
+                    self.pruned += await conn.fetchval(PRUNE_CHANGES)
+                return applied
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", DISPATCH_LOCK)
+
+    async def _watch(self, wake: asyncio.Event) -> None:
+        while True:
+            wake.clear()
+            try:
+                while await self.dispatch() >= self.batch_size:
+                    # A full batch: more are likely waiting
+                    await asyncio.sleep(0)
+            except Exception as e:
+                # The lock and prune run on a raw asyncpg connection, so its
+                # errors arrive unwrapped; none may end the loop
+                logger.warning("Dispatching user changes failed: %s", e)
+            try:
+                await asyncio.wait_for(wake.wait(), self.poll_interval)
+                # Let the change settle before it is read
+                await asyncio.sleep(self.settle_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._watch(self._wake))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "applied": self.applied,
+            "failed": self.failed,
+            "pruned": self.pruned,
+            "conflicts": self.conflicts,
+            "retrying": len(self._retry_after),
+        }
+
+
+user_change_dispatcher = UserChangeDispatcher(
+    batch_size=settings.user_sync_batch_size,
+    concurrency=settings.user_sync_concurrency,
+    poll_interval=settings.user_sync_poll_interval,
+    settle_delay=settings.user_sync_settle_delay,
+    retry_delay=settings.user_sync_retry_delay,
+)
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from tortoise import connections
+from tortoise.exceptions import BaseORMException
+
+from app.config import settings
+from app.models.core import VerificationToken
+
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def new_verification_token() -> Tuple[str, str, datetime]:
+    """Return a fresh token with the digest and expiry to store for it"""
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(
+        hours=settings.verification_token_expire_hours
+    )
+    return token, token_digest(token), expires_at
+
+
+async def find_verification_token(token: str) -> Optional[VerificationToken]:
+    return await VerificationToken.get_or_none(
+        token_digest=token_digest(token)
+    ).select_related("user")
+
+
+class VerificationTokenSweeper:
+    """
+    Deletes expired verification tokens in the background.
+
+    Rows are removed ``batch_size`` at a time, oldest first, so a large
+    backlog never holds locks on the table for long.
+    """
+
+    def __init__(self, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.deleted = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep_batch(self) -> int:
+        db = connections.get("default")
+        expired = (
+            await VerificationToken.filter(expires_at__lt=datetime.utcnow())
+            .using_db(db)
+            .order_by("expires_at")
+            .limit(self.batch_size)
+            .values_list("id", flat=True)
+        )
+        if not expired:
+            return 0
+        deleted = await VerificationToken.filter(id__in=expired).using_db(db).delete()
+        self.deleted += deleted
+        return deleted
+
+    async def sweep(self) -> int:
+        """Delete every currently expired token, returning how many"""
+        total = 0
+        while True:
+            deleted = await self.sweep_batch()
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+            # Let requests in between batches
+            await asyncio.sleep(0)
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except (OSError, BaseORMException) as e:
+                logger.warning("Verification token sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+verification_sweeper = VerificationTokenSweeper(
+    batch_size=settings.verification_sweep_batch_size,
+    interval=settings.verification_sweep_interval,
+)
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import uuid
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from app.config import settings
+from app.db.admin import admin_pools
+from app.db.shards import shard_admin_urls, shard_map
+from app.services.tenant_template import clone_tenant_database
+
+logger = logging.getLogger(__name__)
+
+SPARE_PREFIX = "tenant_spare_"
+BUILDING_PREFIX = "tenant_building_"
+
+# pg_try_advisory_lock key serialising refills of one server across processes
+REFILL_LOCK = 0x74776D70
+
+
+def _like(prefix: str) -> str:
+    return prefix.replace("_", "\\_") + "%"
+
+
+async def list_databases(admin: asyncpg.Connection, prefix: str) -> List[str]:
+    rows = await admin.fetch(
+        "SELECT datname FROM pg_database WHERE datname LIKE $1 ORDER BY datname",
+        _like(prefix),
+    )
+    return [row["datname"] for row in rows]
+
+
+class TenantWarmPool:
+    """
+    Keeps migrated, unassigned tenant databases ready on every shard.
+
+    Spares are cloned from the tenant template as ``tenant_building_*`` and
+    renamed to ``tenant_spare_*`` once complete. A new tenant claims one by
+    renaming it to ``tenant_<id>``: the rename either succeeds or fails
+    because another process took that spare first, so no spare is handed
+    out twice. When a shard is down to ``low_water`` spares it is refilled
+    to ``size`` in the background, checked every ``interval`` seconds and
+    after every claim.
+    """
+
+    def __init__(self, size: int, low_water: int, interval: float):
+        self.size = size
+        self.low_water = low_water
+        self.interval = interval
+        self.claims = 0
+        self.misses = 0
+        self.refills = 0
+        self.available: Dict[str, int] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def claim(
+        self, admin: asyncpg.Connection, database_name: str, shard: str
+    ) -> bool:
+        """
+        Rename a spare on the admin connection's server to ``database_name``.
+
+        Returns:
+            ``False`` if the shard has no spare left
+        """
+        if self.size <= 0:
+            return False
+        spares = await list_databases(admin, SPARE_PREFIX)
+        for index, spare in enumerate(spares):
+            try:
+                await admin.execute(
+                    f'ALTER DATABASE "{spare}" RENAME TO "{database_name}"'
+                )
+            except asyncpg.InvalidCatalogNameError:
+                # Claimed by another process since it was listed
+                continue
+            self.claims += 1
+            self.available[shard] = len(spares) - index - 1
+            self.notify()
+            return True
+        self.misses += 1
+        self.available[shard] = 0
+        self.notify()
+        return False
+
+    async def refill(self, shard: str) -> int:
+        """Top up a shard that is at or below the low-water mark"""
+        admin_url, _ = shard_admin_urls(shard)
+        async with admin_pools.acquire(admin_url) as admin:
+            if not await admin.fetchval("SELECT pg_try_advisory_lock($1)", REFILL_LOCK):
+                # Another process is refilling this server
+                return 0
+            try:
+                return await self._refill(admin, shard)
+            finally:
+                await admin.execute("SELECT pg_advisory_unlock($1)", REFILL_LOCK)
+
+    async def _refill(self, admin: asyncpg.Connection, shard: str) -> int:
+        # Holding the lock, any database still building was left by a crash
+        for leftover in await list_databases(admin, BUILDING_PREFIX):
+            await admin.execute(f'DROP DATABASE IF EXISTS "{leftover}"')
+
+        available = len(await list_databases(admin, SPARE_PREFIX))
+        created = 0
+        if available <= self.low_water:
+            while available < self.size:
+                suffix = uuid.uuid4().hex[:16]
+                building = f"{BUILDING_PREFIX}{suffix}"
+                # Spares are only ever cloned: migrating in-process would
+                # re-initialise Tortoise under the running app
+                if not await clone_tenant_database(admin, building):
+                    break
+                await admin.execute(
+                    f'ALTER DATABASE "{building}" RENAME TO "{SPARE_PREFIX}{suffix}"'
+                )
+                available += 1
+                created += 1
+        self.refills += created
+        self.available[shard] = available
+        return created
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _watch(self, wake: asyncio.Event) -> None:
+        while True:
+            wake.clear()
+            for shard in shard_map.shards:
+                try:
+                    await self.refill(shard)
+                except Exception as e:
+                    # Pool timeouts and dropped connections included; one
+                    # failing shard must not end refills for the rest
+                    logger.warning(
+                        "Refilling tenant warm pool on %s failed: %s", shard, e
+                    )
+            try:
+                await asyncio.wait_for(wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None and self.size > 0:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._watch(self._wake))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "available": sum(self.available.values()),
+            "claims": self.claims,
+            "misses": self.misses,
+            "refills": self.refills,
+        }
+
+
+tenant_warm_pool = TenantWarmPool(
+    size=settings.tenant_warm_pool_size,
+    low_water=settings.tenant_warm_pool_low_water,
+    interval=settings.tenant_warm_pool_interval,
+)
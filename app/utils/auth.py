@@ -1,21 +1,20 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
-from passlib.context import CryptContext
 from tortoise.exceptions import DoesNotExist
 
 from app.config import settings
 from app.models.core import CoreUser
 from app.models.tenant import TenantUser
+from app.utils.passwords import check_password, hash_password, password_hasher
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -29,6 +28,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def create_user_token(
+    user, tenant_id: Optional[int] = None, session_id: Optional[str] = None
+) -> str:
+    """
+    Issue an access token carrying the user's profile fields.
+
+    Args:
+        user: CoreUser, or TenantUser when ``tenant_id`` is given
+        tenant_id: Tenant the token is bound to, ``None`` for core users
+        session_id: Login session the token belongs to, revocable as a whole
+
+    Returns:
+        Encoded JWT. Its ``ver`` claim must match the user's
+        ``token_version`` for the token to be accepted.
+    """
+    claims = {
+        "sub": str(user.id),
+        "tid": tenant_id,
+        "ver": user.token_version,
+        "email": user.email,
+    }
+    if session_id is not None:
+        claims["sid"] = session_id
+    if tenant_id is None:
+        claims["is_owner"] = user.is_owner
+    else:
+        claims["created_at"] = user.created_at.isoformat()
+        claims["is_active"] = user.is_active
+    return create_access_token(
+        claims, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+
+def create_refresh_token(user, session_id: str, tenant_id: Optional[int] = None) -> str:
+    """Issue a single-use refresh token for a login session"""
+    claims = {
+        "sub": str(user.id),
+        "tid": tenant_id,
+        "ver": user.token_version,
+        "typ": "refresh",
+        "sid": session_id,
+        "jti": uuid.uuid4().hex,
+    }
+    return create_access_token(
+        claims, expires_delta=timedelta(days=settings.refresh_token_expire_days)
+    )
+
+
+def issue_tokens(
+    user, tenant_id: Optional[int] = None, session_id: Optional[str] = None
+) -> dict:
+    """Issue an access and refresh token pair, starting a session if needed"""
+    session_id = session_id or uuid.uuid4().hex
+    return {
+        "access_token": create_user_token(user, tenant_id, session_id),
+        "refresh_token": create_refresh_token(user, session_id, tenant_id),
+        "token_type": "bearer",
+    }
+
+
 async def authenticate_user(email: str, password: str, is_core: bool = True):
     """
     Authenticate a user with email and password.
@@ -57,17 +116,19 @@ async def authenticate_user(email: str, password: str, is_core: bool = True):
             if not user.is_active:
                 return None
 
-        return None if not user or not user.verify_password(password) else user
+        if not await password_hasher.verify(password, user.password_hash):
+            return None
+        return user
     except DoesNotExist:
         return None
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return check_password(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hash_password(password)
 
 
 def utc_now() -> datetime:
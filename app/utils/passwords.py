@@ -0,0 +1,103 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# Module-level so they can be pickled into a process pool
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a worker pool.
+
+    A bcrypt round costs hundreds of milliseconds of CPU, so running it on
+    the event loop stalls every other request in the worker. At most
+    ``workers + queue_size`` operations are accepted at once; beyond that
+    callers get a 503 rather than piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, queue_size: int, executor: str = "thread"):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor_type = executor
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = (
+                ProcessPoolExecutor
+                if self.executor_type == "process"
+                else ThreadPoolExecutor
+            )
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._pending >= self.workers + self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is temporarily overloaded, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(check_password, plain_password, hashed_password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        Hash a batch for a bulk job.
+
+        Only ``workers`` hashes are submitted at a time, so interactive logins
+        queue behind at most one round of the batch rather than all of it.
+        """
+        loop = asyncio.get_event_loop()
+        hashes: List[str] = []
+        for start in range(0, len(passwords), self.workers):
+            chunk = passwords[start : start + self.workers]
+            self._pending += len(chunk)
+            try:
+                hashes += await asyncio.gather(
+                    *(
+                        loop.run_in_executor(self.executor, hash_password, password)
+                        for password in chunk
+                    )
+                )
+            finally:
+                self._pending -= len(chunk)
+        return hashes
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    queue_size=settings.password_hash_queue_size,
+    executor=settings.password_hash_executor,
+)
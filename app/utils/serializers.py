@@ -0,0 +1,57 @@
+"""
+Precompiled serializers for user responses.
+
+``pydantic_model_creator`` models validate and copy every field of every
+row they are given. A ``ModelSerializer`` takes its field list from such a
+model once, at import, and afterwards only reads those fields off model
+instances or ``values_list`` tuples into plain dicts. ``FastJSONResponse``
+encodes them with orjson, which handles datetimes natively. Routes that
+return it directly skip FastAPI's ``response_model`` validation, which is
+then only used for the OpenAPI schema.
+"""
+
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Type
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from app.models.core import CoreUser_Pydantic
+from app.models.tenant import TenantUser_Pydantic
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson rendering, writing UTC datetimes with ``Z`` as pydantic does"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+class ModelSerializer:
+    """
+    Turns ORM rows into the dicts a pydantic model would produce.
+
+    Args:
+        schema: Model generated by ``pydantic_model_creator``; its fields,
+            in order, are the ones serialized
+    """
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.fields: Tuple[str, ...] = tuple(schema.model_fields)
+        getter = attrgetter(*self.fields)
+        # attrgetter returns a bare value rather than a tuple for one field
+        self._values = getter if len(self.fields) > 1 else lambda obj: (getter(obj),)
+
+    def serialize(self, obj: Any) -> Dict[str, Any]:
+        """Serialize a model instance"""
+        return dict(zip(self.fields, self._values(obj)))
+
+    def serialize_rows(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        """Serialize tuples fetched with ``values_list(*self.fields)``"""
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in rows]
+
+
+core_user_serializer = ModelSerializer(CoreUser_Pydantic)
+tenant_user_serializer = ModelSerializer(TenantUser_Pydantic)
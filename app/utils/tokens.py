@@ -0,0 +1,56 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+from jose import jwt
+
+from app.config import settings
+from app.utils.cache import MISSING, TTLCache
+
+
+class TokenVerifier:
+    """
+    Verifies JWTs, remembering the claims of tokens already verified.
+
+    Tokens are keyed by their SHA-256 digest and cached until they expire, so
+    a client reusing a bearer token pays for signature verification once.
+    Revocation is checked afterwards, per session, against ``revocation_list``.
+    """
+
+    def __init__(self, secret_key: str, algorithm: str, maxsize: int, max_ttl: float):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_ttl = max_ttl
+        self._claims = TTLCache(maxsize=maxsize, ttl=max_ttl)
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def _ttl(self, claims: Dict[str, Any]) -> Optional[float]:
+        """Seconds until the token expires, or ``None`` if it never does"""
+        exp = claims.get("exp")
+        return None if exp is None else exp - time.time()
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Return the token's claims, raising ``JWTError`` if it is not valid"""
+        key = self.digest(token)
+        claims = self._claims.get(key)
+        if claims is MISSING or claims.get("exp", float("inf")) <= time.time():
+            claims = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            ttl = self._ttl(claims)
+            self._claims.set(
+                key, claims, ttl=self.max_ttl if ttl is None else min(ttl, self.max_ttl)
+            )
+        return dict(claims)
+
+    def stats(self) -> Dict[str, int]:
+        return self._claims.stats()
+
+
+token_verifier = TokenVerifier(
+    secret_key=settings.secret_key,
+    algorithm=settings.algorithm,
+    maxsize=settings.token_cache_size,
+    max_ttl=settings.access_token_expire_minutes * 60,
+)
@@ -0,0 +1,44 @@
+"""
+Decodes per second of a reused bearer token with python-jose's
+``jwt.decode`` versus the verified-claims cache.
+
+    python -m benchmarks.jwt_decode [decodes]
+"""
+
+import sys
+import time
+from datetime import timedelta
+
+from jose import jwt
+
+from app.config import settings
+from app.utils.auth import create_access_token
+from app.utils.tokens import TokenVerifier
+
+
+def measure(decode, token: str, decodes: int) -> float:
+    start = time.perf_counter()
+    for _ in range(decodes):
+        decode(token)
+    return decodes / (time.perf_counter() - start)
+
+
+def uncached(token: str) -> dict:
+    return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+
+
+def main(decodes: int = 100000) -> None:
+    token = create_access_token({"sub": "1"}, expires_delta=timedelta(minutes=30))
+    verifier = TokenVerifier(
+        settings.secret_key, settings.algorithm, maxsize=10000, max_ttl=1800
+    )
+    for name, decode in (
+        ("jwt.decode (before)", uncached),
+        ("TokenVerifier (after)", verifier.decode),
+    ):
+        rate = measure(decode, token, decodes)
+        print(f"{name:<30} {rate:>10.0f} decodes/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
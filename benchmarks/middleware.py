@@ -0,0 +1,75 @@
+"""
+Requests per second through TenantMiddleware, compared with the previous
+BaseHTTPMiddleware implementation.
+
+    python -m benchmarks.middleware [requests] [concurrency]
+"""
+
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.tenant_context import TenantContext, TenantMiddleware
+from app.models.core import OrganizationStatus
+from app.services.tenant_directory import tenant_directory
+
+
+class BaseHTTPTenantMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware-based implementation TenantMiddleware replaced"""
+
+    async def dispatch(self, request: Request, call_next):
+        x_tenant = request.headers.get("X-TENANT")
+        request.state.tenant = x_tenant
+        request.state.is_core = not x_tenant
+        if not x_tenant:
+            return await call_next(request)
+        async with TenantContext(int(x_tenant)):
+            return await call_next(request)
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.get("/")
+    async def root(request: Request):
+        return {"tenant": request.state.tenant}
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                await client.get("/", headers={"X-TENANT": "1"})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int, concurrency: int) -> None:
+    tenant_directory.prime(1, OrganizationStatus.ACTIVE)
+    for name, middleware in (
+        ("BaseHTTPMiddleware (before)", BaseHTTPTenantMiddleware),
+        ("pure ASGI (after)", TenantMiddleware),
+    ):
+        app = build_app(middleware)
+        await measure(app, min(requests, 500), concurrency)  # warm-up
+        rate = await measure(app, requests, concurrency)
+        print(f"{name:<30} {rate:>10.0f} req/s")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [5000, 20][len(args) :])))
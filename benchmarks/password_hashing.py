@@ -0,0 +1,89 @@
+"""
+Latency of /health while the same worker is flooded with logins, with bcrypt
+run inline on the event loop versus offloaded to the password hashing pool.
+
+    python -m benchmarks.password_hashing [probes] [concurrent_logins]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.utils.passwords import PasswordHasher, check_password, hash_password
+
+PASSWORD = "benchmark-password"
+HASHED = hash_password(PASSWORD)
+INTERVAL = 0.05
+
+
+def build_app(verify) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.post("/login")
+    async def login():
+        return {"ok": await verify(PASSWORD, HASHED)}
+
+    return app
+
+
+async def measure(app: FastAPI, probes: int, logins: int) -> list:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        latencies = []
+        done = asyncio.Event()
+
+        async def flood():
+            while not done.is_set():
+                await client.post("/login")
+                # In-process requests never suspend on their own; yield as a
+                # socket read would
+                await asyncio.sleep(0)
+
+        async def probe():
+            for _ in range(probes):
+                # Measured from when the probe is due, so time spent waiting
+                # for a blocked loop to run it counts
+                due = time.perf_counter() + INTERVAL
+                await asyncio.sleep(INTERVAL)
+                await client.get("/health")
+                latencies.append(time.perf_counter() - due)
+            done.set()
+
+        await asyncio.gather(probe(), *(flood() for _ in range(logins)))
+        return latencies
+
+
+async def main(probes: int, logins: int) -> None:
+    async def inline(password, hashed):
+        return check_password(password, hashed)
+
+    hasher = PasswordHasher(workers=4, queue_size=64)
+    try:
+        for name, verify in (
+            ("inline (before)", inline),
+            ("worker pool (after)", hasher.verify),
+        ):
+            latencies = sorted(await measure(build_app(verify), probes, logins))
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+            print(
+                f"{name:<22} {len(latencies):>5} probes"
+                f"  p50 {p50:>8.1f} ms  p99 {p99:>8.1f} ms"
+            )
+    finally:
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [20, 4][len(args) :])))
@@ -0,0 +1,66 @@
+"""
+Seconds to provision a tenant database by replaying the aerich migrations
+versus cloning the tenant template. Needs the Postgres server from
+``DATABASE_URL``; the databases it creates are dropped afterwards.
+
+    python -m benchmarks.tenant_provisioning [tenants]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import asyncpg
+from tortoise import Tortoise
+
+from app.config import settings
+from app.services.tenant import init_tenant_schema, refresh_tenant_template
+from app.services.tenant_template import clone_tenant_database
+
+
+async def migrate(admin: asyncpg.Connection, database_name: str) -> None:
+    await admin.execute(f'CREATE DATABASE "{database_name}"')
+    await init_tenant_schema(database_name)
+    # Release the database so it can be dropped
+    await Tortoise.close_connections()
+
+
+async def clone(admin: asyncpg.Connection, database_name: str) -> None:
+    if not await clone_tenant_database(admin, database_name):
+        raise RuntimeError("Tenant template is missing")
+
+
+async def measure(admin: asyncpg.Connection, provision, prefix: str, tenants: int):
+    durations = []
+    for i in range(tenants):
+        database_name = f"{prefix}_{i}"
+        await admin.execute(f'DROP DATABASE IF EXISTS "{database_name}"')
+        start = time.perf_counter()
+        await provision(admin, database_name)
+        durations.append(time.perf_counter() - start)
+    for i in range(tenants):
+        await admin.execute(f'DROP DATABASE IF EXISTS "{prefix}_{i}"')
+    return durations
+
+
+async def main(tenants: int = 10) -> None:
+    await refresh_tenant_template()
+    admin = await asyncpg.connect(settings.database_url)
+    try:
+        for name, provision, prefix in (
+            ("aerich migrations (before)", migrate, "bench_migrate"),
+            ("template clone (after)", clone, "bench_clone"),
+        ):
+            durations = await measure(admin, provision, prefix, tenants)
+            print(
+                f"{name:<28} {tenants:>4} tenants"
+                f"  mean {statistics.mean(durations) * 1000:>8.1f} ms"
+                f"  max {max(durations) * 1000:>8.1f} ms"
+            )
+    finally:
+        await admin.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:]]))
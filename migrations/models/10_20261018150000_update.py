@@ -0,0 +1,26 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "provisioningjob" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "status" VARCHAR(16) NOT NULL DEFAULT 'pending',
+    "step" VARCHAR(32) NOT NULL DEFAULT 'database',
+    "attempts" INT NOT NULL DEFAULT 0,
+    "last_error" TEXT,
+    "run_after" TIMESTAMPTZ NOT NULL,
+    "locked_until" TIMESTAMPTZ,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "organization_id" INT NOT NULL UNIQUE REFERENCES "organization" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_provisionin_run_aft_3b7e1a" ON "provisioningjob" ("run_after");
+COMMENT ON COLUMN "provisioningjob"."status" IS 'PENDING: pending\\nRUNNING: running\\nSUCCEEDED: succeeded\\nFAILED: failed';
+COMMENT ON COLUMN "organization"."status" IS 'PROVISIONING: provisioning\\nACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "provisioningjob";
+COMMENT ON COLUMN "organization"."status" IS 'ACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived';"""
@@ -0,0 +1,31 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "tenantmigrationrun" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "target" VARCHAR(255) NOT NULL,
+    "completed" BOOL NOT NULL DEFAULT False,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "finished_at" TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS "idx_tenantmigra_target_5d0c47" ON "tenantmigrationrun" ("target");
+CREATE TABLE IF NOT EXISTS "tenantmigration" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "status" VARCHAR(16) NOT NULL,
+    "applied" JSONB NOT NULL,
+    "error" TEXT,
+    "started_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "finished_at" TIMESTAMPTZ,
+    "organization_id" INT NOT NULL REFERENCES "organization" ("id") ON DELETE CASCADE,
+    "run_id" INT NOT NULL REFERENCES "tenantmigrationrun" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_tenantmigra_run_id_8f61b2" UNIQUE ("run_id", "organization_id")
+);
+COMMENT ON COLUMN "tenantmigration"."status" IS 'RUNNING: running\\nSUCCEEDED: succeeded\\nFAILED: failed';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "tenantmigration";
+        DROP TABLE IF EXISTS "tenantmigrationrun";"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "organization" ADD "last_active_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS "idx_organizatio_last_ac_c52a66" ON "organization" ("last_active_at");
+COMMENT ON COLUMN "organization"."status" IS 'PROVISIONING: provisioning\\nACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived\\nHIBERNATED: hibernated';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_organizatio_last_ac_c52a66";
+ALTER TABLE "organization" DROP COLUMN "last_active_at";
+COMMENT ON COLUMN "organization"."status" IS 'PROVISIONING: provisioning\\nACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived';"""
@@ -0,0 +1,29 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "userchange" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "previous_email" VARCHAR(255) NOT NULL,
+    "email" VARCHAR(255) NOT NULL,
+    "password_hash" VARCHAR(128) NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "user_id" INT NOT NULL REFERENCES "coreuser" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_userchange_user_id_27ddb1" ON "userchange" ("user_id", "id");
+COMMENT ON TABLE "userchange" IS 'Outbox of core user changes, copied into the user''s tenant databases';
+CREATE TABLE IF NOT EXISTS "tenantsynccheckpoint" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "position" INT NOT NULL DEFAULT 0,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "organization_id" INT NOT NULL UNIQUE REFERENCES "organization" ("id") ON DELETE CASCADE
+);
+INSERT INTO "tenantsynccheckpoint" ("organization_id", "position")
+SELECT "id", 0 FROM "organization" ON CONFLICT DO NOTHING;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "tenantsynccheckpoint";
+DROP TABLE IF EXISTS "userchange";"""
@@ -0,0 +1,11 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        COMMENT ON COLUMN "organization"."status" IS 'PROVISIONING: provisioning\\nACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived\\nHIBERNATED: hibernated\\nFAILED: failed';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        COMMENT ON COLUMN "organization"."status" IS 'PROVISIONING: provisioning\\nACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived\\nHIBERNATED: hibernated';"""
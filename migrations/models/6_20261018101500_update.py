@@ -0,0 +1,12 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "organization" ADD "status" VARCHAR(16) NOT NULL DEFAULT 'active';
+COMMENT ON COLUMN "organization"."status" IS 'ACTIVE: active\\nSUSPENDED: suspended\\nARCHIVED: archived';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "organization" DROP COLUMN "status";"""
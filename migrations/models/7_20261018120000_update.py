@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "coreuser" ADD "token_version" INT NOT NULL DEFAULT 0;
+        ALTER TABLE "tenantuser" ADD "token_version" INT NOT NULL DEFAULT 0;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "coreuser" DROP COLUMN "token_version";
+        ALTER TABLE "tenantuser" DROP COLUMN "token_version";"""
@@ -0,0 +1,31 @@
+from tortoise import BaseDBAsyncClient
+
+
+# Pending tokens are backfilled to expire VERIFICATION_TOKEN_EXPIRE_HOURS
+# after they were sent, at its documented default of 24. Migrations are plain
+# SQL and do not read the settings, so deployments that changed it get 24
+# hours for tokens sent before upgrading; newer tokens use the setting.
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "verificationtoken" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "token_digest" VARCHAR(64) NOT NULL UNIQUE,
+    "expires_at" TIMESTAMPTZ NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "user_id" INT NOT NULL REFERENCES "coreuser" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_verificatio_expires_8c1d2e" ON "verificationtoken" ("expires_at");
+INSERT INTO "verificationtoken" ("token_digest", "expires_at", "created_at", "user_id")
+    SELECT encode(sha256(convert_to("verification_token", 'UTF8')), 'hex'),
+           "verification_token_created_at" + INTERVAL '24 hours',
+           "verification_token_created_at",
+           "id"
+    FROM "coreuser"
+    WHERE "verification_token" IS NOT NULL AND "verification_token_created_at" IS NOT NULL
+    ON CONFLICT DO NOTHING;
+UPDATE "coreuser" SET "verification_token" = NULL WHERE "verification_token" IS NOT NULL;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "verificationtoken";"""
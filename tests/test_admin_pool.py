@@ -0,0 +1,37 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.db.admin import AdminPools
+
+
+def _pool():
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value="connection")
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    pool.close = AsyncMock()
+    pool.get_size.return_value = 2
+    pool.get_idle_size.return_value = 1
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_one_pool_per_server_is_reused():
+    pools = AdminPools(max_size=2, acquire_timeout=5)
+    with patch(
+        "asyncpg.create_pool",
+        new_callable=AsyncMock,
+        side_effect=lambda *a, **k: _pool(),
+    ) as mock_create:
+        for _ in range(3):
+            async with pools.acquire("postgres://a/postgres") as connection:
+                assert connection == "connection"
+        async with pools.acquire("postgres://b/postgres"):
+            pass
+
+    assert mock_create.await_count == 2
+    assert mock_create.await_args.kwargs["max_size"] == 2
+    assert pools.stats() == {"servers": 2, "open": 4, "in_use": 2}
+
+    await pools.close()
+    assert pools.stats()["servers"] == 0
@@ -1,5 +1,6 @@
 import uuid
-from datetime import timedelta
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
 
 import pytest
 from jose import jwt
@@ -11,6 +12,7 @@ from app.models.tenant import TenantUser
 from app.utils.auth import (
     authenticate_user,
     create_access_token,
+    create_user_token,
     get_password_hash,
     utc_now,
     verify_password,
@@ -71,6 +73,24 @@ def test_create_access_token_without_expiry():
     assert payload["sub"] == "123"
 
 
+def test_create_user_token_carries_tenant_and_profile():
+    user = MagicMock(
+        id=5,
+        email="user@example.com",
+        token_version=2,
+        is_active=True,
+        created_at=datetime(2026, 1, 1),
+    )
+    token = create_user_token(user, tenant_id=7)
+    payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    assert payload["sub"] == "5"
+    assert payload["tid"] == 7
+    assert payload["ver"] == 2
+    assert payload["email"] == "user@example.com"
+    assert payload["created_at"] == "2026-01-01T00:00:00"
+    assert payload["is_active"] is True
+
+
 def test_token_expiry():
     token = create_access_token({"sub": "123"}, expires_delta=timedelta(minutes=-1))
     with pytest.raises(jwt.ExpiredSignatureError):
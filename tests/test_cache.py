@@ -0,0 +1,33 @@
+from unittest.mock import patch
+
+from app.utils.cache import MISSING, TTLCache
+
+
+def test_get_returns_cached_value():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", None)
+    assert cache.get("key") is None
+    assert cache.get("other") is MISSING
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_entries_expire():
+    cache = TTLCache(maxsize=10, ttl=60)
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.set("short", 1, ttl=5)
+        cache.set("long", 2)
+    with patch("app.utils.cache.time.monotonic", return_value=110.0):
+        assert cache.get("short") is MISSING
+        assert cache.get("long") == 2
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
@@ -2,6 +2,10 @@ import uuid
 
 import pytest
 
+from app.models.core import UserChange, VerificationToken
+from app.services.verification import new_verification_token
+from app.utils.auth import create_user_token
+
 
 @pytest.mark.asyncio
 async def test_register_user(test_client):
@@ -36,10 +40,12 @@ async def test_login_user(test_client, core_user):
 
 @pytest.mark.asyncio
 async def test_verify_email(test_client, core_user):
-    core_user.verification_token = "test_token"
-    await core_user.save()
+    token, digest, expires_at = new_verification_token()
+    await VerificationToken.create(
+        user=core_user, token_digest=digest, expires_at=expires_at
+    )
 
-    response = test_client.get("/api/auth/verify?token=test_token")
+    response = test_client.get(f"/api/auth/verify?token={token}")
     assert response.status_code == 200
     assert "Email verified successfully" in response.json()["message"]
 
@@ -48,3 +54,17 @@ async def test_verify_email(test_client, core_user):
 async def test_verify_email_invalid_token(test_client):
     response = test_client.get("/api/auth/verify?token=invalid")
     assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_update_account_queues_change_for_tenants(test_client, core_user):
+    response = test_client.put(
+        "/api/account",
+        json={"password": "NewSecret123!"},
+        headers={"Authorization": f"Bearer {create_user_token(core_user)}"},
+    )
+    assert response.status_code == 200
+
+    change = await UserChange.get(user_id=core_user.id)
+    assert change.previous_email == change.email == core_user.email
+    assert change.password_hash != core_user.password_hash
@@ -39,12 +39,12 @@ async def test_tenant_router():
     router = TenantRouter()
 
     current_tenant.set(1)
-    assert await router.db_for_read(None) is not None
-    assert await router.db_for_write(None) is not None
+    assert router.db_for_read(None) == "tenant_1"
+    assert router.db_for_write(None) == "tenant_1"
 
     current_tenant.set(None)
-    assert await router.db_for_read(None) == "default"
-    assert await router.db_for_write(None) == "default"
+    assert router.db_for_read(None) == "default"
+    assert router.db_for_write(None) == "default"
 
 
 @pytest.mark.asyncio
@@ -1,3 +1,4 @@
+import time
 import uuid
 
 from fastapi import status
@@ -35,9 +36,20 @@ async def test_full_flow(test_client):
         headers={"Authorization": f"Bearer {token}"},
         json={"name": "Integration Test Org"},
     )
-    assert org_res.status_code == status.HTTP_200_OK
+    assert org_res.status_code == status.HTTP_202_ACCEPTED
     org_data = org_res.json()
 
+    # Wait for the provisioning job
+    for _ in range(60):
+        job_res = test_client.get(
+            org_data["status_url"], headers={"Authorization": f"Bearer {token}"}
+        )
+        assert job_res.status_code == status.HTTP_200_OK
+        if job_res.json()["status"] == "succeeded":
+            break
+        time.sleep(0.5)
+    assert job_res.json()["status"] == "succeeded"
+
     # Register tenant user
     tenant_email = f"tenant_{unique_email}"
     tenant_res = test_client.post(
@@ -1,14 +1,53 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+
+from app.main import app, warm_up
 
 client = TestClient(app)
 
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"Hello": "World"}
 
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
+
+
+def test_readiness_check_before_warm_up():
+    app.state.ready = False
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+
+def test_readiness_check_after_warm_up():
+    app.state.ready = True
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_metrics_reports_cache_counters():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert set(response.json()["principal_cache"]) == {"hits", "misses", "size"}
+
+
+@pytest.mark.asyncio
+async def test_failed_warm_up_is_logged_and_still_marks_ready():
+    app.state.ready = False
+    with patch(
+        "app.main.prewarm_tenant_pools",
+        new_callable=AsyncMock,
+        side_effect=OSError("connection refused"),
+    ), patch("app.main.logger.exception") as mock_log:
+        await warm_up(app)
+    assert app.state.ready is True
+    mock_log.assert_called_once()
@@ -1,9 +1,20 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
 import pytest
 from fastapi import FastAPI, Request
-from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
 
-from app.middleware.tenant_context import TenantMiddleware, get_current_tenant, set_current_tenant, reset_current_tenant
+from app.middleware.quota import QuotaExceeded
+from app.middleware.tenant_context import (
+    TenantMiddleware,
+    get_current_tenant,
+    reset_current_tenant,
+    set_current_tenant,
+)
+from app.models.core import OrganizationStatus
+from app.services.hibernation import HibernationError
 
 app = FastAPI()
 app.add_middleware(TenantMiddleware)
@@ -14,11 +25,30 @@ async def root(request: Request):
     return {"is_core": request.state.is_core, "tenant": request.state.tenant}
 
 
+@app.get("/stream")
+async def stream():
+    async def body():
+        for _ in range(3):
+            yield f"{get_current_tenant()}\n"
+
+    return StreamingResponse(body(), media_type="text/plain")
+
+
 @pytest.fixture
 def client():
     return TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def tenant_status():
+    with patch(
+        "app.middleware.tenant_context.tenant_directory.status",
+        new_callable=AsyncMock,
+        return_value=OrganizationStatus.ACTIVE,
+    ) as mock_status:
+        yield mock_status
+
+
 @pytest.mark.parametrize(
     "header,expected",
     [
@@ -36,13 +66,74 @@ def test_tenant_middleware(client, header, expected):
     assert response.json() == expected
 
 
-
 def test_invalid_tenant_id(client):
-    with pytest.raises(HTTPException) as exc_info:
-        client.get("/", headers={"X-TENANT": "invalid"})
-    assert exc_info.value.status_code == 400
-    assert "Invalid tenant ID format" in exc_info.value.detail
+    response = client.get("/", headers={"X-TENANT": "invalid"})
+    assert response.status_code == 400
+    assert "Invalid tenant ID format" in response.json()["detail"]
+
 
+def test_tenant_context_covers_streamed_body(client):
+    response = client.get("/stream", headers={"X-TENANT": "7"})
+    assert response.status_code == 200
+    assert response.text == "7\n7\n7\n"
+
+
+@pytest.mark.parametrize(
+    "org_status,status_code",
+    [
+        (None, 404),
+        (OrganizationStatus.PROVISIONING, 503),
+        (OrganizationStatus.SUSPENDED, 403),
+        (OrganizationStatus.ARCHIVED, 410),
+        (OrganizationStatus.FAILED, 500),
+    ],
+)
+def test_unavailable_tenant_is_rejected(client, tenant_status, org_status, status_code):
+    tenant_status.return_value = org_status
+    response = client.get("/", headers={"X-TENANT": "1"})
+    assert response.status_code == status_code
+
+
+def test_hibernated_tenant_is_restored_before_routing(client, tenant_status):
+    tenant_status.return_value = OrganizationStatus.HIBERNATED
+    with patch(
+        "app.middleware.tenant_context.tenant_hibernation.wake", new_callable=AsyncMock
+    ) as mock_wake:
+        response = client.get("/", headers={"X-TENANT": "1"})
+    assert response.status_code == 200
+    mock_wake.assert_awaited_once_with(1)
+
+
+def test_slow_restore_asks_client_to_retry(client, tenant_status):
+    tenant_status.return_value = OrganizationStatus.HIBERNATED
+    with patch(
+        "app.middleware.tenant_context.tenant_hibernation.wake",
+        side_effect=asyncio.TimeoutError,
+    ):
+        response = client.get("/", headers={"X-TENANT": "1"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_failed_restore_is_not_retried(client, tenant_status):
+    tenant_status.return_value = OrganizationStatus.HIBERNATED
+    with patch(
+        "app.middleware.tenant_context.tenant_hibernation.wake",
+        side_effect=HibernationError("archive missing"),
+    ):
+        response = client.get("/", headers={"X-TENANT": "1"})
+    assert response.status_code == 500
+    assert "Retry-After" not in response.headers
+
+
+def test_over_quota_tenant_is_shed(client):
+    with patch(
+        "app.middleware.tenant_context.tenant_scheduler.acquire",
+        side_effect=QuotaExceeded("over quota"),
+    ):
+        response = client.get("/", headers={"X-TENANT": "1"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
 
 
 def test_get_current_tenant():
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.passwords import PasswordHasher, check_password
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_in_pool():
+    hasher = PasswordHasher(workers=2, queue_size=2)
+    try:
+        hashed = await hasher.hash("secret123")
+        assert check_password("secret123", hashed)
+        assert await hasher.verify("secret123", hashed) is True
+        assert await hasher.verify("wrong", hashed) is False
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    hasher = PasswordHasher(workers=1, queue_size=0)
+    try:
+        hashing = asyncio.ensure_future(hasher.hash("secret123"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            await hasher.hash("secret123")
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {"Retry-After": "1"}
+        await hashing
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_while_hashing():
+    hasher = PasswordHasher(workers=1, queue_size=4)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        await hasher.hash("secret123")
+        assert ticks > 0
+    finally:
+        task.cancel()
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hash_many_keeps_order():
+    hasher = PasswordHasher(workers=2, queue_size=0)
+    try:
+        passwords = ["first-pass", "second-pass", "third-pass"]
+        hashes = await hasher.hash_many(passwords)
+        assert all(map(check_password, passwords, hashes))
+        assert hasher._pending == 0
+    finally:
+        hasher.shutdown()
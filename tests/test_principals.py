@@ -0,0 +1,140 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from tortoise.exceptions import DoesNotExist, IntegrityError
+
+from app.middleware.tenant_context import TenantContext
+from app.models.tenant import TenantUser
+from app.routes.tenant import update_current_user_profile
+from app.services.auth import get_current_claims, load_principal
+from app.services.principals import PrincipalCache
+from app.utils.cache import MISSING
+
+
+@pytest.fixture
+def cache():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    with patch("app.services.auth.principal_cache", cache):
+        yield cache
+
+
+def _model(token_version=0):
+    model = MagicMock()
+    model.get = AsyncMock(return_value=MagicMock(token_version=token_version))
+    return model
+
+
+def test_principals_are_scoped_by_tenant():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.set(None, "1", "core user")
+    cache.set(7, 1, "tenant user")
+    assert cache.get(None, 1) == "core user"
+    assert cache.get(7, "1") == "tenant user"
+
+    cache.invalidate(7, 1)
+    assert cache.get(7, "1") is MISSING
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 1}
+
+
+@pytest.mark.asyncio
+async def test_load_principal_hits_database_once(cache):
+    model = _model()
+
+    async with TenantContext(3):
+        first = await load_principal(model, {"sub": "5", "ver": 0})
+        second = await load_principal(model, {"sub": "5", "ver": 0})
+
+    model.get.assert_awaited_once_with(id="5")
+    assert second.token_version == first.token_version == 0
+
+
+def test_callers_cannot_change_the_cached_principal():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    user = TenantUser(
+        id=5, email="old@example.com", password_hash="hash", token_version=0
+    )
+    cache.set(7, 5, user)
+    user.email = "set@example.com"
+
+    handed_out = cache.get(7, 5)
+    handed_out.email = "new@example.com"
+    handed_out.token_version += 1
+
+    cached = cache.get(7, 5)
+    assert (cached.email, cached.token_version) == ("old@example.com", 0)
+    assert cached is not handed_out
+
+
+@pytest.mark.asyncio
+async def test_failed_profile_update_leaves_the_principal_alone():
+    principal = TenantUser(
+        id=5, email="old@example.com", password_hash="hash", token_version=0
+    )
+    stored = TenantUser(
+        id=5, email="old@example.com", password_hash="hash", token_version=0
+    )
+    stored.save = AsyncMock(side_effect=IntegrityError("duplicate key"))
+
+    with patch(
+        "app.routes.tenant.TenantUser.get", new_callable=AsyncMock, return_value=stored
+    ), patch("app.routes.tenant.get_current_tenant", return_value=7), patch(
+        "app.routes.tenant.principal_cache"
+    ) as mock_cache:
+        with pytest.raises(IntegrityError):
+            await update_current_user_profile(
+                MagicMock(email="taken@example.com"), user=principal, x_tenant="7"
+            )
+
+    assert (principal.email, principal.token_version) == ("old@example.com", 0)
+    assert (stored.email, stored.token_version) == ("taken@example.com", 1)
+    mock_cache.invalidate.assert_called_once_with(7, 5)
+
+
+@pytest.mark.asyncio
+async def test_load_principal_rejects_unknown_user(cache):
+    model = MagicMock()
+    model.get = AsyncMock(side_effect=DoesNotExist(model))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await load_principal(model, {"sub": "5", "ver": 0})
+
+    assert exc_info.value.status_code == 401
+    assert cache.get(None, "5") is MISSING
+
+
+@pytest.mark.asyncio
+async def test_load_principal_rejects_stale_token_version(cache):
+    cache.set(None, "5", MagicMock(token_version=1))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await load_principal(_model(), {"sub": "5", "ver": 0})
+
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_newer_token_version_reloads_cached_user(cache):
+    cache.set(None, "5", MagicMock(token_version=0))
+    model = _model(token_version=1)
+
+    user = await load_principal(model, {"sub": "5", "ver": 1})
+
+    assert user.token_version == 1
+    model.get.assert_awaited_once_with(id="5")
+
+
+@pytest.mark.asyncio
+async def test_claims_are_bound_to_the_request_tenant():
+    claims = {"sub": "5", "tid": 7, "ver": 0}
+    with patch("app.services.auth.token_verifier.decode", return_value=claims):
+        async with TenantContext(7):
+            assert await get_current_claims("token") == claims
+
+        async with TenantContext(8):
+            with pytest.raises(HTTPException) as exc_info:
+                await get_current_claims("token")
+        assert exc_info.value.status_code == 401
+
+        with pytest.raises(HTTPException):
+            await get_current_claims("token")
@@ -0,0 +1,176 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.core import OrganizationStatus, ProvisioningStatus
+from app.services.provisioning import ProvisioningWorker, provision
+
+
+def _worker(**kwargs):
+    options = dict(
+        concurrency=2, poll_interval=60, max_attempts=3, retry_delay=10, lease=600
+    )
+    options.update(kwargs)
+    return ProvisioningWorker(**options)
+
+
+def _job(step="database", attempts=1):
+    job = MagicMock()
+    job.id = 5
+    job.organization_id = 7
+    job.step = step
+    job.attempts = attempts
+    return job
+
+
+def _query():
+    query = MagicMock()
+    query.using_db.return_value = query
+    query.update = AsyncMock()
+    return query
+
+
+@pytest.mark.asyncio
+async def test_claim_builds_jobs_from_claimed_rows():
+    worker = _worker()
+    with patch("app.services.provisioning.connections") as mock_connections, patch(
+        "app.models.core.ProvisioningJob._init_from_db", side_effect=lambda **row: row
+    ):
+        client = mock_connections.get.return_value
+        client.execute_query_dict = AsyncMock(return_value=[{"id": 1}, {"id": 2}])
+
+        assert await worker.claim(2) == [{"id": 1}, {"id": 2}]
+        assert client.execute_query_dict.await_args.args[1] == [600, 2]
+
+
+@pytest.mark.asyncio
+async def test_successful_job_is_marked_succeeded():
+    worker = _worker()
+    with patch(
+        "app.services.provisioning.provision", new_callable=AsyncMock
+    ), patch.object(worker, "_update", new_callable=AsyncMock) as mock_update:
+        await worker.run(_job())
+
+    mock_update.assert_awaited_once_with(
+        mock_update.await_args.args[0],
+        status=ProvisioningStatus.SUCCEEDED,
+        last_error=None,
+    )
+    assert worker.stats()["succeeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_with_backoff():
+    worker = _worker()
+    with patch(
+        "app.services.provisioning.provision",
+        new_callable=AsyncMock,
+        side_effect=OSError("connection refused"),
+    ), patch.object(worker, "_update", new_callable=AsyncMock) as mock_update, patch(
+        "app.services.provisioning.drop_tenant_database", new_callable=AsyncMock
+    ) as mock_drop:
+        before = datetime.utcnow()
+        await worker.run(_job(attempts=2))
+
+    fields = mock_update.await_args.kwargs
+    assert fields["status"] == ProvisioningStatus.PENDING
+    assert fields["last_error"] == "connection refused"
+    assert (fields["run_after"] - before).total_seconds() >= 20
+    mock_drop.assert_not_awaited()
+    assert worker.stats()["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_job_fails_organization_and_removes_its_rows():
+    worker = _worker()
+    shards, checkpoints, organizations, jobs = _query(), _query(), _query(), _query()
+    shards.delete = AsyncMock()
+    checkpoints.delete = AsyncMock()
+
+    @asynccontextmanager
+    async def transaction(alias):
+        yield "db"
+
+    with patch(
+        "app.services.provisioning.provision",
+        new_callable=AsyncMock,
+        side_effect=OSError("disk full"),
+    ), patch(
+        "app.services.provisioning.drop_tenant_database", new_callable=AsyncMock
+    ) as mock_drop, patch(
+        "app.services.provisioning.in_transaction", transaction
+    ), patch(
+        "app.services.provisioning.TenantShard.filter", return_value=shards
+    ) as mock_shards, patch(
+        "app.services.provisioning.TenantSyncCheckpoint.filter",
+        return_value=checkpoints,
+    ) as mock_checkpoints, patch(
+        "app.services.provisioning.Organization.filter", return_value=organizations
+    ), patch(
+        "app.services.provisioning.ProvisioningJob.filter", return_value=jobs
+    ), patch(
+        "app.services.provisioning.tenant_directory.invalidate"
+    ) as mock_invalidate:
+        await worker.run(_job(step="owner", attempts=3))
+
+    mock_drop.assert_awaited_once_with(7)
+    mock_shards.assert_called_once_with(organization_id=7)
+    shards.delete.assert_awaited_once()
+    mock_checkpoints.assert_called_once_with(organization_id=7)
+    checkpoints.delete.assert_awaited_once()
+    organizations.update.assert_awaited_once_with(status=OrganizationStatus.FAILED)
+    fields = jobs.update.await_args.kwargs
+    assert fields["status"] == ProvisioningStatus.FAILED
+    assert fields["last_error"] == "disk full"
+    mock_invalidate.assert_called_once_with(7)
+    assert worker.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_provision_resumes_from_recorded_step():
+    organization = MagicMock(id=7, owner_id=3)
+    jobs, organizations = _query(), _query()
+    with patch("app.services.provisioning.connections"), patch(
+        "app.models.core.Organization.get",
+        new_callable=AsyncMock,
+        return_value=organization,
+    ) as mock_get, patch(
+        "app.models.core.Organization.filter", return_value=organizations
+    ), patch(
+        "app.models.core.ProvisioningJob.filter", return_value=jobs
+    ), patch(
+        "app.services.provisioning.create_tenant_database", new_callable=AsyncMock
+    ) as mock_create, patch(
+        "app.services.provisioning.sync_owner_to_tenant", new_callable=AsyncMock
+    ) as mock_sync:
+        job = _job(step="owner")
+        await provision(job)
+
+    assert mock_get.await_args.kwargs["id"] == 7
+    mock_create.assert_not_awaited()
+    mock_sync.assert_awaited_once_with(7, 3)
+    jobs.update.assert_awaited_once_with(step="activate")
+    organizations.update.assert_awaited_once_with(status=OrganizationStatus.ACTIVE)
+    assert job.step == "activate"
+
+
+@pytest.mark.asyncio
+async def test_watch_survives_a_pool_timeout():
+    worker = _worker(poll_interval=0)
+    calls = []
+
+    async def claim(free):
+        calls.append(free)
+        if len(calls) == 1:
+            raise asyncio.TimeoutError
+        if len(calls) == 3:
+            raise asyncio.CancelledError
+        return []
+
+    with patch.object(worker, "claim", side_effect=claim):
+        with pytest.raises(asyncio.CancelledError):
+            await worker._watch(asyncio.Event())
+    assert calls == [2, 2, 2]
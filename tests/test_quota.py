@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.config import TenantTier
+from app.middleware.quota import QuotaExceeded, TenantScheduler
+
+TIERS = {
+    1: TenantTier(max_requests=2, weight=1),
+    2: TenantTier(max_requests=2, weight=2),
+    3: TenantTier(max_requests=10, weight=1),
+}
+
+
+def make_scheduler(capacity=2, queue_size=10, queue_timeout=1.0):
+    return TenantScheduler(
+        capacity=capacity,
+        queue_size=queue_size,
+        queue_timeout=queue_timeout,
+        tier_for=TIERS.__getitem__,
+    )
+
+
+@pytest.mark.asyncio
+async def test_requests_within_quota_are_admitted_immediately():
+    scheduler = make_scheduler()
+    await scheduler.acquire(1)
+    await scheduler.acquire(3)
+    assert scheduler.stats() == {"running": 2, "capacity": 2, "queued": 0}
+
+    scheduler.release(1)
+    scheduler.release(3)
+    assert scheduler.stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_tenant_limit_leaves_room_for_others():
+    scheduler = make_scheduler(capacity=10)
+    await scheduler.acquire(1)
+    await scheduler.acquire(1)
+
+    blocked = asyncio.ensure_future(scheduler.acquire(1))
+    await asyncio.sleep(0)
+    assert not blocked.done()
+
+    await asyncio.wait_for(scheduler.acquire(3), 0.1)
+    assert scheduler.in_flight(3) == 1
+
+    scheduler.release(1)
+    await asyncio.wait_for(blocked, 0.1)
+    assert scheduler.in_flight(1) == 2
+
+
+@pytest.mark.asyncio
+async def test_queued_requests_are_shed_after_timeout():
+    scheduler = make_scheduler(capacity=1, queue_timeout=0.01)
+    await scheduler.acquire(1)
+
+    with pytest.raises(QuotaExceeded):
+        await scheduler.acquire(3)
+    assert scheduler.stats()["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_shed_immediately():
+    scheduler = make_scheduler(capacity=1, queue_size=1)
+    await scheduler.acquire(1)
+    waiting = asyncio.ensure_future(scheduler.acquire(3))
+    await asyncio.sleep(0)
+
+    with pytest.raises(QuotaExceeded):
+        await scheduler.acquire(3)
+
+    scheduler.release(1)
+    await waiting
+
+
+@pytest.mark.asyncio
+async def test_freed_slots_are_shared_weighted_round_robin():
+    scheduler = make_scheduler(capacity=1)
+    await scheduler.acquire(3)
+
+    admitted = []
+
+    async def request(tenant_id):
+        await scheduler.acquire(tenant_id)
+        admitted.append(tenant_id)
+
+    waiters = [asyncio.ensure_future(request(1)) for _ in range(3)]
+    waiters += [asyncio.ensure_future(request(2)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    holder = 3
+    for _ in range(6):
+        scheduler.release(holder)
+        await asyncio.sleep(0.01)
+        holder = admitted[-1]
+    await asyncio.gather(*waiters)
+
+    assert admitted == [1, 2, 2, 1, 2, 1]
@@ -0,0 +1,81 @@
+import math
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.db import routing
+from app.db.replicas import ReplicaSet, last_write_at, mark_write
+from app.db.routing import TenantRouter
+from app.middleware.tenant_context import current_tenant
+
+
+@pytest.fixture
+def replicas():
+    return ReplicaSet(
+        ["postgres://replica-a/core", "postgres://replica-b/core"],
+        max_lag=5,
+        check_interval=1,
+    )
+
+
+def test_replicas_start_unhealthy(replicas):
+    assert replicas.healthy() == []
+    assert replicas.choose() is None
+
+
+def test_choose_skips_lagging_replicas(replicas):
+    replicas.lag = {0: 30.0, 1: 0.5}
+    assert [replicas.choose() for _ in range(3)] == [1, 1, 1]
+
+    replicas.lag = {0: 0.0, 1: 0.5}
+    assert sorted(replicas.choose() for _ in range(2)) == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_check_records_lag(replicas):
+    connection = MagicMock()
+    connection.is_closed.return_value = False
+    connection.fetchval = AsyncMock(return_value=1.5)
+
+    with patch("asyncpg.connect", new_callable=AsyncMock) as mock_connect:
+        mock_connect.return_value = connection
+        assert await replicas.check(0) == 1.5
+        assert await replicas.check(0) == 1.5
+
+    mock_connect.assert_awaited_once()
+    assert replicas.healthy() == [0]
+
+
+@pytest.mark.asyncio
+async def test_failed_check_marks_replica_unhealthy(replicas):
+    replicas.lag[0] = 0.0
+    with patch("asyncpg.connect", new_callable=AsyncMock) as mock_connect:
+        mock_connect.side_effect = OSError("connection refused")
+        assert await replicas.check(0) == math.inf
+
+    assert replicas.healthy() == []
+
+
+def test_core_reads_use_healthy_replica():
+    router = TenantRouter()
+    current_tenant.set(None)
+    last_write_at.set(None)
+
+    with patch.object(routing.core_replicas, "choose", return_value=0):
+        assert router.db_for_read(None) == "default_replica_0"
+    with patch.object(routing.core_replicas, "choose", return_value=None):
+        assert router.db_for_read(None) == "default"
+
+
+def test_reads_stick_to_primary_after_write():
+    router = TenantRouter()
+    current_tenant.set(None)
+    last_write_at.set(None)
+
+    with patch.object(routing.core_replicas, "choose", return_value=0):
+        assert router.db_for_write(None) == "default"
+        assert router.db_for_read(None) == "default"
+
+        with patch("app.db.replicas.settings.read_your_writes_window", 0):
+            mark_write()
+            assert router.db_for_read(None) == "default_replica_0"
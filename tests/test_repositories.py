@@ -0,0 +1,45 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.repositories.users import insert_core_user, insert_tenant_user
+
+
+def _client(rows):
+    client = MagicMock()
+    client.execute_query_dict = AsyncMock(return_value=rows)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_insert_core_user_returns_model_from_row():
+    row = {"id": 1, "email": "a@example.com"}
+    client = _client([row])
+    expires_at = datetime(2026, 1, 1)
+
+    with patch("app.repositories.users.connections.get", return_value=client), patch(
+        "app.models.core.CoreUser._init_from_db", return_value="user"
+    ) as mock_init:
+        user = await insert_core_user(
+            "a@example.com", "hash", True, "digest", expires_at
+        )
+
+    assert user == "user"
+    mock_init.assert_called_once_with(**row)
+    query, values = client.execute_query_dict.await_args.args
+    assert "ON CONFLICT" in query and '"verificationtoken"' in query
+    assert values == ["a@example.com", "hash", True, "digest", expires_at]
+
+
+@pytest.mark.asyncio
+async def test_insert_tenant_user_returns_none_on_conflict():
+    client = _client([])
+
+    with patch(
+        "app.repositories.users.get_tenant_connection", AsyncMock(return_value=client)
+    ) as mock_connection:
+        assert await insert_tenant_user(3, "a@example.com", "hash") is None
+
+    mock_connection.assert_awaited_once_with(3)
+    client.execute_query_dict.assert_awaited_once()
@@ -0,0 +1,139 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from tortoise.exceptions import IntegrityError
+
+from app.middleware.tenant_context import TenantContext
+from app.services.auth import get_current_claims, refresh_session
+from app.services.revocations import RevocationList
+from app.utils.bloom import BloomFilter
+
+
+def _rows(rows):
+    query = MagicMock()
+    query.using_db.return_value = query
+    query.order_by.return_value = query
+    query.values_list = AsyncMock(return_value=rows)
+    query.exists = AsyncMock(return_value=bool(rows))
+    return query
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"revoked-{i}")
+
+    assert all(f"revoked-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"valid-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.asyncio
+async def test_unrevoked_ids_skip_the_database():
+    revocations = RevocationList(capacity=100, error_rate=0.01, sync_interval=5)
+    with patch("app.services.revocations.connections"), patch(
+        "app.models.core.RevokedToken.filter"
+    ) as mock_filter:
+        assert await revocations.is_revoked("session") is False
+    mock_filter.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_filter_hits_are_confirmed_against_the_table():
+    revocations = RevocationList(capacity=100, error_rate=0.01, sync_interval=5)
+    with patch("app.services.revocations.connections"), patch(
+        "app.models.core.RevokedToken.filter",
+        side_effect=[_rows([(1, "session")]), _rows([(1, "session")])],
+    ):
+        await revocations.sync()
+        assert await revocations.is_revoked("session") is True
+    assert revocations.stats() == {"filtered": 1, "checks": 1, "fallbacks": 1}
+
+
+@pytest.mark.asyncio
+async def test_revoking_twice_reports_reuse():
+    revocations = RevocationList(capacity=100, error_rate=0.01, sync_interval=5)
+    with patch("app.services.revocations.connections"), patch(
+        "app.models.core.RevokedToken.create",
+        AsyncMock(side_effect=[None, IntegrityError("duplicate")]),
+    ):
+        assert await revocations.revoke("jti", datetime.utcnow()) is True
+        assert await revocations.revoke("jti", datetime.utcnow()) is False
+
+
+def _refresh_claims(**claims):
+    return {
+        "sub": "5",
+        "tid": 3,
+        "ver": 0,
+        "typ": "refresh",
+        "sid": "session",
+        "jti": "token",
+        "exp": 2000000000,
+        **claims,
+    }
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_tokens():
+    revocations = MagicMock()
+    revocations.is_revoked = AsyncMock(return_value=False)
+    revocations.revoke = AsyncMock(return_value=True)
+    user = MagicMock(
+        id=5,
+        token_version=0,
+        email="user@example.com",
+        is_active=True,
+        created_at=datetime(2026, 1, 1),
+    )
+
+    with patch("app.services.auth.revocation_list", revocations), patch(
+        "app.services.auth.token_verifier.decode", return_value=_refresh_claims()
+    ), patch("app.services.auth.load_principal", AsyncMock(return_value=user)):
+        async with TenantContext(3):
+            tokens = await refresh_session("refresh")
+
+    assert set(tokens) == {"access_token", "refresh_token", "token_type"}
+    revocations.revoke.assert_awaited_once()
+    assert revocations.revoke.await_args.args[0] == "token"
+
+
+@pytest.mark.asyncio
+async def test_reused_refresh_token_revokes_session():
+    revocations = MagicMock()
+    revocations.is_revoked = AsyncMock(return_value=False)
+    revocations.revoke = AsyncMock(side_effect=[False, True])
+
+    with patch("app.services.auth.revocation_list", revocations), patch(
+        "app.services.auth.token_verifier.decode", return_value=_refresh_claims()
+    ):
+        async with TenantContext(3):
+            with pytest.raises(HTTPException) as exc_info:
+                await refresh_session("refresh")
+
+    assert exc_info.value.status_code == 401
+    assert revocations.revoke.await_args.args[0] == "session"
+
+
+@pytest.mark.asyncio
+async def test_access_token_of_revoked_session_is_rejected():
+    revocations = MagicMock()
+    revocations.is_revoked = AsyncMock(return_value=True)
+    claims = {"sub": "5", "tid": None, "ver": 0, "sid": "session"}
+
+    with patch("app.services.auth.revocation_list", revocations), patch(
+        "app.services.auth.token_verifier.decode", return_value=claims
+    ), pytest.raises(HTTPException):
+        await get_current_claims("access")
+    revocations.is_revoked.assert_awaited_once_with("session")
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_is_not_an_access_token():
+    with patch(
+        "app.services.auth.token_verifier.decode",
+        return_value=_refresh_claims(tid=None),
+    ), pytest.raises(HTTPException):
+        await get_current_claims("refresh")
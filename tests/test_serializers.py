@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+from pydantic import BaseModel
+
+from app.models.core import CoreUser, CoreUser_Pydantic
+from app.models.tenant import TenantUser, TenantUser_Pydantic
+from app.routes.tenant import get_current_user_profile
+from app.utils.auth import create_user_token
+from app.utils.serializers import (
+    FastJSONResponse,
+    ModelSerializer,
+    core_user_serializer,
+    tenant_user_serializer,
+)
+from app.utils.tokens import token_verifier
+
+CREATED_AT = datetime(2026, 10, 18, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def _render(content):
+    return orjson.loads(FastJSONResponse(content).body)
+
+
+@pytest.mark.parametrize(
+    "serializer,schema,user",
+    [
+        (
+            core_user_serializer,
+            CoreUser_Pydantic,
+            CoreUser(
+                id=1,
+                email="owner@example.com",
+                password_hash="hash",
+                created_at=CREATED_AT,
+                is_verified=True,
+                is_owner=True,
+                token_version=3,
+            ),
+        ),
+        (
+            tenant_user_serializer,
+            TenantUser_Pydantic,
+            TenantUser(
+                id=2,
+                email="user@example.com",
+                password_hash="hash",
+                created_at=CREATED_AT,
+                is_active=True,
+                token_version=1,
+            ),
+        ),
+    ],
+)
+def test_serializer_matches_pydantic_output(serializer, schema, user):
+    expected = schema.model_validate(user).model_dump(mode="json")
+    assert _render(serializer.serialize(user)) == expected
+    assert "password_hash" not in expected
+
+
+def test_serialize_rows_from_values_list_tuples():
+    rows = [
+        (1, "a@example.com", CREATED_AT, True),
+        (2, "b@example.com", CREATED_AT, False),
+    ]
+    assert tenant_user_serializer.fields == ("id", "email", "created_at", "is_active")
+    assert _render(tenant_user_serializer.serialize_rows(rows)) == [
+        {
+            "id": 1,
+            "email": "a@example.com",
+            "created_at": "2026-10-18T12:30:15.123456Z",
+            "is_active": True,
+        },
+        {
+            "id": 2,
+            "email": "b@example.com",
+            "created_at": "2026-10-18T12:30:15.123456Z",
+            "is_active": False,
+        },
+    ]
+
+
+def test_single_field_serializer():
+    class Name(BaseModel):
+        name: str
+
+    class Row:
+        name = "tenant"
+
+    assert ModelSerializer(Name).serialize(Row()) == {"name": "tenant"}
+
+
+@pytest.mark.asyncio
+async def test_profile_from_token_renders_like_the_stored_user():
+    user = TenantUser(
+        id=2,
+        email="user@example.com",
+        password_hash="hash",
+        created_at=CREATED_AT,
+        is_active=True,
+        token_version=1,
+    )
+    claims = token_verifier.decode(create_user_token(user, tenant_id=7))
+
+    response = await get_current_user_profile(claims, x_tenant="7")
+
+    assert orjson.loads(response.body) == _render(
+        tenant_user_serializer.serialize(user)
+    )
@@ -1,7 +1,10 @@
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
 import pytest
-from unittest.mock import patch, AsyncMock
 from fastapi import HTTPException
-from tortoise.exceptions import DoesNotExist, ConfigurationError
+from tortoise.exceptions import ConfigurationError, DoesNotExist
+
 from app.services.tenant import (
     create_tenant_database,
     init_tenant_schema,
@@ -11,7 +14,7 @@ from app.services.tenant import (
 
 @pytest.mark.asyncio
 async def test_create_tenant_database_success():
-    with patch('asyncpg.connect', new_callable=AsyncMock) as mock_connect:
+    with patch("asyncpg.connect", new_callable=AsyncMock) as mock_connect:
         mock_conn = AsyncMock()
         mock_connect.return_value = mock_conn
         mock_conn.fetchval.return_value = None  # Simulate database not existing
@@ -20,9 +23,10 @@ async def test_create_tenant_database_success():
         db_name = await create_tenant_database(1)
         assert db_name == "tenant_1"
 
+
 @pytest.mark.asyncio
 async def test_create_tenant_database_existing():
-    with patch('asyncpg.connect', new_callable=AsyncMock) as mock_connect:
+    with patch("asyncpg.connect", new_callable=AsyncMock) as mock_connect:
         mock_conn = AsyncMock()
         mock_connect.return_value = mock_conn
         mock_conn.fetchval.return_value = 1  # Simulate database existing
@@ -31,9 +35,10 @@ async def test_create_tenant_database_existing():
         db_name = await create_tenant_database(1)
         assert db_name == "tenant_1"
 
+
 @pytest.mark.asyncio
 async def test_create_tenant_database_error():
-    with patch('asyncpg.connect', new_callable=AsyncMock) as mock_connect:
+    with patch("asyncpg.connect", new_callable=AsyncMock) as mock_connect:
         mock_conn = AsyncMock()
         mock_connect.return_value = mock_conn
         mock_conn.fetchval.side_effect = Exception("Database error")
@@ -44,9 +49,10 @@ async def test_create_tenant_database_error():
         assert exc_info.value.status_code == 500
         assert "Failed to create tenant database" in exc_info.value.detail
 
+
 @pytest.mark.asyncio
 async def test_init_tenant_schema_success():
-    with patch('aerich.Command', new_callable=AsyncMock) as mock_command:
+    with patch("aerich.Command", new_callable=AsyncMock) as mock_command:
         mock_cmd = AsyncMock()
         mock_command.return_value = mock_cmd
         mock_cmd.init.return_value = None
@@ -56,9 +62,10 @@ async def test_init_tenant_schema_success():
         mock_cmd.init.assert_awaited_once()
         mock_cmd.upgrade.assert_awaited_once()
 
+
 @pytest.mark.asyncio
 async def test_init_tenant_schema_error():
-    with patch('aerich.Command', new_callable=AsyncMock) as mock_command:
+    with patch("aerich.Command", new_callable=AsyncMock) as mock_command:
         mock_cmd = AsyncMock()
         mock_command.return_value = mock_cmd
         mock_cmd.init.side_effect = ConfigurationError("Config error")
@@ -69,33 +76,36 @@ async def test_init_tenant_schema_error():
         assert exc_info.value.status_code == 500
         assert "Failed to initialize tenant schema" in exc_info.value.detail
 
+
 @pytest.mark.asyncio
 async def test_sync_owner_to_tenant_success():
-    with patch('tortoise.Tortoise.get_connection', new_callable=AsyncMock) as mock_get_connection, \
-         patch('app.models.core.CoreUser.get', new_callable=AsyncMock) as mock_get, \
-         patch('app.db.routing.get_tenant_connection', new_callable=AsyncMock) as mock_tenant_connection, \
-         patch('app.models.tenant.TenantUser.create', new_callable=AsyncMock) as mock_create:
-
+    with patch(
+        "tortoise.Tortoise.get_connection", new_callable=AsyncMock
+    ) as mock_get_connection, patch(
+        "app.models.core.CoreUser.get", new_callable=AsyncMock
+    ) as mock_get, patch(
+        "app.db.routing.get_tenant_connection", new_callable=AsyncMock
+    ) as mock_tenant_connection, patch(
+        "app.services.tenant.insert_tenant_user", new_callable=AsyncMock
+    ) as mock_insert:
         mock_owner = AsyncMock()
         mock_owner.email = "test@example.com"
         mock_owner.password_hash = "hashed_password"
         mock_get.return_value = mock_owner
         mock_tenant_conn = AsyncMock()
         mock_tenant_connection.return_value = mock_tenant_conn
-        mock_create.return_value = None
 
         await sync_owner_to_tenant(1, 1)
-        mock_create.assert_awaited_once_with(
-            email=mock_owner.email,
-            password_hash=mock_owner.password_hash,
-            is_active=True
+        mock_insert.assert_awaited_once_with(
+            1, mock_owner.email, mock_owner.password_hash
         )
 
+
 @pytest.mark.asyncio
 async def test_sync_owner_to_tenant_error():
-    with patch('tortoise.Tortoise.get_connection', new_callable=AsyncMock), \
-         patch('app.models.core.CoreUser.get', new_callable=AsyncMock) as mock_get:
-
+    with patch("tortoise.Tortoise.get_connection", new_callable=AsyncMock), patch(
+        "app.models.core.CoreUser.get", new_callable=AsyncMock
+    ) as mock_get:
         mock_get.side_effect = DoesNotExist("User not found")
 
         with pytest.raises(HTTPException) as exc_info:
@@ -103,3 +113,24 @@ async def test_sync_owner_to_tenant_error():
 
         assert exc_info.value.status_code == 404
         assert exc_info.value.detail == "Core user not found"
+
+
+@pytest.mark.asyncio
+async def test_create_tenant_schema_in_schema_mode():
+    mock_conn = AsyncMock()
+
+    @asynccontextmanager
+    async def acquire(url):
+        yield mock_conn
+
+    with patch("app.services.tenant.settings.tenant_isolation", "schema"), patch(
+        "app.services.tenant.admin_pools.acquire", acquire
+    ), patch(
+        "app.services.tenant.migrate_tenant", new_callable=AsyncMock
+    ) as mock_migrate:
+        schema_name = await create_tenant_database(1)
+        assert schema_name == "tenant_1"
+        mock_conn.execute.assert_awaited_once_with(
+            'CREATE SCHEMA IF NOT EXISTS "tenant_1"'
+        )
+        mock_migrate.assert_awaited_once_with(1)
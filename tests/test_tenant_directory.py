@@ -0,0 +1,54 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.core import OrganizationStatus
+from app.services.tenant_directory import TenantDirectory
+from app.utils.cache import MISSING
+
+
+def _organizations(rows):
+    query = MagicMock()
+    query.using_db.return_value = query
+    query.values_list = AsyncMock(return_value=rows)
+    return query
+
+
+@pytest.mark.asyncio
+async def test_status_is_cached():
+    directory = TenantDirectory(maxsize=10, ttl=60, negative_ttl=5)
+    with patch("app.services.tenant_directory.connections"), patch(
+        "app.models.core.Organization.filter",
+        return_value=_organizations(["suspended"]),
+    ) as mock_filter:
+        assert await directory.status(1) == OrganizationStatus.SUSPENDED
+        assert await directory.status(1) == OrganizationStatus.SUSPENDED
+
+    mock_filter.assert_called_once_with(id=1)
+
+
+@pytest.mark.asyncio
+async def test_unknown_tenant_is_negatively_cached():
+    directory = TenantDirectory(maxsize=10, ttl=60, negative_ttl=5)
+    with patch("app.services.tenant_directory.connections"), patch(
+        "app.models.core.Organization.filter", return_value=_organizations([])
+    ) as mock_filter:
+        assert await directory.status(404) is None
+        assert await directory.status(404) is None
+        assert mock_filter.call_count == 1
+
+        directory.invalidate(404)
+        assert await directory.status(404) is None
+        assert mock_filter.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_provisioning_tenant_is_cached_briefly():
+    directory = TenantDirectory(maxsize=10, ttl=60, negative_ttl=5)
+    with patch("app.services.tenant_directory.connections"), patch(
+        "app.models.core.Organization.filter",
+        return_value=_organizations(["provisioning"]),
+    ), patch("app.utils.cache.time.monotonic", return_value=100.0) as clock:
+        assert await directory.status(1) == OrganizationStatus.PROVISIONING
+        clock.return_value = 106.0
+        assert directory._cache.get(1) is MISSING
@@ -0,0 +1,127 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.core import TenantMigrationStatus
+from app.services.tenant_migrations import TenantMigrationRunner, in_canary
+
+
+def test_canary_is_stable_and_proportional():
+    tenant_ids = range(1, 2001)
+    canary = [tenant_id for tenant_id in tenant_ids if in_canary(tenant_id, 10)]
+    assert 100 < len(canary) < 300
+    assert canary == [tenant_id for tenant_id in tenant_ids if in_canary(tenant_id, 10)]
+    assert all(in_canary(tenant_id, 100) for tenant_id in tenant_ids)
+    assert not any(in_canary(tenant_id, 0) for tenant_id in tenant_ids)
+
+
+@pytest.fixture
+def tenant_db():
+    client = MagicMock()
+    conn = MagicMock(execute_script=AsyncMock(), execute_query=AsyncMock())
+
+    @asynccontextmanager
+    async def transaction(alias):
+        yield conn
+
+    with patch(
+        "app.services.tenant_migrations.tenant_pools.acquire",
+        new_callable=AsyncMock,
+        return_value=client,
+    ), patch("app.services.tenant_migrations.in_transaction", transaction):
+        yield client, conn
+
+
+@pytest.mark.asyncio
+async def test_migrate_tenant_applies_only_pending_versions(tenant_db):
+    client, conn = tenant_db
+    runner = TenantMigrationRunner(workers=2, timeout=10)
+    runner._content = "{}"
+    client.execute_query_dict = AsyncMock(
+        return_value=[{"version": version} for version in runner.versions[:-1]]
+    )
+    module = MagicMock(upgrade=AsyncMock(return_value="ALTER TABLE x"))
+
+    with patch("app.services.tenant_migrations.load_migration", return_value=module):
+        assert await runner.migrate_tenant(1) == [runner.target]
+
+    conn.execute_script.assert_awaited_once_with("ALTER TABLE x")
+    assert conn.execute_query.await_args.args[1] == [runner.target, "models", "{}"]
+
+
+@pytest.mark.asyncio
+async def test_dry_run_changes_nothing(tenant_db):
+    client, conn = tenant_db
+    runner = TenantMigrationRunner(workers=2, timeout=10, dry_run=True)
+    client.execute_query_dict = AsyncMock(return_value=[])
+
+    assert await runner.migrate_tenant(1) == runner.versions
+    conn.execute_script.assert_not_awaited()
+
+
+def _succeeded(ids):
+    query = MagicMock()
+    query.values_list = AsyncMock(return_value=ids)
+    return query
+
+
+@pytest.mark.asyncio
+async def test_run_resumes_and_completes():
+    runner = TenantMigrationRunner(workers=2, timeout=10)
+    run = MagicMock(save=AsyncMock())
+    with patch(
+        "app.services.tenant_migrations.tenant_models_describe", return_value={}
+    ), patch.object(
+        runner, "start_run", new_callable=AsyncMock, return_value=run
+    ), patch.object(
+        runner, "tenants", new_callable=AsyncMock, return_value=[1, 2, 3]
+    ), patch(
+        "app.models.core.TenantMigration.filter", return_value=_succeeded([1])
+    ), patch.object(
+        runner, "migrate_tenant", new_callable=AsyncMock, side_effect=[["10_x.py"], []]
+    ) as mock_migrate, patch.object(
+        runner, "_record", new_callable=AsyncMock
+    ) as mock_record, patch(
+        "app.services.tenant_migrations.tenant_pools.discard", new_callable=AsyncMock
+    ):
+        results = await runner.run()
+
+    assert [call.args[0] for call in mock_migrate.await_args_list] == [2, 3]
+    assert results == {"migrated": 1, "up_to_date": 1, "failed": 0, "skipped": 1}
+    assert mock_record.await_args.kwargs["status"] == TenantMigrationStatus.SUCCEEDED
+    assert run.completed is True
+    run.save.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_tenant_fails_and_keeps_run_open():
+    runner = TenantMigrationRunner(workers=2, timeout=0.01)
+    run = MagicMock(save=AsyncMock(), completed=False)
+
+    async def hang(tenant_id):
+        await asyncio.sleep(1)
+
+    with patch(
+        "app.services.tenant_migrations.tenant_models_describe", return_value={}
+    ), patch.object(
+        runner, "start_run", new_callable=AsyncMock, return_value=run
+    ), patch.object(
+        runner, "tenants", new_callable=AsyncMock, return_value=[1]
+    ), patch(
+        "app.models.core.TenantMigration.filter", return_value=_succeeded([])
+    ), patch.object(
+        runner, "migrate_tenant", side_effect=hang
+    ), patch.object(
+        runner, "_record", new_callable=AsyncMock
+    ) as mock_record, patch(
+        "app.services.tenant_migrations.tenant_pools.discard", new_callable=AsyncMock
+    ) as mock_discard:
+        results = await runner.run()
+
+    assert results["failed"] == 1
+    assert mock_record.await_args.kwargs["status"] == TenantMigrationStatus.FAILED
+    assert "Timed out" in mock_record.await_args.kwargs["error"]
+    mock_discard.assert_awaited_once_with(1)
+    assert run.completed is False
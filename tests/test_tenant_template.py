@@ -0,0 +1,129 @@
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import asyncpg
+import pytest
+
+from app.db.shards import DEFAULT_SHARD
+from app.services.tenant import create_tenant_database, migrate_tenant
+from app.services.tenant_template import (
+    migration_files,
+    migration_versions,
+    promote_tenant_template,
+)
+
+
+@pytest.fixture
+def admin_conn():
+    conn = AsyncMock()
+    conn.fetchval.return_value = None
+
+    @asynccontextmanager
+    async def acquire(url):
+        yield conn
+
+    with patch("app.services.tenant.admin_pools.acquire", acquire):
+        yield conn
+
+
+@pytest.fixture
+def placement():
+    with patch(
+        "app.services.tenant.shard_map.place",
+        new_callable=AsyncMock,
+        return_value=DEFAULT_SHARD,
+    ), patch(
+        "app.services.tenant.tenant_warm_pool.claim",
+        new_callable=AsyncMock,
+        return_value=False,
+    ):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_create_tenant_database_clones_template(placement, admin_conn):
+    with patch(
+        "app.services.tenant.migrate_tenant", new_callable=AsyncMock, return_value=[]
+    ) as mock_migrate:
+        assert await create_tenant_database(1) == "tenant_1"
+        admin_conn.execute.assert_awaited_once_with(
+            'CREATE DATABASE "tenant_1" TEMPLATE "tenant_template"'
+        )
+        mock_migrate.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_create_tenant_database_migrates_without_template(placement, admin_conn):
+    with patch(
+        "app.services.tenant.migrate_tenant", new_callable=AsyncMock
+    ) as mock_migrate:
+        admin_conn.execute.side_effect = [
+            asyncpg.InvalidCatalogNameError(
+                'database "tenant_template" does not exist'
+            ),
+            None,
+        ]
+
+        assert await create_tenant_database(1) == "tenant_1"
+        assert admin_conn.execute.await_args_list[-1] == call(
+            'CREATE DATABASE "tenant_1"'
+        )
+        mock_migrate.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_migrate_tenant_uses_the_tenant_pool_not_aerich():
+    client = MagicMock(connection_name="tenant_1")
+    conn = MagicMock(execute_script=AsyncMock(), execute_query=AsyncMock())
+
+    @asynccontextmanager
+    async def transaction(alias):
+        assert alias == "tenant_1"
+        yield conn
+
+    with patch(
+        "app.services.tenant_migrations.tenant_pools.acquire",
+        new_callable=AsyncMock,
+        return_value=client,
+    ), patch(
+        "app.services.tenant_migrations.applied_versions",
+        new_callable=AsyncMock,
+        return_value=set(),
+    ), patch(
+        "app.services.tenant_migrations.in_transaction", transaction
+    ), patch(
+        "app.services.tenant_migrations.tenant_models_describe", return_value={}
+    ), patch(
+        "app.services.tenant_migrations.load_migration"
+    ) as mock_load, patch(
+        "app.services.tenant.Command"
+    ) as mock_command:
+        mock_load.return_value.upgrade = AsyncMock(return_value="CREATE TABLE x")
+        assert await migrate_tenant(1) == migration_files()
+
+    assert conn.execute_script.await_count == len(migration_files())
+    mock_command.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_promote_tenant_template_swaps_databases():
+    admin = AsyncMock()
+    admin.fetchval.return_value = 1
+
+    await promote_tenant_template(admin, "tenant_template_next")
+    assert admin.execute.await_args_list == [
+        call('ALTER DATABASE "tenant_template" IS_TEMPLATE false'),
+        call('DROP DATABASE IF EXISTS "tenant_template_old"'),
+        call('ALTER DATABASE "tenant_template" RENAME TO "tenant_template_old"'),
+        call('ALTER DATABASE "tenant_template_next" RENAME TO "tenant_template"'),
+        call(
+            'ALTER DATABASE "tenant_template" IS_TEMPLATE true ALLOW_CONNECTIONS false'
+        ),
+        call('DROP DATABASE "tenant_template_old"'),
+    ]
+
+
+def test_migration_versions_lists_migration_files():
+    versions = migration_versions()
+    assert "3_20250605212331_None.py" in versions
+    assert all(version.endswith(".py") for version in versions)
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from jose import JWTError, jwt
+
+from app.utils.tokens import TokenVerifier
+
+SECRET_KEY = "test-secret"
+
+
+def _token(minutes=5, **claims):
+    claims["exp"] = datetime.utcnow() + timedelta(minutes=minutes)
+    return jwt.encode(claims, SECRET_KEY, algorithm="HS256")
+
+
+def _verifier():
+    return TokenVerifier(SECRET_KEY, "HS256", maxsize=10, max_ttl=3600)
+
+
+def test_verified_claims_are_cached():
+    verifier = _verifier()
+    token = _token(sub="1")
+    with patch("app.utils.tokens.jwt.decode", wraps=jwt.decode) as mock_decode:
+        assert verifier.decode(token)["sub"] == "1"
+        assert verifier.decode(token)["sub"] == "1"
+    mock_decode.assert_called_once()
+    assert verifier.stats()["hits"] == 1
+
+
+def test_invalid_signature_is_rejected():
+    token = jwt.encode({"sub": "1"}, "other-secret", algorithm="HS256")
+    with pytest.raises(JWTError):
+        _verifier().decode(token)
+
+
+def test_expired_token_is_not_served_from_cache():
+    verifier = _verifier()
+    token = _token(sub="1")
+    verifier.decode(token)
+    with patch("app.utils.tokens.time.time", return_value=2**40), patch(
+        "app.utils.tokens.jwt.decode", side_effect=JWTError("Signature has expired")
+    ) as mock_decode, pytest.raises(JWTError):
+        verifier.decode(token)
+    mock_decode.assert_called_once()
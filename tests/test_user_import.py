@@ -0,0 +1,133 @@
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.auth import get_current_tenant_owner
+from app.services.user_import import UserImport, iter_lines, parse_rows
+
+BCRYPT_HASH = "$2b$12$" + "a" * 53
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def _tenant_client(inserted_emails):
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+    connection.copy_records_to_table = AsyncMock()
+    connection.fetch = AsyncMock(
+        return_value=[{"email": email} for email in inserted_emails]
+    )
+
+    @asynccontextmanager
+    async def transaction():
+        yield
+
+    @asynccontextmanager
+    async def acquire_connection():
+        yield connection
+
+    connection.transaction = transaction
+    client = MagicMock()
+    client.acquire_connection = acquire_connection
+    return client, connection
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_splits_across_chunks():
+    # The two-byte "é" is split across chunks
+    encoded = "é\nd".encode()
+    lines = await _collect(iter_lines(_chunks(b"a,b\nc", encoded[:1], encoded[1:])))
+    assert lines == ["a,b", "cé", "d"]
+
+
+@pytest.mark.asyncio
+async def test_parse_csv_and_ndjson_rows():
+    csv_rows = await _collect(
+        parse_rows(_chunks("email,password", "", "a@example.com,secret123"), "csv")
+    )
+    assert csv_rows == [(1, {"email": "a@example.com", "password": "secret123"})]
+
+    json_rows = await _collect(
+        parse_rows(_chunks('{"email": "a@example.com"}', "{broken"), "ndjson")
+    )
+    assert json_rows[0] == (1, {"email": "a@example.com"})
+    assert isinstance(json_rows[1][1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_import_reports_errors_and_conflicts():
+    client, connection = _tenant_client(["new@example.com"])
+    user_import = UserImport(tenant_id=1, batch_size=100)
+
+    with patch(
+        "app.services.user_import.get_tenant_connection", AsyncMock(return_value=client)
+    ), patch(
+        "app.services.user_import.password_hasher.hash_many",
+        AsyncMock(return_value=["hashed"]),
+    ):
+        await user_import.add(1, {"email": "new@example.com", "password": "secret123"})
+        await user_import.add(
+            2, {"email": "taken@example.com", "password_hash": BCRYPT_HASH}
+        )
+        await user_import.add(3, {"email": "new@example.com", "password": "secret123"})
+        await user_import.add(4, {"email": "not-an-email", "password": "secret123"})
+        await user_import.add(5, {"email": "short@example.com", "password": "short"})
+        await user_import.add(6, ValueError("Expecting value"))
+        await user_import.flush()
+
+    records = connection.copy_records_to_table.await_args.kwargs["records"]
+    assert records == [
+        (1, "new@example.com", "hashed"),
+        (2, "taken@example.com", BCRYPT_HASH),
+    ]
+    report = user_import.report()
+    assert report["imported"] == 1
+    assert [(c["row"], c["error"]) for c in report["conflicts"]] == [
+        (3, "Duplicate email in import"),
+        (2, "Email already registered in this tenant"),
+    ]
+    assert [error["row"] for error in report["errors"]] == [4, 5, 6]
+
+
+@pytest.mark.asyncio
+async def test_import_flushes_full_batches():
+    client, connection = _tenant_client([])
+    user_import = UserImport(tenant_id=1, batch_size=2)
+
+    with patch(
+        "app.services.user_import.get_tenant_connection", AsyncMock(return_value=client)
+    ):
+        for row in range(1, 4):
+            await user_import.add(
+                row, {"email": f"user{row}@example.com", "password_hash": BCRYPT_HASH}
+            )
+
+    assert connection.copy_records_to_table.await_count == 1
+    assert len(user_import._batch) == 1
+
+
+@pytest.mark.asyncio
+async def test_only_the_tenant_owner_may_import():
+    owner = MagicMock(email="owner@example.com")
+    with patch("app.services.auth.get_current_tenant", return_value=7), patch(
+        "app.models.core.CoreUser.get_or_none",
+        new_callable=AsyncMock,
+        return_value=owner,
+    ) as mock_get:
+        user = MagicMock(email="owner@example.com")
+        assert await get_current_tenant_owner(user) is user
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_tenant_owner(MagicMock(email="member@example.com"))
+
+    assert exc_info.value.status_code == 403
+    mock_get.assert_awaited_with(organizations__id=7)
@@ -0,0 +1,271 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import asyncpg
+import pytest
+from fastapi import HTTPException
+from tortoise.exceptions import IntegrityError
+
+from app.services.user_sync import DISPATCH_LOCK, UserChangeDispatcher, update_core_user
+
+
+def _dispatcher(**kwargs):
+    options = dict(
+        batch_size=100, concurrency=2, poll_interval=5, settle_delay=0, retry_delay=60
+    )
+    options.update(kwargs)
+    return UserChangeDispatcher(**options)
+
+
+def _change(
+    organization_id, change_id, previous="owner@example.com", email="owner@example.com"
+):
+    return {
+        "organization_id": organization_id,
+        "id": change_id,
+        "previous_email": previous,
+        "email": email,
+        "password_hash": f"hash-{change_id}",
+    }
+
+
+def _query():
+    query = MagicMock()
+    query.using_db.return_value = query
+    query.update = AsyncMock()
+    return query
+
+
+@pytest.fixture
+def core():
+    with patch("app.services.user_sync.connections") as mock_connections:
+        client = mock_connections.get.return_value
+        client.execute_query_dict = AsyncMock(return_value=[])
+        lock_conn = AsyncMock()
+        lock_conn.fetchval.return_value = True
+        client.acquire_connection.return_value.__aenter__.return_value = lock_conn
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_pending_groups_changes_by_tenant(core):
+    dispatcher = _dispatcher()
+    core.execute_query_dict.return_value = [_change(7, 1), _change(8, 2), _change(7, 3)]
+
+    changes = await dispatcher.pending()
+
+    assert [change["id"] for change in changes[7]] == [1, 3]
+    assert [change["id"] for change in changes[8]] == [2]
+    assert core.execute_query_dict.await_args.args[1] == [0, [], 100]
+
+
+@pytest.mark.asyncio
+async def test_apply_writes_changes_in_one_batch_then_checkpoints(core):
+    dispatcher = _dispatcher()
+    conn = AsyncMock()
+    conn.execute_query_dict.return_value = []
+
+    @asynccontextmanager
+    async def transaction(alias):
+        assert alias == "tenant_7"
+        yield conn
+
+    query = _query()
+    with patch(
+        "app.services.user_sync.tenant_pools.acquire", new_callable=AsyncMock
+    ), patch("app.services.user_sync.in_transaction", transaction), patch(
+        "app.services.user_sync.TenantSyncCheckpoint.filter", return_value=query
+    ) as mock_filter:
+        assert (
+            await dispatcher.apply(
+                7,
+                [
+                    _change(7, 1),
+                    _change(
+                        7, 3, previous="owner@example.com", email="new@example.com"
+                    ),
+                ],
+            )
+            == 2
+        )
+
+    assert conn.execute_query_dict.await_args.args[1] == [
+        ["owner@example.com", "new@example.com"],
+        "owner@example.com",
+    ]
+    assert conn.execute_many.await_args.args[1] == [
+        ["owner@example.com", "owner@example.com", "hash-1"],
+        ["owner@example.com", "new@example.com", "hash-3"],
+    ]
+    mock_filter.assert_called_once_with(organization_id=7)
+    query.update.assert_awaited_once_with(position=3)
+
+
+@pytest.mark.asyncio
+async def test_taken_email_applies_password_and_holds_checkpoint(core):
+    dispatcher = _dispatcher()
+    conn = AsyncMock()
+    conn.execute_query_dict.return_value = [{"email": "taken@example.com"}]
+
+    @asynccontextmanager
+    async def transaction(alias):
+        yield conn
+
+    query = _query()
+    with patch(
+        "app.services.user_sync.tenant_pools.acquire", new_callable=AsyncMock
+    ), patch("app.services.user_sync.in_transaction", transaction), patch(
+        "app.services.user_sync.TenantSyncCheckpoint.filter", return_value=query
+    ):
+        assert (
+            await dispatcher.apply(
+                7,
+                [
+                    _change(7, 1),
+                    _change(7, 3, email="taken@example.com"),
+                    _change(
+                        7, 4, previous="taken@example.com", email="taken@example.com"
+                    ),
+                ],
+            )
+            == 1
+        )
+
+    assert conn.execute_many.await_args.args[1] == [
+        ["owner@example.com", "owner@example.com", "hash-1"]
+    ]
+    assert conn.execute_query.await_args.args[1] == ["owner@example.com", "hash-3"]
+    query.update.assert_awaited_once_with(position=1)
+    assert dispatcher.stats()["conflicts"] == 1
+    assert dispatcher.stats()["retrying"] == 1
+
+    # Still taken on the retry: the password is already there, and nothing advances
+    conn.execute_many.reset_mock()
+    query.update.reset_mock()
+    with patch(
+        "app.services.user_sync.tenant_pools.acquire", new_callable=AsyncMock
+    ), patch("app.services.user_sync.in_transaction", transaction), patch(
+        "app.services.user_sync.TenantSyncCheckpoint.filter", return_value=query
+    ):
+        assert (
+            await dispatcher.apply(7, [_change(7, 3, email="taken@example.com")]) == 0
+        )
+
+    conn.execute_many.assert_not_awaited()
+    query.update.assert_not_awaited()
+    assert dispatcher.stats()["conflicts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failing_tenant_is_retried_later_without_blocking_others(core):
+    dispatcher = _dispatcher()
+    core.execute_query_dict.return_value = [_change(7, 1), _change(8, 2)]
+
+    async def apply(tenant_id, changes):
+        if tenant_id == 7:
+            raise OSError("tenant database unreachable")
+        return len(changes)
+
+    with patch.object(dispatcher, "apply", side_effect=apply):
+        assert await dispatcher.dispatch() == 1
+        assert dispatcher.stats()["failed"] == 1
+
+        core.execute_query_dict.return_value = []
+        await dispatcher.dispatch()
+    assert core.execute_query_dict.await_args.args[1][1] == [7]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_skips_when_another_process_holds_the_lock(core):
+    dispatcher = _dispatcher()
+    lock_conn = core.acquire_connection.return_value.__aenter__.return_value
+    lock_conn.fetchval.return_value = False
+
+    assert await dispatcher.dispatch() == 0
+    core.execute_query_dict.assert_not_awaited()
+    lock_conn.fetchval.assert_awaited_once_with(
+        "SELECT pg_try_advisory_lock($1)", DISPATCH_LOCK
+    )
+
+
+def _locked_user(user):
+    query = MagicMock()
+    query.using_db.return_value = query
+    query.get = AsyncMock(return_value=user)
+    return query
+
+
+@pytest.mark.asyncio
+async def test_update_core_user_queues_change_with_previous_email():
+    principal = MagicMock(id=5, email="old@example.com", token_version=2)
+    user = MagicMock(
+        id=5, email="old@example.com", password_hash="old-hash", token_version=2
+    )
+    user.save = AsyncMock()
+
+    @asynccontextmanager
+    async def transaction(alias):
+        yield "db"
+
+    with patch("app.services.user_sync.in_transaction", transaction), patch(
+        "app.services.user_sync.CoreUser.select_for_update",
+        return_value=_locked_user(user),
+    ), patch(
+        "app.services.user_sync.UserChange.create", new_callable=AsyncMock
+    ) as mock_create, patch(
+        "app.services.user_sync.user_change_dispatcher.notify"
+    ) as mock_notify:
+        assert await update_core_user(principal, email="new@example.com") is user
+
+    assert user.token_version == 3
+    assert (principal.email, principal.token_version) == ("old@example.com", 2)
+    assert mock_create.await_args.kwargs == dict(
+        user=user,
+        previous_email="old@example.com",
+        email="new@example.com",
+        password_hash="old-hash",
+        using_db="db",
+    )
+    mock_notify.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_update_core_user_rejects_taken_email():
+    principal = MagicMock(id=5, email="old@example.com", token_version=0)
+    user = MagicMock(
+        id=5, email="old@example.com", password_hash="old-hash", token_version=0
+    )
+    user.save = AsyncMock(side_effect=IntegrityError("duplicate key"))
+
+    @asynccontextmanager
+    async def transaction(alias):
+        yield "db"
+
+    with patch("app.services.user_sync.in_transaction", transaction), patch(
+        "app.services.user_sync.CoreUser.select_for_update",
+        return_value=_locked_user(user),
+    ):
+        with pytest.raises(HTTPException) as exc_info:
+            await update_core_user(principal, email="taken@example.com")
+    assert exc_info.value.status_code == 400
+    assert (principal.email, principal.token_version) == ("old@example.com", 0)
+
+
+@pytest.mark.asyncio
+async def test_watch_survives_a_dropped_lock_connection():
+    dispatcher = _dispatcher(poll_interval=0)
+    calls = []
+
+    async def dispatch():
+        calls.append(1)
+        if len(calls) == 1:
+            raise asyncpg.InterfaceError("connection is closed")
+        if len(calls) == 3:
+            raise asyncio.CancelledError
+        return 0
+
+    with patch.object(dispatcher, "dispatch", side_effect=dispatch):
+        with pytest.raises(asyncio.CancelledError):
+            await dispatcher._watch(asyncio.Event())
+    assert len(calls) == 3
@@ -0,0 +1,47 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.verification import VerificationTokenSweeper, token_digest
+
+
+def _expired(ids):
+    query = MagicMock()
+    query.using_db.return_value = query
+    query.order_by.return_value = query
+    query.limit.return_value = query
+    query.values_list = AsyncMock(return_value=ids)
+    query.delete = AsyncMock(return_value=len(ids))
+    return query
+
+
+def test_token_digest_is_stable_and_hides_token():
+    digest = token_digest("token")
+    assert digest == token_digest("token")
+    assert len(digest) == 64
+    assert "token" not in digest
+
+
+@pytest.mark.asyncio
+async def test_sweep_deletes_in_batches_until_drained():
+    sweeper = VerificationTokenSweeper(batch_size=2, interval=60)
+    batches = [[1, 2], [1, 2], [3, 4], [3, 4], [5], [5]]
+    with patch("app.services.verification.connections"), patch(
+        "app.models.core.VerificationToken.filter",
+        side_effect=[_expired(ids) for ids in batches],
+    ) as mock_filter:
+        assert await sweeper.sweep() == 5
+
+    assert mock_filter.call_count == 6
+    assert mock_filter.call_args_list[1].kwargs == {"id__in": [1, 2]}
+    assert sweeper.deleted == 5
+
+
+@pytest.mark.asyncio
+async def test_sweep_without_expired_tokens_deletes_nothing():
+    sweeper = VerificationTokenSweeper(batch_size=2, interval=60)
+    with patch("app.services.verification.connections"), patch(
+        "app.models.core.VerificationToken.filter", return_value=_expired([])
+    ) as mock_filter:
+        assert await sweeper.sweep() == 0
+    mock_filter.assert_called_once()
@@ -0,0 +1,143 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, call, patch
+
+import asyncpg
+import pytest
+
+from app.db.shards import DEFAULT_SHARD
+from app.services.tenant import create_tenant_database
+from app.services.warm_pool import REFILL_LOCK, TenantWarmPool
+
+
+def _databases(*names):
+    return [{"datname": name} for name in names]
+
+
+@pytest.fixture
+def admin():
+    conn = AsyncMock()
+
+    @asynccontextmanager
+    async def acquire(url):
+        yield conn
+
+    with patch("app.db.admin.admin_pools.acquire", acquire):
+        yield conn
+
+
+@pytest.mark.asyncio
+async def test_claim_renames_first_available_spare():
+    pool = TenantWarmPool(size=3, low_water=1, interval=30)
+    admin = AsyncMock()
+    admin.fetch.return_value = _databases("tenant_spare_a", "tenant_spare_b")
+    admin.execute.side_effect = [
+        asyncpg.InvalidCatalogNameError('database "tenant_spare_a" does not exist'),
+        None,
+    ]
+
+    assert await pool.claim(admin, "tenant_7", DEFAULT_SHARD) is True
+    assert admin.execute.await_args == call(
+        'ALTER DATABASE "tenant_spare_b" RENAME TO "tenant_7"'
+    )
+    assert pool.stats() == {"available": 0, "claims": 1, "misses": 0, "refills": 0}
+
+
+@pytest.mark.asyncio
+async def test_claim_misses_when_pool_is_empty():
+    pool = TenantWarmPool(size=3, low_water=1, interval=30)
+    admin = AsyncMock()
+    admin.fetch.return_value = []
+
+    assert await pool.claim(admin, "tenant_7", DEFAULT_SHARD) is False
+    admin.execute.assert_not_awaited()
+    assert pool.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_refill_tops_up_below_low_water_mark(admin):
+    pool = TenantWarmPool(size=3, low_water=1, interval=30)
+    with patch(
+        "app.services.warm_pool.clone_tenant_database",
+        new_callable=AsyncMock,
+        return_value=True,
+    ) as mock_clone:
+        admin.fetchval.return_value = True
+        admin.fetch.side_effect = [
+            _databases("tenant_building_x"),
+            _databases("tenant_spare_a"),
+        ]
+
+        assert await pool.refill(DEFAULT_SHARD) == 2
+
+    assert mock_clone.await_count == 2
+    assert admin.execute.await_args_list[0] == call(
+        'DROP DATABASE IF EXISTS "tenant_building_x"'
+    )
+    assert admin.execute.await_args_list[-1] == call(
+        "SELECT pg_advisory_unlock($1)", REFILL_LOCK
+    )
+    assert pool.stats()["available"] == 3
+    assert pool.stats()["refills"] == 2
+
+
+@pytest.mark.asyncio
+async def test_refill_skips_shard_above_low_water_mark(admin):
+    pool = TenantWarmPool(size=3, low_water=1, interval=30)
+    with patch(
+        "app.services.warm_pool.clone_tenant_database", new_callable=AsyncMock
+    ) as mock_clone:
+        admin.fetchval.return_value = True
+        admin.fetch.side_effect = [[], _databases("tenant_spare_a", "tenant_spare_b")]
+
+        assert await pool.refill(DEFAULT_SHARD) == 0
+
+    mock_clone.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_tenant_database_claims_spare(admin):
+    admin.fetchval.return_value = None
+    with patch(
+        "app.services.tenant.shard_map.place",
+        new_callable=AsyncMock,
+        return_value=DEFAULT_SHARD,
+    ), patch(
+        "app.services.tenant.tenant_warm_pool.claim",
+        new_callable=AsyncMock,
+        return_value=True,
+    ), patch(
+        "app.services.tenant.clone_tenant_database", new_callable=AsyncMock
+    ) as mock_clone, patch(
+        "app.services.tenant.migrate_tenant", new_callable=AsyncMock, return_value=[]
+    ) as mock_migrate:
+        assert await create_tenant_database(1) == "tenant_1"
+
+    mock_clone.assert_not_awaited()
+    mock_migrate.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_watch_survives_pool_timeouts_and_dropped_connections():
+    pool = TenantWarmPool(size=3, low_water=1, interval=0)
+    errors = [
+        asyncio.TimeoutError(),
+        asyncpg.InterfaceError("connection is closed"),
+        None,
+        asyncio.CancelledError(),
+    ]
+    calls = []
+
+    async def refill(shard):
+        calls.append(shard)
+        error = errors[len(calls) - 1]
+        if error is not None:
+            raise error
+        return 0
+
+    with patch(
+        "app.services.warm_pool.shard_map.shards", {"a": "", "b": ""}
+    ), patch.object(pool, "refill", side_effect=refill):
+        with pytest.raises(asyncio.CancelledError):
+            await pool._watch(asyncio.Event())
+    assert calls == ["a", "b", "a", "b"]